@@ -0,0 +1,194 @@
+"""Synthetic month-end inputs for the benchmarks.
+
+Writes one file per upload field of the /process form, in the column layouts
+of the real downloads (see sample-monthly-data/): two EQ snapshots, the four SP
+lists, ROW agents and the website list. rows is the number of contacts across
+all sources. People overlap between sources, and the values are as messy as
+real exports: stray whitespace, mixed-case emails, blanks and the odd invalid
+address.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Above this many contacts files are written as CSV; openpyxl takes minutes to write 1M-row workbooks
+XLSX_MAX_ROWS = 200_000
+
+# Share of all contacts in each source
+SHARES = {
+    "eq_base_end": 0.30,
+    "sp_uk_direct": 0.125,
+    "sp_uk_referrers": 0.125,
+    "sp_us_direct": 0.125,
+    "sp_us_agents": 0.125,
+    "row_agents": 0.10,
+    "website_list": 0.10,
+}
+
+FIRST_NAMES = ["Ann", "Bob", "Cher", "Dev", "Elena", "Fiona", "Gail", "Hamish", "Isla", "Jamie",
+               "Kofi", "Lisa", "Mei", "Nadia", "Oscar", "Priya", "Quinn", "Robert", "Sana", "Tyrone"]
+LAST_NAMES = ["Brown", "Smith", "McKenzie", "van der Berg", "O'Neil", "Lilly", "Peters", "Travers",
+              "Johnson", "Day", "Coombes", "LaSalle", "McDowell", "Williams", "Singh", "Chen"]
+DOMAINS = ["gmail.com", "hotmail.com", "yahoo.co.uk", "ms365.com", "example.co.uk", "example.com"]
+UK_AREAS = ["Edinburgh", "Glasgow", "glasgow west", "Aberdeen", "ABERDEEN", "York", "Newcastle upon Tyne",
+            "north east", "London", "Bristol", "Leeds", "Cardiff", "", None]
+US_AREAS = ["MA-Boston", "PA-Philadelphia", "IL-Chicago", "TX", "MO-St Louis", "MO", "MI", "ny-Albany", "", None]
+TECH_TAGS = ["95;#Patents", "104;#TMs", "95;#Patents;#104;#TMs", "122;#Chemical", "92;#Patents (1);#122;#Chemical",
+             "Design;#Patent", "trade-mark", "", None]
+ROW_COUNTRIES = ["AU", "FR", "de", "TR", "JP", "IN", "BR", "", None]
+COUNTRIES = ["GB", "GB", "GB", "US", "FR", "TR", "De", "", None]
+POSTCODES = ["TR", "US", "EH1 1AA", "G1 1AA", "", None]
+STATUSES = ["1 - First Comm(s) Sent", "1 - Reply Received", "No Action Taken", "1 - Info, Schedules, Proposals Exchanged"]
+
+
+def _pick(rng, values, n):
+    pool = np.empty(len(values), dtype=object)
+    pool[:] = values
+    return pool[rng.integers(0, len(pool), n)]
+
+
+def _people(rng, ids):
+    """Name parts, email and organisation for the given contact ids"""
+    n = len(ids)
+    first = _pick(rng, FIRST_NAMES, n)
+    last = _pick(rng, LAST_NAMES, n)
+    emails = np.array([
+        f"{f}.{l.replace(' ', '').replace(chr(39), '')}{i}@{DOMAINS[i % len(DOMAINS)]}".lower()
+        for f, l, i in zip(first, last, ids)
+    ], dtype=object)
+
+    # Exports are messy: shouting, padding, blanks and the odd typo
+    noise = rng.random(n)
+    emails[noise < 0.03] = [e.upper() for e in emails[noise < 0.03]]
+    emails[(noise >= 0.03) & (noise < 0.05)] = [f" {e} " for e in emails[(noise >= 0.03) & (noise < 0.05)]]
+    emails[(noise >= 0.05) & (noise < 0.06)] = [e.replace("@", " at ") for e in emails[(noise >= 0.05) & (noise < 0.06)]]
+    emails[(noise >= 0.06) & (noise < 0.065)] = None
+
+    organisations = np.array([f"Org {i % 5000} Ltd" for i in ids], dtype=object)
+    organisations[rng.random(n) < 0.05] = None
+    return first, last, emails, organisations
+
+
+def _sp_frame(rng, ids, areas):
+    first, last, emails, organisations = _people(rng, ids)
+    n = len(ids)
+    return pd.DataFrame({
+        "Organisation": organisations,
+        "First Name": first,
+        "Last Name": last,
+        "Status": _pick(rng, STATUSES, n),
+        "Lead Temperature": _pick(rng, ["Cold", "Lukewarm", "Warm"], n),
+        "Action Date": None,
+        "Primary CIP Contact": _pick(rng, ["Bob", "Talula", "Jimmy"], n),
+        "Contact Email Address": emails,
+        "State/Area": _pick(rng, areas, n),
+        "Background": _pick(rng, ["Referral from a client.", "Made TM enquiry for costs.", ""], n),
+        "BD Tags": None,
+        "Technical Tags": _pick(rng, TECH_TAGS, n),
+        "Hobby/Personal Tags": None,
+        "Fee Sheet Sent": None,
+        "Subscribed to Mailing List": "Yes",
+        "Modified": pd.Timestamp("2025-10-30 12:00:00"),
+        "Item Type": "Item",
+        "Path": "Lists/BD Contacts",
+    })
+
+
+def _eq_frame(rng, ids):
+    first, last, emails, organisations = _people(rng, ids)
+    n = len(ids)
+    names = np.array([f"{f}  {l}" if i % 17 == 0 else f"{f} {l}" for f, l, i in zip(first, last, ids)], dtype=object)
+    return pd.DataFrame({
+        "name": names,
+        "email1": emails,
+        "phone1": None,
+        "organisation": organisations,
+        "address": organisations,
+        "postcode": _pick(rng, POSTCODES, n),
+        "country": _pick(rng, COUNTRIES, n),
+    })
+
+
+def _row_agents_frame(rng, ids):
+    first, last, emails, organisations = _people(rng, ids)
+    n = len(ids)
+    return pd.DataFrame({
+        "Organisation": organisations,
+        "First Name": first,
+        "Last Name": last,
+        "Contact Email Address": emails,
+        "Country": _pick(rng, ROW_COUNTRIES, n),
+        "Technical Tags": _pick(rng, TECH_TAGS, n),
+        "Status": _pick(rng, STATUSES, n),
+    })
+
+
+def _website_frame(rng, ids):
+    first, last, emails, organisations = _people(rng, ids)
+    n = len(ids)
+    return pd.DataFrame({
+        "Name": [f"{f} {l}" for f, l in zip(first, last)],
+        "Fname": first,
+        "Lname": last,
+        "Email1": emails,
+        "Organisation": organisations,
+        "Country": _pick(rng, COUNTRIES, n),
+        "processing basis": "Website form consent",
+        "date added": pd.Timestamp("2025-11-03"),
+    })
+
+
+def generate_frames(rows: int, seed: int = 0) -> dict:
+    """{/process form field: raw DataFrame} for about rows contacts in total"""
+    rng = np.random.default_rng(seed)
+    # Drawing every source from one slightly smaller population makes people
+    # appear in more than one source
+    population = max(int(rows * 0.9), 1)
+
+    def sample(share):
+        return np.sort(rng.choice(population, size=min(max(int(rows * share), 1), population), replace=False))
+
+    end_ids = sample(SHARES["eq_base_end"])
+    # Start of period: most of the same people plus some who have since left
+    start_ids = np.concatenate([end_ids[rng.random(len(end_ids)) < 0.85], population + np.arange(len(end_ids) // 20)])
+
+    frames = {
+        "eq_base_start": _eq_frame(rng, start_ids),
+        "eq_base_end": _eq_frame(rng, end_ids),
+        "sp_uk_direct": _sp_frame(rng, sample(SHARES["sp_uk_direct"]), UK_AREAS),
+        "sp_uk_referrers": _sp_frame(rng, sample(SHARES["sp_uk_referrers"]), UK_AREAS),
+        "sp_us_direct": _sp_frame(rng, sample(SHARES["sp_us_direct"]), US_AREAS),
+        "sp_us_agents": _sp_frame(rng, sample(SHARES["sp_us_agents"]), US_AREAS),
+        "row_agents": _row_agents_frame(rng, sample(SHARES["row_agents"])),
+        "website_list": _website_frame(rng, sample(SHARES["website_list"])),
+    }
+    return frames
+
+
+def generate(directory: str, rows: int, seed: int = 0, excel: bool = None) -> dict:
+    """Write the inputs to directory and return {/process form field: path}.
+
+    Files already there from an earlier run with the same arguments are reused.
+    excel defaults to .xlsx up to XLSX_MAX_ROWS contacts and .csv above.
+    """
+    if excel is None:
+        excel = rows <= XLSX_MAX_ROWS
+    extension = "xlsx" if excel else "csv"
+    os.makedirs(directory, exist_ok=True)
+
+    paths = {field: os.path.join(directory, f"{field}.{extension}") for field in
+             ("eq_base_start", "eq_base_end", "sp_uk_direct", "sp_uk_referrers",
+              "sp_us_direct", "sp_us_agents", "row_agents", "website_list")}
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    for field, df in generate_frames(rows, seed).items():
+        tmp_path = os.path.join(directory, f"{field}.tmp.{extension}")
+        if excel:
+            df.to_excel(tmp_path, index=False, engine="openpyxl")
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, paths[field])
+    return paths
@@ -0,0 +1,209 @@
+"""Time the processing pipeline on synthetic data and compare with a baseline.
+
+    python -m benchmarks.run                        # 1k and 100k contacts, as CSVs and workbooks
+    python -m benchmarks.run --sizes 1k,100k,1M
+    python -m benchmarks.run --update-baseline      # after an intended change
+
+A size on its own ("100k") reads CSV inputs, and with -xlsx ("100k-xlsx")
+Excel workbooks, so each series only varies the number of rows. Workbooks
+stop at 100k, as openpyxl takes minutes to write 1M-row workbooks.
+
+Each processor, generate_combined_dataframe (in-line, without the parse cache)
+and download_zip is warmed up, run once under tracemalloc for its peak Python
+memory, then timed on its own as the best of --repeat runs. A step that is slower or
+bigger than the baseline by more than the tolerance is a regression and the
+run exits with status 1. Baselines are machine-specific, so refresh
+benchmarks/baseline.json on the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("FOXTROT_CACHE_DIR", "")
+
+from benchmarks.generate import generate  # noqa: E402
+from processors.eq import process_eq_files  # noqa: E402
+from processors.pipeline import UploadedFile, generate_combined_dataframe  # noqa: E402
+from processors.row_agents import process_row_agents_files  # noqa: E402
+from processors.sp import process_sp_files  # noqa: E402
+from processors.website import process_website_files  # noqa: E402
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+XLSX_SIZES = ("1k", "100k")
+DEFAULT_SIZES = "1k,100k,1k-xlsx,100k-xlsx"
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_DATA_DIR = os.path.join(HERE, ".data")
+
+LABEL = "Upload 02-Oct-25"
+
+# Differences below these are noise, whatever the relative change
+MIN_SECONDS = 0.05
+MIN_MB = 1.0
+
+
+def parse_size(name: str) -> tuple:
+    """(rows, excel) for a size such as "100k" or "100k-xlsx"; ValueError for unknown sizes"""
+    rows, _, fmt = name.partition("-")
+    if rows not in SIZES or fmt not in ("", "xlsx") or (fmt and rows not in XLSX_SIZES):
+        raise ValueError(name)
+    return SIZES[rows], fmt == "xlsx"
+
+
+def _load(paths: dict) -> dict:
+    """Uploads as the app holds them: in-memory copies of the file bytes"""
+    files = {}
+    for field, path in paths.items():
+        with open(path, "rb") as f:
+            files[field] = UploadedFile(f.read(), os.path.basename(path))
+    return files
+
+
+def _fresh(upload: UploadedFile) -> UploadedFile:
+    return UploadedFile(upload.getvalue(), upload.filename)
+
+
+def steps(files: dict):
+    """Yields (step name, zero-argument callable), each reading fresh copies of the uploads"""
+    def combined():
+        return generate_combined_dataframe(
+            _fresh(files["eq_base_start"]), _fresh(files["eq_base_end"]),
+            _fresh(files["sp_uk_direct"]), _fresh(files["sp_uk_referrers"]),
+            _fresh(files["sp_us_direct"]), _fresh(files["sp_us_agents"]),
+            _fresh(files["row_agents"]), _fresh(files["website_list"]),
+            LABEL, workers=1,
+        )
+
+    yield "eq", lambda: process_eq_files(_fresh(files["eq_base_start"]), _fresh(files["eq_base_end"]), LABEL)
+    yield "sp_uk_direct", lambda: process_sp_files(_fresh(files["sp_uk_direct"]), LABEL, "UK_DIRECT")
+    yield "sp_uk_referrers", lambda: process_sp_files(_fresh(files["sp_uk_referrers"]), LABEL, "UK_REFERRERS")
+    yield "sp_us_direct", lambda: process_sp_files(_fresh(files["sp_us_direct"]), LABEL, "US_DIRECT")
+    yield "sp_us_agents", lambda: process_sp_files(_fresh(files["sp_us_agents"]), LABEL, "US_AGENTS")
+    yield "row_agents", lambda: process_row_agents_files(_fresh(files["row_agents"]), LABEL)
+    yield "website", lambda: process_website_files(_fresh(files["website_list"]), LABEL)
+    yield "generate_combined_dataframe", combined
+
+    # Built between measurements, so download_zip is measured on the export alone
+    frame = combined()
+    from main import app, download_zip
+
+    def export():
+        with app.test_request_context():
+            for _ in download_zip(frame).response:
+                pass
+
+    yield "download_zip", export
+
+
+def measure(fn, repeat: int, memory: bool = True) -> dict:
+    """Best wall time of repeat runs, and the peak traced memory of one more.
+
+    An untimed first run warms up imports and caches, so neither measurement
+    includes one-off start-up work.
+    """
+    fn()
+    result = {}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+        finally:
+            tracemalloc.stop()
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    result["seconds"] = round(best, 4)
+    return result
+
+
+def compare(results: dict, baseline: dict, time_tolerance: float, memory_tolerance: float) -> list:
+    """Regressions of results against baseline, as readable lines"""
+    regressions = []
+    for size, size_results in results.items():
+        for step, measured in size_results.items():
+            expected = baseline.get(size, {}).get(step)
+            if not expected:
+                continue
+            seconds, base_seconds = measured["seconds"], expected["seconds"]
+            if seconds > base_seconds * (1 + time_tolerance) and seconds - base_seconds > MIN_SECONDS:
+                regressions.append(f"{size} {step}: {seconds:.3f}s vs baseline {base_seconds:.3f}s")
+            if "peak_mb" in measured and "peak_mb" in expected:
+                mb, base_mb = measured["peak_mb"], expected["peak_mb"]
+                if mb > base_mb * (1 + memory_tolerance) and mb - base_mb > MIN_MB:
+                    regressions.append(f"{size} {step}: {mb:.1f} MB vs baseline {base_mb:.1f} MB")
+    return regressions
+
+
+def run(sizes, data_dir: str, repeat: int, memory: bool = True, seed: int = 0, out=sys.stdout) -> dict:
+    results = {}
+    for size in sizes:
+        rows, excel = parse_size(size)
+        paths = generate(os.path.join(data_dir, f"{size}-seed{seed}"), rows, seed=seed, excel=excel)
+        files = _load(paths)
+        results[size] = {}
+        for name, step in steps(files):
+            results[size][name] = measure(step, repeat, memory)
+            measured = results[size][name]
+            peak = f"{measured['peak_mb']:9.1f} MB" if "peak_mb" in measured else ""
+            print(f"{size:>9} {name:30s} {measured['seconds']:9.3f}s {peak}", file=out)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma-separated, from {', '.join(SIZES)}, or {'/'.join(XLSX_SIZES)} with -xlsx")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write these results as the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 = 50%%")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed memory growth")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = []
+    for size in sizes:
+        try:
+            parse_size(size)
+        except ValueError:
+            unknown.append(size)
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    results = run(sizes, args.data_dir, args.repeat, memory=not args.no_memory, seed=args.seed)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Run the month-end processing from the command line, without the web app.
+
+    python cli.py sample-monthly-data --export mailchimp_upload.zip --parquet --compression fast
+    python cli.py sample-monthly-data --upload --label "Upload 02-Oct-25"
+
+The directory is laid out like sample-monthly-data: the two EQ base downloads
+in eq_downloads, the SharePoint list downloads in sp_downloads and the ROW
+agents and website master lists in master_spreadsheets. detect_files() works
+out which file is which from its name, the same sources the /process form
+asks for one at a time.
+
+A JSON report (files used, rows, source errors, upload counts and the run's
+timings from metrics.summary) is printed to stdout and logging goes to
+stderr. The exit code says how the run went, see the EXIT_* constants.
+
+Flask is never imported, and pandas and the processors only once the
+arguments have been checked, so a scheduler gets usage errors straight away.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+# Bad arguments, files that could not be told apart or missing configuration
+EXIT_USAGE = 2
+# Finished, but a source failed to process or some contacts failed to upload
+EXIT_PARTIAL = 3
+
+# The /process form fields, in the order generate_combined_dataframe takes them
+FILE_SLOTS = (
+    "eq_base_start", "eq_base_end",
+    "sp_uk_direct", "sp_uk_referrers",
+    "sp_us_direct", "sp_us_agents",
+    "row_agents", "website_list",
+)
+
+EXTENSIONS = (".csv", ".xlsx", ".xls")
+
+# processors.export.ZIP_COMPRESSION's choices, repeated so --help does not load pandas
+COMPRESSION_CHOICES = ("default", "stored", "fast", "max")
+
+# "EQ list download - 1 Oct 2025 - base.xlsx"
+EQ_DOWNLOAD = re.compile(r"eq list download - (\d{1,2} [a-z]+ \d{4})", re.IGNORECASE)
+
+# The list name at the end of "SP Download 30 Oct 2025 - UK Direct.xlsx"
+SP_LISTS = {
+    "uk direct": "sp_uk_direct",
+    "uk referrers": "sp_uk_referrers",
+    "us direct": "sp_us_direct",
+    "us agents": "sp_us_agents",
+}
+
+# Master lists that are inputs; the other master_spreadsheets are last month's outputs
+MASTER_LISTS = (
+    (re.compile(r"master sp list - row agents\b", re.IGNORECASE), "row_agents"),
+    (re.compile(r"master website list\b", re.IGNORECASE), "website_list"),
+)
+
+logger = logging.getLogger("foxtrot.cli")
+
+
+def _parse_date(text: str) -> datetime:
+    for fmt in ("%d %b %Y", "%d %B %Y"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"Cannot read the date {text!r}")
+
+
+def _listing(directory: str) -> list:
+    """Spreadsheets in directory, skipping Excel lock files; [] when it does not exist"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.lower().endswith(EXTENSIONS) and not name.startswith(("~$", "."))
+    )
+
+
+def _assign(found: dict, slot: str, path: str):
+    if slot in found:
+        raise ValueError(f"Both {os.path.basename(found[slot])!r} and {os.path.basename(path)!r} "
+                         f"look like the {slot} file")
+    found[slot] = path
+
+
+def detect_files(directory: str) -> dict:
+    """{form field: path} of the source files found under directory.
+
+    Raises ValueError when two files fit the same field, when there is only
+    one EQ base download, or when nothing is found at all.
+    """
+    found = {}
+
+    eq_dir = os.path.join(directory, "eq_downloads")
+    downloads = []
+    for name in _listing(eq_dir):
+        match = EQ_DOWNLOAD.match(name)
+        if match:
+            downloads.append((_parse_date(match.group(1)), os.path.join(eq_dir, name)))
+    if downloads:
+        if len(downloads) != 2 or downloads[0][0] == downloads[1][0]:
+            raise ValueError(f"Expected the EQ base downloads for the start and end of the period "
+                             f"in {eq_dir}, found {len(downloads)}")
+        downloads.sort()
+        found["eq_base_start"] = downloads[0][1]
+        found["eq_base_end"] = downloads[1][1]
+
+    sp_dir = os.path.join(directory, "sp_downloads")
+    for name in _listing(sp_dir):
+        list_name = os.path.splitext(name)[0].rsplit(" - ", 1)[-1].strip().lower()
+        if list_name in SP_LISTS:
+            _assign(found, SP_LISTS[list_name], os.path.join(sp_dir, name))
+
+    master_dir = os.path.join(directory, "master_spreadsheets")
+    for name in _listing(master_dir):
+        for pattern, slot in MASTER_LISTS:
+            if pattern.match(name):
+                _assign(found, slot, os.path.join(master_dir, name))
+
+    if not found:
+        raise ValueError(f"No source files found in {directory}")
+    return {slot: found[slot] for slot in FILE_SLOTS if slot in found}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the month's Mailchimp upload from a directory of downloads.")
+    parser.add_argument("directory", help="directory laid out like sample-monthly-data")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--export", metavar="ZIP", help="write the Mailchimp upload zip to this path")
+    action.add_argument("--upload", action="store_true", help="upload the contacts to the Mailchimp audience")
+    parser.add_argument("--label", default=f"Upload {datetime.now():%d-%b-%y}",
+                        help="upload date label the contacts are tagged with (default: %(default)s)")
+    parser.add_argument("--per-source", action="store_true", help="also put a CSV per source in the zip")
+    parser.add_argument("--parquet", action="store_true", help="also put a Parquet file of the contacts in the zip")
+    parser.add_argument("--compression", choices=COMPRESSION_CHOICES, default="default",
+                        help="zip compression: stored, fast or max deflate (default: %(default)s)")
+    parser.add_argument("--workers", type=int,
+                        help="processes to run the sources in (default: FOXTROT_SOURCE_WORKERS or the CPU count)")
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be positive")
+    if (args.per_source or args.parquet or args.compression != "default") and not args.export:
+        parser.error("--per-source, --parquet and --compression only apply to --export")
+    return args
+
+
+def _export(files: list, args) -> dict:
+    """Write the zip next to its destination and move it into place once complete"""
+    import metrics
+    from processors.export import iter_zip, iter_zip_batches, zip_compression
+    from processors.pipeline import generate_combined_dataframe, iter_contact_batches, should_stream
+
+    month = datetime.now().strftime("%b %Y") if args.per_source else None
+    method, level = zip_compression(args.compression)
+    options = dict(month=month, compression=method, compresslevel=level, parquet=args.parquet)
+    partial = f"{args.export}.partial"
+    with metrics.capture() as run_metrics:
+        try:
+            with open(partial, "wb") as out:
+                if should_stream(files):
+                    # As download_zip_streamed: a CSV too big to combine in memory goes through in chunks
+                    source_errors = {}
+                    churn = {}
+                    batches = iter_contact_batches(*files, args.label, source_errors=source_errors)
+                    rows = 0
+
+                    def counted():
+                        nonlocal rows
+                        for label, batch in batches:
+                            rows += len(batch)
+                            yield label, batch
+
+                    out.writelines(iter_zip_batches(counted(), source_errors=source_errors, **options))
+                else:
+                    with metrics.STAGE_SECONDS.time(stage="process"):
+                        combined = generate_combined_dataframe(*files, args.label, workers=args.workers)
+                    source_errors = combined.attrs["source_errors"]
+                    churn = combined.attrs["churn"]
+                    rows = len(combined)
+                    out.writelines(iter_zip(combined, **options))
+            os.replace(partial, args.export)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    return {
+        "output": os.path.abspath(args.export),
+        "rows": rows,
+        "source_errors": source_errors,
+        "churn": churn,
+        "metrics": metrics.summary(run_metrics),
+    }
+
+
+def _upload_settings() -> tuple:
+    """(clients, list id, mode, source priority), raising ValueError for bad configuration before any work"""
+    from processors.merge import source_priority
+    from uploader.client import MailchimpClients
+    from uploader.concurrent import concurrency_settings
+    from uploader.upload import upload_mode
+
+    clients = MailchimpClients()
+    list_id = clients.config().audience_id
+    mode = upload_mode()
+    concurrency_settings()
+    return clients, list_id, mode, source_priority()
+
+
+def _upload(files: list, args, settings: tuple) -> dict:
+    from jobs import Job
+    from upload_run import process_and_upload
+
+    clients, list_id, mode, priority = settings
+    results = process_and_upload(Job("cli"), files, args.label, list_id, mode, priority, clients,
+                                 workers=args.workers)
+    return {
+        "source_errors": results["source_errors"],
+        "upload": {key: results[key] for key in (
+            "total", "successful", "failed", "rejected", "duplicates_merged", "api_calls_saved",
+        )},
+        "churn": results["churn"],
+        "metrics": results["metrics"],
+    }
+
+
+def run(args) -> tuple:
+    """(exit code, report) for parsed arguments"""
+    started = time.perf_counter()
+    report = {"directory": os.path.abspath(args.directory), "label": args.label}
+    try:
+        detected = detect_files(args.directory)
+        report["files"] = detected
+        settings = _upload_settings() if args.upload else None
+    except ValueError as e:
+        logger.error("%s", e)
+        code = EXIT_USAGE
+        report["error"] = str(e)
+    else:
+        files = [detected.get(slot) for slot in FILE_SLOTS]
+        try:
+            report.update(_upload(files, args, settings) if args.upload else _export(files, args))
+        except Exception as e:
+            logger.exception("Run failed")
+            code = EXIT_FAILED
+            report["error"] = str(e) or type(e).__name__
+        else:
+            failed = report.get("upload", {}).get("failed", 0)
+            code = EXIT_PARTIAL if report["source_errors"] or failed else EXIT_OK
+
+    report["status"] = {EXIT_OK: "ok", EXIT_PARTIAL: "partial"}.get(code, "failed")
+    report["exit_code"] = code
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return code, report
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    code, report = run(args)
+    json.dump(report, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
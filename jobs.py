@@ -0,0 +1,112 @@
+"""Background jobs for long running /process work.
+
+A Mailchimp upload of a month's contacts takes minutes, far longer than we
+want an HTTP request (and the reverse proxy in front of it) to wait. Jobs run
+on a small local thread pool and record their stage and row counts, so the
+browser can poll for progress and fetch the results page once it is done.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Finished jobs kept around for their results page before the oldest is dropped
+MAX_FINISHED_JOBS = 100
+
+
+class Job:
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.stage = "queued"
+        self.rows_total = 0
+        self.rows_done = 0
+        self.created_at = time.time()
+        self.stage_started_at = None
+        self.finished_at = None
+        self.results = None
+        # {file name: DataFrame} the job offers for download, e.g. rows it rejected
+        self.downloads = {}
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in ("done", "failed")
+
+    def set_stage(self, stage: str, rows_total: int = 0):
+        """Move to a new stage and reset the row counters for it"""
+        self.stage = stage
+        self.rows_total = rows_total
+        self.rows_done = 0
+        self.stage_started_at = time.time()
+
+    def advance(self, rows: int = 1):
+        self.rows_done += rows
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _finish(self, stage: str):
+        self.stage = stage
+        self.finished_at = time.time()
+        self._done.set()
+
+    def status(self) -> dict:
+        """JSON-friendly progress snapshot with rate (rows/s) and ETA (s) for the current stage"""
+        rate = None
+        eta = None
+        if self.stage_started_at and not self.finished:
+            elapsed = time.time() - self.stage_started_at
+            if elapsed > 0 and self.rows_done:
+                rate = self.rows_done / elapsed
+                if self.rows_total:
+                    eta = max(self.rows_total - self.rows_done, 0) / rate
+        return {
+            "id": self.id,
+            "stage": self.stage,
+            "rows_total": self.rows_total,
+            "rows_done": self.rows_done,
+            "rate": round(rate, 2) if rate else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "error": self.error,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """Runs fn(job, *args) on a worker pool; fn's return value becomes job.results"""
+
+    def __init__(self, max_workers: int = None):
+        if max_workers is None:
+            max_workers = int(os.environ.get("FOXTROT_JOB_WORKERS", 2))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="foxtrot-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> Job:
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn, args):
+        try:
+            job.results = fn(job, *args)
+            job._finish("done")
+        except Exception as e:
+            job.error = str(e)
+            job._finish("failed")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self._jobs[job_id]
@@ -1,240 +1,124 @@
 # This is the main application file for a Flask web application.
 # backend + routing
 
-from flask import Flask, render_template, request, send_file, redirect, url_for
-import io
-import zipfile
-import pandas as pd
+from flask import Flask, Response, jsonify, render_template, request, redirect, stream_with_context, url_for
 from datetime import datetime
-import os
-import hashlib
-import time
-import mailchimp_marketing as MailchimpMarketing
-from mailchimp_marketing.api_client import ApiClientError
-
-
-from processors.eq import process_eq_files
-from processors.sp import process_sp_files
-from processors.website import process_website_files
-from processors.row_agents import process_row_agents_files
-from processors.common import CONTACT_COLUMNS
+import itertools
+import logging
+import sqlite3
+
+
+from processors.cache import cache_stats
+from processors.export import iter_csv, iter_zip, iter_zip_batches, zip_compression
+from processors.merge import source_priority
+from processors.pipeline import generate_combined_dataframe, iter_contact_batches, should_stream
+from processors.uploads import UploadTooLarge, close_uploads, describe_bytes, max_file_bytes, max_request_bytes, spool_uploads
+from uploader.client import MailchimpClients, read_config
+from uploader.concurrent import concurrency_settings
+from uploader.results_store import PAGE_SIZE, MemoryResults, error_log_csv, open_results_store
+from uploader.upload import upload_mode
+from jobs import JobQueue
+from upload_run import process_and_upload
+import metrics
 
 app = Flask(__name__, template_folder='foxtrot_app/templates', static_folder='foxtrot_app/static')
+# Werkzeug refuses bigger requests with 413 before reading the body
+app.config["MAX_CONTENT_LENGTH"] = max_request_bytes()
+job_queue = JobQueue()
+mailchimp_clients = MailchimpClients()
+logger = logging.getLogger("foxtrot.app")
+
 def validate_mailchimp_config():
     """Validate Mailchimp environment variables are set"""
-    api_key = os.environ.get("MAILCHIMP_API_KEY")
-    audience_id = os.environ.get("MAILCHIMP_AUDIENCE_ID")
-
-    if not api_key:
-        raise ValueError("MAILCHIMP_API_KEY environment variable not set")
-    if not audience_id: 
-        raise ValueError("MAILCHIMP_AUDIENCE_ID environment variable not set")
-    if "-" not in api_key:
-        raise ValueError("Invalid MAILCHIMP_API_KEY format")
-
-    return api_key, audience_id
-
-
-def get_mailchimp_client():
-    """Initialize and return Mailchimp client"""
-    api_key, _ = validate_mailchimp_config()
-    server_prefix = api_key.split("-")[-1]
-
-    client = MailchimpMarketing.Client()
-    client.set_config({
-        "api_key": api_key,
-        "server": server_prefix
-    })
-    return client
-
-"""CSV files store tags as a single string with quotes and commas (from the
-  processors/sp.py, eq.py, etc.). But when uploading to Mailchimp, the API expects tags
-  as a list of separate tag objects:"""
-def parse_tags_from_csv(tags_string):
-    """Parse tags from CSV format"""
-    if not isinstance(tags_string, str) or not tags_string.strip():
-        return []
-
-    # Split by "," and remove surrounding quotes
-    parts = tags_string.split('","')
-    tags = []
-    for part in parts:
-        clean_tag = part.strip('"').strip()
-        if clean_tag:
-            tags.append(clean_tag)
-
-    return tags
-
-def generate_combined_dataframe(eq_base_start, eq_base_end, sp_uk_direct, sp_uk_referrers,
-                                sp_us_direct, sp_us_referrers, row_agents_file,
-                                website_file, upload_date_label):
-    """Generate combined DataFrame from all uploaded files."""
-    frames = []
-
-    # EQ
-    if eq_base_start and eq_base_end and upload_date_label:
-        df_eq = process_eq_files(eq_base_start, eq_base_end, upload_date_label)
-        frames.append(df_eq)
-
-    # SP
-    if sp_uk_direct and upload_date_label:
-        df_sp_direct = process_sp_files(
-            sp_uk_direct,
-            upload_date_label = upload_date_label,
-            list_type = "UK_DIRECT",
-        )
-        frames.append(df_sp_direct)
-
-    if sp_uk_referrers and upload_date_label:
-        df_sp_uk_ref = process_sp_files(
-            sp_uk_referrers,
-            upload_date_label = upload_date_label,
-            list_type = "UK_REFERRERS"
-        )
-        frames.append(df_sp_uk_ref)
-
-    if sp_us_direct and upload_date_label:
-        df_sp_us_direct = process_sp_files(
-            sp_us_direct,
-            upload_date_label = upload_date_label,
-            list_type = "US_DIRECT",
-        )
-        frames.append(df_sp_us_direct)
-    
-    if sp_us_referrers and upload_date_label:
-        df_sp_us_agents = process_sp_files(
-            sp_us_referrers,
-            upload_date_label = upload_date_label,
-            list_type = "US_AGENTS"
-        )
-        frames.append(df_sp_us_agents)
-    
-    # ROW agents
-    if row_agents_file and upload_date_label:
-        df_row = process_row_agents_files(row_agents_file, upload_date_label)
-        frames.append(df_row)
-
-    # Website
-    if website_file and upload_date_label:
-        df_website = process_website_files(website_file, upload_date_label)
-        frames.append(df_website)
-
-    if not frames:
-        return None
-
-    combined = pd.concat(frames, ignore_index=True)
-    return combined[CONTACT_COLUMNS]
-
-def download_zip(combined):
-    """Generate and download ZIP file with CSV"""
-    output_zip = io.BytesIO()
-    with zipfile.ZipFile(output_zip, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-        # Single combined file as a .csv (The master file)
-        combined_csv = combined.to_csv(index=False)
-        zf.writestr("mailchimp_upload_combined.csv", combined_csv)
-
-    output_zip.seek(0)
-    return send_file(
-        output_zip,
-        as_attachment=True,
-        download_name=f"mailchimp_upload_{datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+    config = read_config()
+    return config.api_key, config.audience_id
+
+def _zip_response(chunks):
+    download_name = f"mailchimp_upload_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+    return Response(
+        stream_with_context(chunks),
         mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={download_name}"},
     )
 
-def upload_to_mailchimp_and_show_results(combined):
-    """Upload contacts to Mailchimp and display results"""
+def download_zip(combined, per_source=False, parquet=False, compression=None):
+    """Stream a ZIP of the combined CSV, optionally with one CSV per source and a Parquet file.
+
+    compression is one of processors.export.ZIP_COMPRESSION's choices.
+    """
+    month = datetime.now().strftime("%b %Y") if per_source else None
+    method, level = zip_compression(compression)
+    return _zip_response(iter_zip(combined, month=month, compression=method, compresslevel=level, parquet=parquet))
+
+def download_zip_streamed(uploads, upload_date_label, per_source=False, parquet=False, compression=None):
+    """download_zip() for uploads too big to combine in memory, processed chunk by chunk as the zip is sent.
+
+    uploads are closed once the response is done with them.
+    """
+    month = datetime.now().strftime("%b %Y") if per_source else None
+    method, level = zip_compression(compression)
+    source_errors = {}
+    batches = iter_contact_batches(*uploads, upload_date_label, source_errors=source_errors)
+    # Run up to the first batch here, so a failure of every source is still an error page
     try:
-        validate_mailchimp_config()
+        first = next(batches)
+    except StopIteration:
+        close_uploads(uploads)
+        return redirect(url_for("index"))
     except ValueError as e:
+        close_uploads(uploads)
         return render_template("error.html", message=str(e)), 400
+    response = _zip_response(iter_zip_batches(itertools.chain([first], batches), month=month, compression=method,
+                                              compresslevel=level, parquet=parquet, source_errors=source_errors))
+    response.call_on_close(lambda: close_uploads(uploads))
+    return response
+
+def _upload_job(job, files, upload_date_label, list_id, mode, priority):
+    """Background job body: build the combined frame, then upload it; the spooled uploads are removed after.
+
+    The results are saved to the results store, and the job keeps them
+    without the failed contacts, which the results page reads a page at a time.
+    If they cannot be saved the job keeps them whole, failed contacts included.
+    """
+    try:
+        results = process_and_upload(job, files, upload_date_label, list_id, mode, priority, mailchimp_clients)
+    finally:
+        close_uploads(files)
 
-    client = get_mailchimp_client()
-    list_id = os.environ.get("MAILCHIMP_AUDIENCE_ID")
-
-    results = {
-        "total": 0,
-        "successful": 0,
-        "failed": 0,
-        "errors": []
-    }
-
-    for idx, row in combined.iterrows():
-        results["total"] += 1
-        email = row["Email1"]
-
-        # Skip invalid emails
-        if not isinstance(email, str) or "@" not in email:
-            results["failed"] += 1
-            results["errors"].append({
-                "email": str(email),
-                "reason": "Invalid email address format"
-            })
-            continue
-        """When making a call for information about a particular contact, the Marketing API uses the MD5 hash of the 
-        lowercase version of the contacts email address. We use the MD5 hash because it makes 
-        it less likely to leak email addresses—these hashes cant be translated back to an email address, so if your APIs calls were 
-        leaked in some manner, your users email addresses remain unexposed.
-        https://mailchimp.com/developer/marketing/docs/methods-parameters/#path-parameters"""
+    try:
+        store = open_results_store()
+        if store is None:
+            return results
         try:
-            # Calculate subscriber hash
-            subscriber_hash = hashlib.md5(email.lower().encode()).hexdigest()
-
-            # Prepare merge fields
-            merge_fields = {
-                "FNAME": str(row.get("Fname", "")),
-                "LNAME": str(row.get("Lname", ""))
-
-            }
-
-            # Add Organisation if there
-            org = str(row.get("Organisation", "")).strip()
-            if org:
-                merge_fields["COMPANY"] = org
-
-            # Add Country if present
-            country = str(row.get("Country", "")).strip()
-            if country:
-                merge_fields["COUNTRY"] = country
-
-            # Add/update member
-            client.lists.set_list_member(list_id, subscriber_hash, {
-                "email_address": email,
-                "status_if_new": "subscribed",
-                "merge_fields": merge_fields
-            })
-
-            # Apply tags
-            tags_list = parse_tags_from_csv(row.get("Tags", ""))
-            if tags_list:
-                client.lists.update_list_member_tags(list_id, subscriber_hash, {
-                    "tags": [{"name": tag, "status": "active"} for tag in tags_list]
-                })
-
-            results["successful"] += 1
-
-
-            """Mailchimp's API has a rate limit of approximately 10 requests per second. If we send
-            to quick, Mailchimp will reject them. By sleeping for 0.11 seconds between each contact,
-            we stay safely under the limit which is around 9 req per seconds"""
-            # Rate limiting
-            time.sleep(0.11)
-
-
-        # Some error handling to avoid crashing entire upload if some things are wrong
-        except ApiClientError as e:
-            results["failed"] += 1
-            results["errors"].append({
-                "email": email,
-                "reason": f"Mailchimp API error: {e.text}"
-            })
-        except Exception as e:
-            results["failed"] += 1
-            results["errors"].append({
-                "email": email,
-                "reason": f"Unexpected error: {str(e)}"
-            })
-
-    return render_template("upload_results.html", results=results)
+            store.save(job.id, results)
+        finally:
+            store.close()
+    except (sqlite3.Error, OSError):
+        # The upload itself is done; a locked database or full disk must not fail the job
+        logger.exception("Could not save the results of job %s", job.id)
+        return results
+    return {key: value for key, value in results.items() if key != "errors"}
+
+def _run_results(job_id):
+    """Where the results of job_id are read from: the job itself when they were not saved, else the store"""
+    job = job_queue.get(job_id)
+    if job is not None and job.results is not None and "errors" in job.results:
+        return MemoryResults(job_id, job.results)
+    return open_results_store()
+
+def upload_to_mailchimp_and_show_results(uploads, upload_date_label):
+    """Queue the upload as a background job and show its progress page; the job takes over uploads"""
+    try:
+        list_id = mailchimp_clients.config().audience_id
+        mode = upload_mode()
+        concurrency_settings()
+        priority = source_priority()
+    except ValueError as e:
+        close_uploads(uploads)
+        return render_template("error.html", message=str(e)), 400
+
+    job = job_queue.submit(_upload_job, uploads, upload_date_label, list_id, mode, priority)
+    return render_template("job_status.html", job=job.status()), 202
 
 @app.route("/", methods=["GET"])
 def index():
@@ -270,26 +154,145 @@ def process():
 
     website_file = request.files.get("website_list")
 
-    # Generate combined DataFrame
-    combined = generate_combined_dataframe(
+    files = [
         eq_base_start, eq_base_end,
         sp_uk_direct, sp_uk_referrers,
         sp_us_direct, sp_us_referrers,
         row_agents_file, website_file,
-        upload_date_label
-    )
+    ]
+
+    if not upload_date_label or not any(files):
+        return redirect(url_for("index"))
+
+    per_source = bool(request.form.get("per_source_csvs"))
+    parquet = bool(request.form.get("include_parquet"))
+    compression = request.form.get("zip_compression")
+    try:
+        zip_compression(compression)
+    except ValueError as e:
+        return render_template("error.html", message=str(e)), 400
+
+    # Copied off the request, as it closes its files when this view returns
+    try:
+        uploads = spool_uploads(files, max_file_bytes())
+    except UploadTooLarge as e:
+        return render_template("error.html", message=str(e)), 413
+
+    # Uploads run in the background, the request only queues them
+    if action == "upload_to_mailchimp":
+        return upload_to_mailchimp_and_show_results(uploads, upload_date_label)
+
+    if action == "generate_zip" and should_stream(uploads):
+        return download_zip_streamed(uploads, upload_date_label, per_source, parquet, compression)
+
+    # Generate combined DataFrame
+    try:
+        with metrics.STAGE_SECONDS.time(stage="process"):
+            combined = generate_combined_dataframe(*uploads, upload_date_label)
+    except ValueError as e:
+        return render_template("error.html", message=str(e)), 400
+    finally:
+        close_uploads(uploads)
 
     if combined is None:
         return redirect(url_for("index"))
 
     # Route based on the button clicked
     if action == "generate_zip":
-        return download_zip(combined)
-    elif action == "upload_to_mailchimp":
-        return upload_to_mailchimp_and_show_results(combined)
+        return download_zip(combined, per_source=per_source, parquet=parquet, compression=compression)
     else:
         return redirect(url_for("index"))
 
+@app.errorhandler(413)
+def request_too_large(e):
+    limit = app.config["MAX_CONTENT_LENGTH"]
+    message = f"The upload is larger than the {describe_bytes(limit)} limit" if limit else "The upload is too large"
+    return render_template("error.html", message=message), 413
+
+@app.route("/cache", methods=["GET"])
+def parse_cache_stats():
+    return jsonify(cache_stats())
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/mailchimp/connections", methods=["GET"])
+def mailchimp_connection_stats():
+    return jsonify(mailchimp_clients.stats())
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.status())
+
+@app.route("/jobs/<job_id>/results", methods=["GET"])
+def job_results(job_id):
+    """Results of a finished upload, with its failed contacts a page at a time, optionally of one ?reason="""
+    job = job_queue.get(job_id)
+    if job is not None and job.stage == "failed":
+        return render_template("error.html", message=job.error), 500
+    if job is not None and not job.finished:
+        return render_template("job_status.html", job=job.status()), 202
+
+    store = _run_results(job_id)
+    if store is None:
+        return render_template("404.html"), 404
+    reason = request.args.get("reason") or None
+    page = max(request.args.get("page", 1, type=int), 1)
+    try:
+        results = store.summary(job_id)
+        if results is None:
+            return render_template("404.html"), 404
+        reasons = store.kinds(job_id)
+        matching = store.count(job_id, reason)
+        errors = store.errors(job_id, reason, offset=(page - 1) * PAGE_SIZE)
+    finally:
+        store.close()
+
+    return render_template(
+        "upload_results.html", results=results, job_id=job_id, errors=errors, reasons=reasons,
+        reason=reason, page=page, pages=max(-(-matching // PAGE_SIZE), 1), matching=matching,
+        # Rejected rows are only kept with the job, not in the results store
+        rejected_download=job is not None and "rejected.csv" in job.downloads,
+    )
+
+@app.route("/jobs/<job_id>/errors.csv", methods=["GET"])
+def job_error_log(job_id):
+    """Every contact the upload failed (of one ?reason=), streamed as CSV"""
+    store = _run_results(job_id)
+    if store is None:
+        return render_template("404.html"), 404
+    if store.summary(job_id) is None:
+        store.close()
+        return render_template("404.html"), 404
+    reason = request.args.get("reason") or None
+
+    def rows():
+        try:
+            yield from error_log_csv(store, job_id, reason)
+        finally:
+            store.close()
+
+    return Response(
+        stream_with_context(rows()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=errors_{job_id}.csv"},
+    )
+
+@app.route("/jobs/<job_id>/rejected.csv", methods=["GET"])
+def job_rejected_rows(job_id):
+    job = job_queue.get(job_id)
+    if job is None or "rejected.csv" not in job.downloads:
+        return render_template("404.html"), 404
+    return Response(
+        iter_csv(job.downloads["rejected.csv"]),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=rejected_{job_id}.csv"},
+    )
+
 if __name__ == "__main__":
     app.run(debug=True)
     
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""Counters and histograms for where /process spends its time.
+
+Reading, tagging, combining, zipping and the Mailchimp calls all record here,
+and /metrics serves the totals in the Prometheus text format
+(https://prometheus.io/docs/instrumenting/exposition_formats/). Inside
+capture() recordings go to a fresh Registry instead, which is how a job gets
+the numbers for its own run and how processor workers in other processes
+send theirs back with their output.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers both a single API call and a whole month's upload
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_metrics = {}
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {', '.join(self.labelnames) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        registry().add(self.name, self._key(labels), amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        registry().observe(self.name, self._key(labels), bisect.bisect_left(self.buckets, value),
+                           len(self.buckets), value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block took, whether or not it raised"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Registry:
+    """Recorded values: counter totals, and per histogram its bucket counts, sum and count"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def __getstate__(self):
+        with self._lock:
+            return {"counters": dict(self._counters), "histograms": {k: list(v) for k, v in self._histograms.items()}}
+
+    def __setstate__(self, state):
+        self._lock = threading.Lock()
+        self._counters = state["counters"]
+        self._histograms = state["histograms"]
+
+    def add(self, name: str, key: tuple, amount: float):
+        with self._lock:
+            self._counters[name, key] = self._counters.get((name, key), 0) + amount
+
+    def observe(self, name: str, key: tuple, bucket: int, buckets: int, value: float):
+        with self._lock:
+            # buckets + 1 non-cumulative bucket counts (the last is +Inf), then sum and count
+            values = self._histograms.setdefault((name, key), [0] * (buckets + 1) + [0.0, 0])
+            values[bucket] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def merge(self, other: "Registry"):
+        state = other.__getstate__()
+        with self._lock:
+            for k, amount in state["counters"].items():
+                self._counters[k] = self._counters.get(k, 0) + amount
+            for k, values in state["histograms"].items():
+                mine = self._histograms.setdefault(k, [0] * (len(values) - 2) + [0.0, 0])
+                for i, v in enumerate(values):
+                    mine[i] += v
+
+    def value(self, name: str, **labels) -> float:
+        """A counter's total, or a histogram's count, for one set of labels"""
+        key = _metrics[name]._key(labels)
+        with self._lock:
+            if (name, key) in self._histograms:
+                return self._histograms[name, key][-1]
+            return self._counters.get((name, key), 0)
+
+    def samples(self, name: str) -> dict:
+        """{label values: total} for a counter, {label values: [buckets..., sum, count]} for a histogram"""
+        with self._lock:
+            source = self._histograms if _metrics[name].kind == "histogram" else self._counters
+            return {k: (list(v) if isinstance(v, list) else v) for (n, k), v in source.items() if n == name}
+
+    def render(self) -> str:
+        lines = []
+        for metric in _metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(self.samples(metric.name).items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == "counter":
+                    lines.append(f"{metric.name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                bounds = [_number(b) for b in metric.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, value[:-2]):
+                    cumulative += count
+                    lines.append(f"{metric.name}_bucket{_labels(labels + [('le', bound)])} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{metric.name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+_active = contextvars.ContextVar("foxtrot_metrics", default=None)
+
+
+def registry() -> Registry:
+    """Where recordings go right now: the innermost capture(), else REGISTRY"""
+    return _active.get() or REGISTRY
+
+
+@contextmanager
+def capture(propagate: bool = True):
+    """Record into a fresh Registry inside the block.
+
+    On the way out its values are added to the registry that was active before,
+    unless propagate is False, when the caller is expected to merge it itself
+    (e.g. after it comes back from a worker process).
+    """
+    outer = registry()
+    captured = Registry()
+    token = _active.set(captured)
+    try:
+        yield captured
+    finally:
+        _active.reset(token)
+        if propagate:
+            outer.merge(captured)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+STAGE_SECONDS = Histogram(
+    "foxtrot_stage_seconds", "Time spent in each stage of /process and upload jobs", ["stage"])
+READ_SECONDS = Histogram(
+    "foxtrot_read_seconds", "Time to parse one uploaded spreadsheet", ["format"])
+PROCESSOR_SECONDS = Histogram(
+    "foxtrot_processor_seconds", "Time to read and tag one source, parse cache misses only", ["source"])
+PROCESSOR_ROWS = Counter(
+    "foxtrot_processor_rows_total", "Contacts produced by each source's processor", ["source"])
+BYTES_READ = Counter(
+    "foxtrot_bytes_read_total", "Size of the uploaded files each processor read", ["source"])
+SOURCE_ERRORS = Counter(
+    "foxtrot_source_errors_total", "Sources whose processor failed", ["source"])
+PARSE_CACHE = Counter(
+    "foxtrot_parse_cache_total", "Parse cache lookups", ["outcome"])
+EXPORT_BYTES = Counter(
+    "foxtrot_export_bytes_total", "Bytes of zip streamed to downloads")
+API_SECONDS = Histogram(
+    "foxtrot_mailchimp_request_seconds", "Latency of Mailchimp API calls", ["operation"])
+API_RETRIES = Counter(
+    "foxtrot_mailchimp_retries_total", "Mailchimp calls retried after a 429, 5xx or network error", ["operation"])
+API_THROTTLES = Counter(
+    "foxtrot_mailchimp_throttled_total", "Times Mailchimp throttled us and the request rate was cut")
+MAILCHIMP_REQUESTS = Counter(
+    "foxtrot_mailchimp_requests_total", "HTTP requests sent to Mailchimp over the pooled session")
+MAILCHIMP_CONNECTIONS = Counter(
+    "foxtrot_mailchimp_connections_total", "HTTP connections opened to Mailchimp; the rest of the requests reused one")
+UPLOAD_CONTACTS = Counter(
+    "foxtrot_upload_contacts_total", "Contacts handled by uploads", ["outcome"])
+UPLOAD_FAILURES = Counter(
+    "foxtrot_upload_failures_total", "Contacts that failed to upload", ["reason"])
+
+
+def _upper_bound(buckets: tuple, counts: list, quantile: float):
+    """Upper bound of the bucket holding the quantile, None when it is the +Inf bucket"""
+    target = quantile * sum(counts)
+    seen = 0
+    for bound, count in zip(buckets, counts):
+        seen += count
+        if seen >= target:
+            return bound
+    return None
+
+
+def summary(run: Registry) -> dict:
+    """The numbers upload_results.html shows for one run"""
+    processor_seconds = run.samples(PROCESSOR_SECONDS.name)
+    rows = run.samples(PROCESSOR_ROWS.name)
+    read = run.samples(BYTES_READ.name)
+    sources = [
+        {
+            "source": key[0],
+            "seconds": round(values[-2], 3),
+            "rows": int(rows.get(key, 0)),
+            "bytes": int(read.get(key, 0)),
+        }
+        for key, values in processor_seconds.items()
+    ]
+
+    api = []
+    retries = run.samples(API_RETRIES.name)
+    for key, values in sorted(run.samples(API_SECONDS.name).items()):
+        p95 = _upper_bound(API_SECONDS.buckets, values[:-2], 0.95)
+        api.append({
+            "operation": key[0],
+            "calls": values[-1],
+            "retries": int(retries.get(key, 0)),
+            "mean_ms": round(values[-2] / values[-1] * 1000, 1),
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        })
+
+    return {
+        "stages": {key[0]: round(values[-2], 3) for key, values in run.samples(STAGE_SECONDS.name).items()},
+        "sources": sources,
+        "cached_sources": int(run.value(PARSE_CACHE.name, outcome="hit")),
+        "api": api,
+        "failures": {key[0]: int(count) for key, count in sorted(run.samples(UPLOAD_FAILURES.name).items())},
+    }
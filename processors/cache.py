@@ -0,0 +1,193 @@
+"""Content-addressed cache of processor output.
+
+People often submit the same spreadsheets more than once (generate the zip,
+check it, then upload with the same form), and every submission used to
+re-parse every workbook. Processor output is stored as Parquet under a key made
+from the uploaded bytes, the processor, its parameters, the processor source
+code and the classifier rules, so a repeat submission skips Excel parsing
+entirely. The directory is kept under a size limit by evicting the least
+recently used entries.
+
+FOXTROT_CACHE_DIR sets the directory, by default foxtrot_cache in the
+system temp directory (so not wherever the app happens to be started from);
+an empty string turns the cache off. FOXTROT_CACHE_MAX_BYTES sets the size
+limit, 512 MiB by default.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+
+import metrics
+from .classify import config_digest
+from .common import CONTACT_DTYPES, TEXT, make_tag_tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "foxtrot_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Separator used to store a tag tuple as one dictionary-encoded string
+_TAG_SEPARATOR = "\x1f"
+
+
+def cache_stats() -> dict:
+    """Hits and misses since start-up, from the process-wide metrics"""
+    return {
+        "hits": int(metrics.REGISTRY.value(metrics.PARSE_CACHE.name, outcome="hit")),
+        "misses": int(metrics.REGISTRY.value(metrics.PARSE_CACHE.name, outcome="miss")),
+    }
+
+
+def _code_version() -> str:
+    """Digest of the processor sources, so changing a processor invalidates its entries"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _content_digest(source) -> str:
+    """sha256 of an uploaded file (stream or path), leaving streams rewound"""
+    digest = hashlib.sha256()
+    if hasattr(source, "read"):
+        source.seek(0)
+        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(chunk)
+        source.seek(0)
+    else:
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_tags(df: pd.DataFrame) -> pd.DataFrame:
+    """Tag tuples as a categorical of joined strings, which Parquet dictionary-encodes"""
+    tags = df["Tags"].astype("category")
+    joined = [_TAG_SEPARATOR.join(t) for t in tags.cat.categories]
+    return df.assign(Tags=pd.Categorical.from_codes(tags.cat.codes, categories=joined))
+
+
+def _decode_tags(df: pd.DataFrame) -> pd.DataFrame:
+    tags = df["Tags"].astype("category")
+    tuples = [make_tag_tuple(c.split(_TAG_SEPARATOR)) if c else () for c in tags.cat.categories]
+    return df.assign(Tags=pd.Series(pd.array(tuples, dtype=object)[tags.cat.codes], index=df.index))
+
+
+def _encode(df: pd.DataFrame) -> pd.DataFrame:
+    """df in types Parquet round-trips: pandas cannot read back dictionary-typed Arrow columns"""
+    if "Tags" in df.columns:
+        df = _encode_tags(df)
+    dictionaries = {
+        col: df[col].astype(TEXT)
+        for col in df.columns
+        if isinstance(df[col].dtype, pd.ArrowDtype) and pa.types.is_dictionary(df[col].dtype.pyarrow_dtype)
+    }
+    return df.assign(**dictionaries) if dictionaries else df
+
+
+def _decode(df: pd.DataFrame) -> pd.DataFrame:
+    """Undo _encode(), with the contact columns back in their CONTACT_DTYPES"""
+    if "Tags" in df.columns:
+        df = _decode_tags(df)
+    restored = {col: df[col].astype(dtype) for col, dtype in CONTACT_DTYPES.items() if col in df.columns}
+    return df.assign(**restored)
+
+
+class ParseCache:
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._version = _code_version()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, name: str, files, **params) -> str:
+        payload = json.dumps({
+            "processor": name,
+            "params": params,
+            "files": [_content_digest(f) for f in files],
+            "code": self._version,
+            "rules": config_digest(),
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            df = _decode(pd.read_parquet(path))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, KeyError, pa.ArrowException) as e:
+            # Unreadable or written in a form this code cannot decode; process the source again
+            logger.warning("Dropping unreadable cache entry %s: %s", key, e)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        # Touch so eviction sees this entry as recently used
+        os.utime(path)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame):
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        stored = _encode(df)
+        try:
+            stored.reset_index(drop=True).to_parquet(tmp_path, index=False)
+        except (ValueError, TypeError, OSError) as e:
+            # e.g. a column mixing numbers and text; the result is still good, just not cached
+            logger.warning("Not caching %s: %s", key, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        # Atomic, so concurrent jobs never read a half-written entry
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.parquet")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def fetch(self, name: str, key: str):
+        """get() that counts and logs the hit or miss"""
+        df = self.get(key)
+        hit = df is not None
+        metrics.PARSE_CACHE.inc(outcome="hit" if hit else "miss")
+        logger.info("Parse cache %s for %s", "hit" if hit else "miss", name)
+        return df
+
+
+def open_parse_cache():
+    """ParseCache at FOXTROT_CACHE_DIR, or None when it is set to an empty string"""
+    directory = os.environ.get("FOXTROT_CACHE_DIR", DEFAULT_DIR)
+    if not directory:
+        return None
+    return ParseCache(directory, int(os.environ.get("FOXTROT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
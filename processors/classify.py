@@ -0,0 +1,93 @@
+"""Rule-table classifiers for the region and interest tags.
+
+The rules live in classifiers.json (or the file named by FOXTROT_CLASSIFIERS),
+so adding a region or an interest is a config change. Each table is a list of
+{"label", "contains"} rules matched case-insensitively as substrings. A table
+compiles into one regular expression with a lookahead per rule, so a single
+match() tells which rules hit. A Series is classified once per distinct value
+and the results are broadcast back to the rows, and values seen before are
+served from a cache.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "classifiers.json")
+
+# Per-classifier bound on remembered values, so odd free-text columns can't grow it forever
+MAX_CACHED = 100_000
+
+
+class Classifier:
+    def __init__(self, rules: list, multiple: bool = False, default=None):
+        """multiple: every matching label as a tuple, else the first matching label or default"""
+        self.labels = [rule["label"] for rule in rules]
+        self.multiple = multiple
+        self.default = () if multiple else default
+        # (?:(?=.*?(?P<rN>...))|) records rule N if it occurs anywhere and never fails
+        self._matcher = re.compile("".join(
+            f"(?:(?=.*?(?P<r{i}>{'|'.join(re.escape(p.lower()) for p in rule['contains'])}))|)"
+            for i, rule in enumerate(rules)
+        ), re.DOTALL)
+        self._cache = {}
+
+    def __call__(self, value):
+        """Classify one value; anything but a string gets the default"""
+        if not isinstance(value, str):
+            return self.default
+        try:
+            return self._cache[value]
+        except KeyError:
+            pass
+
+        groups = self._matcher.match(value.lower()).groups()
+        hits = [label for label, group in zip(self.labels, groups) if group is not None]
+        if self.multiple:
+            result = tuple(hits)
+        else:
+            result = hits[0] if hits else self.default
+
+        if len(self._cache) >= MAX_CACHED:
+            self._cache.clear()
+        self._cache[value] = result
+        return result
+
+    def classify(self, values: pd.Series) -> pd.Series:
+        """Classify a whole column, once per distinct value"""
+        codes, uniques = pd.factorize(values)
+        results = np.empty(len(uniques) + 1, dtype=object)
+        results[:-1] = [self(u) for u in np.asarray(uniques, dtype=object)]
+        # Missing values (code -1) take the last slot
+        results[-1] = self.default
+        return pd.Series(results[codes], index=values.index)
+
+
+def config_path() -> str:
+    return os.environ.get("FOXTROT_CLASSIFIERS") or DEFAULT_CONFIG
+
+
+def config_digest() -> str:
+    """Digest of the rule file in use, so cached processor output follows rule changes"""
+    with open(config_path(), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    return {
+        name: Classifier(table["rules"], multiple=table.get("multiple", False), default=table.get("default"))
+        for name, table in config.items()
+    }
+
+
+def classifier(name: str) -> Classifier:
+    """The named table from the rule file, compiled once per process"""
+    return _load(config_path())[name]
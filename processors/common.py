@@ -1,57 +1,108 @@
-import pandas as pd
-
-CONTACT_COLUMNS = [
-    "Name",
-    "Fname",
-    "Lname",
-    "Email1",
-    "Organisation",
-    "Country",
-    "Tags",
-]
-
-def split_name(full_name: str):
-    if not isinstance(full_name, str) or not full_name.strip():
-        return "", ""
-    parts = full_name.strip().split()
-    if len(parts) == 1:
-        return parts[0], ""
-    return parts[0], " ".join(parts[1:])
-
-def technical_tags_to_interest(tech_string: str):
-    # Mapping the SharePoint 'Technical tags' such as Patents, TMs
-    # into high level interest tags for Mailchimp
-
-    if not isinstance(tech_string, str):
-        return []
-    
-    tags = tech_string.lower()
-    interests = []
-
-    if "patent" in tags:
-        interests.append("Patent Interest")
-    if "tm" in tags or "trade mark" in tags or "trade-mark" in tags:
-        interests.append("TM Interest")
-    if "design" in tags:
-        interests.append("Design Interest")
-
-    return interests
-
-def region_from_state_uk(state_area: str):
-    # Simple regiopn mapping for the UK
-    
-    if not isinstance(state_area, str):
-        return "UK - Region Unknown"
-    
-    s = state_area.lower()
-
-    if "edinburgh" in s:
-        return "Edinburgh & South-East Scotland"
-    if "glasgow" in s:
-        return "Glasgow & South-West Scotland"
-    if "aberdeen" in s:
-        return "Aberdeen & Norht-East Scotland"
-    if "york" in s or "newcastle" in s or "north east" in s:
-        return "Newcastle & Nother-East England"
-    
-    return "UK - Region Unknown"
\ No newline at end of file
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .classify import classifier
+
+CONTACT_COLUMNS = [
+    "Name",
+    "Fname",
+    "Lname",
+    "Email1",
+    "Organisation",
+    "Country",
+    "Tags",
+]
+
+# Arrow-backed column types of a contact frame. Text is Arrow UTF-8, so
+# pd.concat joins sources by chaining their buffers instead of copying rows,
+# and the columns with few distinct values are dictionary-encoded: one small
+# integer per row plus each distinct value once. Tags stays a column of the
+# tuples tags_by_key shares between rows (one pointer per row), which the
+# merge and upload steps work on; the export dictionary-encodes it as text.
+TEXT = pd.ArrowDtype(pa.string())
+DICTIONARY = pd.ArrowDtype(pa.dictionary(pa.int32(), pa.string()))
+CONTACT_DTYPES = {
+    "Name": TEXT,
+    "Fname": TEXT,
+    "Lname": TEXT,
+    "Email1": TEXT,
+    "Organisation": DICTIONARY,
+    "Country": DICTIONARY,
+}
+
+def contact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """The CONTACT_COLUMNS of df in their CONTACT_DTYPES; columns already in them are not copied"""
+    if list(df.columns) != CONTACT_COLUMNS:
+        df = df[CONTACT_COLUMNS]
+    changed = {
+        col: df[col].astype(dtype)
+        for col, dtype in CONTACT_DTYPES.items()
+        if df[col].dtype != dtype
+    }
+    return df.assign(**changed) if changed else df
+
+def split_name(full_name: str):
+    if not isinstance(full_name, str) or not full_name.strip():
+        return "", ""
+    parts = full_name.strip().split()
+    if len(parts) == 1:
+        return parts[0], ""
+    return parts[0], " ".join(parts[1:])
+
+def split_names(full_names: pd.Series):
+    """Vectorised split_name(str(x)) over a whole column, returns (fnames, lnames)"""
+    # str() each value the way split_name's callers do, then collapse runs of
+    # whitespace so the first space separates first name from the rest
+    text = pd.Series(np.asarray(full_names, dtype=object).astype(str), index=full_names.index, dtype=object)
+    parts = text.str.strip().str.replace(r"\s+", " ", regex=True).str.partition(" ")
+    return parts[0].astype(str), parts[2].astype(str)
+
+def format_tags(tags) -> str:
+    # Mailchimp import format: "a","b","c"
+    return '"' + '","'.join(str(t) for t in tags) + '"'
+
+def map_unique(values: pd.Series, fn) -> pd.Series:
+    """Apply fn once per distinct value and broadcast the results back to every row"""
+    codes, uniques = pd.factorize(values)
+    mapped = [fn(u) for u in uniques]
+    missing = codes == -1
+    if missing.any():
+        # Missing values share one slot; fn sees the first missing value as it was
+        mapped.append(fn(values.iloc[int(np.argmax(missing))]))
+    result = np.empty(len(mapped), dtype=object)
+    result[:] = mapped
+    return pd.Series(result[codes], index=values.index)
+
+def make_tag_tuple(tags) -> tuple:
+    """Tags as an immutable tuple of interned strings, the form the Tags column holds"""
+    return tuple(sys.intern(str(t)) for t in tags)
+
+def tags_by_key(keys: pd.DataFrame, make_tags) -> pd.Series:
+    """Build the Tags tuple once per distinct combination of the key columns.
+
+    Tags only depend on a handful of low-cardinality values (list type, region,
+    interests, country), so instead of a Python loop over every row we factorize
+    the keys, call make_tags(*key_values) for the first row of each group and
+    broadcast the result back. Rows in the same group share one tuple object;
+    quoting for the CSV export happens in processors.export._tags_column.
+    """
+    group = np.zeros(len(keys), dtype=np.int64)
+    for col in keys.columns:
+        codes, uniques = pd.factorize(keys[col], use_na_sentinel=False)
+        group, _ = pd.factorize(group * (len(uniques) + 1) + codes)
+    group_ids, first_rows = np.unique(group, return_index=True)
+    tags = np.empty(len(group_ids), dtype=object)
+    tags[:] = [make_tag_tuple(make_tags(*row)) for row in keys.iloc[first_rows].itertuples(index=False)]
+    return pd.Series(tags[group], index=keys.index)
+
+def technical_tags_to_interest(tech_string: str):
+    # Mapping the SharePoint 'Technical tags' such as Patents, TMs
+    # into high level interest tags for Mailchimp (rules in classifiers.json)
+    return list(classifier("interest")(tech_string))
+
+def region_from_state_uk(state_area: str):
+    # Region mapping for the UK (rules in classifiers.json)
+    return classifier("uk_region")(state_area)
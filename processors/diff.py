@@ -0,0 +1,85 @@
+"""Compare two EQ snapshots by normalised email.
+
+EQ exports are keyed on email, but the same person can appear with different
+capitalisation or surrounding whitespace, and an email can repeat within one
+export. We normalise the key, keep the last row per email, and compare the two
+snapshots with hash joins, so the cost is linear in the number of rows. Each
+snapshot is reduced to a 64-bit hash of the key and a 64-bit fingerprint of the
+compared fields; only the rows in the result are copied out of the inputs.
+
+Both snapshots are still read whole before they are compared, so memory
+grows with the size of the exports; the hashes keep the comparison itself
+small next to the frames.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# Fields that make a contact count as changed between snapshots
+COMPARE_FIELDS = ("name", "organisation", "country")
+
+
+class SnapshotDiff(NamedTuple):
+    new: pd.DataFrame       # rows of the end snapshot whose email is not in start
+    removed: pd.DataFrame   # rows of the start snapshot whose email is not in end
+    changed: pd.DataFrame   # rows of the end snapshot whose compared fields differ from start
+
+
+def normalize_emails(emails: pd.Series) -> pd.Series:
+    return emails.fillna("").astype(str).str.strip().str.lower()
+
+
+def _latest_per_key(df: pd.DataFrame, key: str) -> tuple:
+    """Drop blank keys and keep the last row per normalised key.
+
+    Returns (row positions, keys, key hashes); joins run on the 64-bit key
+    hashes, which is much cheaper than hashing and comparing the strings again.
+    """
+    keys = normalize_emails(df[key]).to_numpy(dtype=object)
+    hashes = pd.util.hash_array(keys, categorize=False)
+    keep = (keys != "") & ~pd.Series(hashes).duplicated(keep="last").to_numpy()
+    return np.flatnonzero(keep), keys[keep], hashes[keep]
+
+
+def _normalized_text(values: pd.Series) -> np.ndarray:
+    """str(x).strip() per row with missing as blank, worked out once per distinct value"""
+    codes, uniques = pd.factorize(values)
+    texts = np.array([str(u).strip() for u in np.asarray(uniques, dtype=object)] + [""], dtype=object)
+    return texts[codes]
+
+
+def _fingerprints(df: pd.DataFrame, positions: np.ndarray, fields) -> np.ndarray:
+    """One uint64 per kept row over the compared fields, missing columns count as blank"""
+    values = pd.DataFrame({
+        field: _normalized_text(df[field])[positions] if field in df.columns else ""
+        for field in fields
+    }, index=range(len(positions)))
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def diff_snapshots(start: pd.DataFrame, end: pd.DataFrame, key: str = "email1",
+                   compare=COMPARE_FIELDS) -> SnapshotDiff:
+    start_positions, _, start_hashes = _latest_per_key(start, key)
+    end_positions, end_keys, end_hashes = _latest_per_key(end, key)
+
+    start_index = pd.Series(_fingerprints(start, start_positions, compare), index=start_hashes)
+    end_fingerprints = _fingerprints(end, end_positions, compare)
+
+    in_start = pd.Index(end_hashes).isin(start_hashes)
+    in_end = pd.Index(start_hashes).isin(end_hashes)
+
+    changed = np.zeros(len(end_positions), dtype=bool)
+    previous = start_index.reindex(end_hashes[in_start]).to_numpy()
+    changed[in_start] = previous != end_fingerprints[in_start]
+
+    # Order by email so repeated runs give the same output
+    new_order = np.flatnonzero(~in_start)
+    new_order = new_order[np.argsort(end_keys[new_order], kind="stable")]
+
+    return SnapshotDiff(
+        new=end.iloc[end_positions[new_order]].reset_index(drop=True),
+        removed=start.iloc[start_positions[~in_end]].reset_index(drop=True),
+        changed=end.iloc[end_positions[changed]].reset_index(drop=True),
+    )
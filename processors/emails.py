@@ -0,0 +1,58 @@
+"""Normalise, validate and hash the email column once, before any upload starts.
+
+The uploader used to check each row with "@" in email and MD5 it on the way
+to the API, so bad addresses only showed up once uploading was under way.
+prepare_emails() works over the whole Email1 column: it trims and lower-cases
+every address, checks it against EMAIL_PATTERN with one vectorised match,
+computes the subscriber hash of each distinct valid address, and splits the
+frame into the rows to upload and the rows rejected with a reason.
+"""
+
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+from .diff import normalize_emails
+
+# Dot-atom local part and a dotted domain of LDH labels. Deliberately stricter
+# than RFC 5322 (no quoted local parts or IP literals), which Mailchimp rejects anyway.
+EMAIL_PATTERN = re.compile(
+    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?"
+)
+
+MISSING_REASON = "Missing email address"
+INVALID_REASON = "Invalid email address format"
+
+HASH_COLUMN = "subscriber_hash"
+REASON_COLUMN = "Reason"
+
+
+def subscriber_hashes(emails: pd.Series) -> np.ndarray:
+    """MD5 hex digest of each (already lower-cased) email, hashing each distinct value once"""
+    codes, uniques = pd.factorize(emails)
+    md5 = hashlib.md5
+    digests = np.array([md5(e.encode()).hexdigest() for e in uniques.tolist()], dtype=object)
+    return digests[codes]
+
+
+def prepare_emails(df: pd.DataFrame, column: str = "Email1") -> tuple:
+    """Split df into (valid, rejected) rows.
+
+    valid has column normalised and a subscriber_hash column; rejected keeps
+    the rows as they were, plus a Reason column. Both keep the original order.
+    """
+    emails = normalize_emails(df[column])
+    missing = (emails == "").to_numpy()
+    matches = emails.str.fullmatch(EMAIL_PATTERN.pattern).to_numpy(dtype=bool, na_value=False)
+    valid_rows = matches & ~missing
+
+    valid = df[valid_rows].copy()
+    valid[column] = emails[valid_rows].to_numpy(dtype=object)
+    valid[HASH_COLUMN] = subscriber_hashes(valid[column])
+
+    rejected = df[~valid_rows].copy()
+    rejected[REASON_COLUMN] = np.where(missing[~valid_rows], MISSING_REASON, INVALID_REASON)
+    return valid.reset_index(drop=True), rejected.reset_index(drop=True)
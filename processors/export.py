@@ -0,0 +1,301 @@
+"""Stream the combined frame out as a zip of CSVs.
+
+The zip is written into a sink that hands its bytes straight to the response,
+and the CSVs are formatted a slice of rows at a time, so memory stays flat no
+matter how many rows are exported. Formatting is done by Arrow's CSV writer
+straight from the frame's Arrow buffers, with the Tags column
+dictionary-encoded so each distinct tag set is formatted once. Alongside mailchimp_upload_combined.csv the
+zip can hold one CSV per source, named like the files in
+sample-monthly-data/mailchimp_uploads/.
+
+The zip can also hold mailchimp_upload_combined.parquet, the same contacts
+with typed columns and Tags as a list of strings, for consumers that read
+columns selectively instead of parsing the CSV. It is compressed by Parquet
+itself (zstd, a row group per chunk of rows) and so stored in the zip as is.
+zip_compression() names the zip compression choices the form offers.
+
+iter_zip_batches() writes the same zip from a stream of contact batches (see
+pipeline.iter_contact_batches), for uploads too big to combine in memory.
+"""
+
+import contextlib
+import io
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet
+
+import metrics
+from .common import CONTACT_COLUMNS, CONTACT_DTYPES, contact_frame, format_tags
+
+CHUNK_ROWS = 50_000
+
+# Bytes copied at a time from a spooled per-source CSV into the zip
+SPOOL_READ_BYTES = 1024 * 1024
+
+COMBINED_CSV_NAME = "mailchimp_upload_combined.csv"
+PARQUET_NAME = "mailchimp_upload_combined.parquet"
+
+# Compression choice -> (zip compression, zlib level); "default" is zlib's own level
+ZIP_COMPRESSION = {
+    "default": (zipfile.ZIP_DEFLATED, None),
+    "stored": (zipfile.ZIP_STORED, None),
+    "fast": (zipfile.ZIP_DEFLATED, 1),
+    "max": (zipfile.ZIP_DEFLATED, 9),
+}
+
+PARQUET_SCHEMA = pa.schema(
+    [pa.field(name, dtype.pyarrow_dtype) for name, dtype in CONTACT_DTYPES.items()]
+    + [pa.field("Tags", pa.list_(pa.string()))]
+)
+
+# Source label (see pipeline._sources) -> per-source CSV name, before " - <Mon YYYY>.csv"
+SOURCE_CSV_NAMES = {
+    "EQ": "Master EQ List",
+    "SP UK_DIRECT": "Master SP List - UK Direct",
+    "SP UK_REFERRERS": "Master SP List - UK Referrers",
+    "SP US_DIRECT": "Master SP List - US Direct",
+    "SP US_AGENTS": "Master SP List - US Agents",
+    "ROW agents": "Master SP List - ROW Agents",
+    "Website": "Master Website List",
+}
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable target for ZipFile that collects bytes until drained.
+
+    busy adds up the time from each resume() to the next drain(), which leaves
+    out the time spent waiting for the client to take each chunk.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self.busy = 0.0
+        self._resumed = time.perf_counter()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.busy += time.perf_counter() - self._resumed
+        metrics.EXPORT_BYTES.inc(len(data))
+        return data
+
+    def resume(self):
+        self._resumed = time.perf_counter()
+
+
+def source_csv_name(label: str, month: str) -> str:
+    return f"{SOURCE_CSV_NAMES.get(label, label)} - {month}.csv"
+
+
+def zip_compression(name: str = None) -> tuple:
+    """(compression, compresslevel) for iter_zip() of a ZIP_COMPRESSION choice, "default" when name is empty"""
+    try:
+        return ZIP_COMPRESSION[name or "default"]
+    except KeyError:
+        raise ValueError(f"Unknown zip compression {name!r}, expected one of {', '.join(ZIP_COMPRESSION)}")
+
+
+def _tags_column(tags: pd.Series) -> pa.DictionaryArray:
+    """Tags tuples as their CSV text, formatted once per distinct tag set"""
+    codes, uniques = pd.factorize(tags)
+    dictionary = pa.array([format_tags(t) for t in uniques], type=pa.string())
+    return pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int32(), mask=codes < 0), dictionary)
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """df as an Arrow table for the CSV writer; Arrow-backed columns are not copied"""
+    columns = {}
+    for name in df.columns:
+        if name == "Tags":
+            columns[name] = _tags_column(df[name])
+        else:
+            columns[name] = pa.chunked_array(pa.array(df[name], from_pandas=True))
+    return pa.table(columns)
+
+
+def _tags_list_column(tags: pd.Series) -> pa.ListArray:
+    """Tags tuples as Arrow lists, converting each distinct tag set once"""
+    codes, uniques = pd.factorize(tags)
+    lists = pa.array([list(t) for t in uniques], type=pa.list_(pa.string()))
+    return lists.take(pa.array(codes, type=pa.int32(), mask=codes < 0))
+
+
+def to_parquet_table(df: pd.DataFrame) -> pa.Table:
+    """The contacts in df as a table in PARQUET_SCHEMA"""
+    df = contact_frame(df)
+    columns = [pa.array(df[name], from_pandas=True) for name in CONTACT_DTYPES]
+    columns.append(_tags_list_column(df["Tags"]))
+    return pa.Table.from_arrays(columns, schema=PARQUET_SCHEMA)
+
+
+def _parquet_writer(target) -> pyarrow.parquet.ParquetWriter:
+    return pyarrow.parquet.ParquetWriter(target, PARQUET_SCHEMA, compression="zstd")
+
+
+@contextlib.contextmanager
+def _entry(zf: zipfile.ZipFile, name: str):
+    """Open name for writing with the zip's compression and level, dated now as writestr does.
+
+    zf.open dates a new entry 1980-01-01; the central directory, which zip
+    tools list entries from, gets the current time once the entry is written.
+    """
+    now = time.localtime()[:6]
+    # force_zip64 because the size is not known before the entry is written
+    with zf.open(name, mode="w", force_zip64=True) as entry:
+        yield entry
+    zf.getinfo(name).date_time = now
+
+
+def _stored_entry(zf: zipfile.ZipFile, name: str):
+    """Open name for writing without zip compression, for data that is compressed already"""
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    return zf.open(info, mode="w", force_zip64=True)
+
+
+def iter_csv(df, chunk_rows: int = CHUNK_ROWS, bom: bool = False, header: bool = True):
+    """UTF-8 CSV of df in chunks, written by Arrow.
+
+    Arrow quotes every text field (and the header), which any CSV reader,
+    Excel and the Mailchimp importer included, reads the same as
+    df.to_csv(index=False) would.
+    """
+    if bom:
+        yield "\ufeff".encode()
+    for start in range(0, max(len(df), 1), chunk_rows):
+        buffer = io.BytesIO()
+        options = pyarrow.csv.WriteOptions(include_header=header and start == 0)
+        pyarrow.csv.write_csv(to_arrow(df.iloc[start:start + chunk_rows]), buffer, options)
+        yield buffer.getvalue()
+
+
+def _write_source_errors(zf: zipfile.ZipFile, source_errors: dict):
+    # Sources that failed to process are missing from the CSVs; say which and why
+    if source_errors:
+        zf.writestr("source_errors.txt", "".join(
+            f"{label}: {message}\n" for label, message in source_errors.items()
+        ))
+
+
+def iter_zip(combined, month: str = None, chunk_rows: int = CHUNK_ROWS,
+             compression: int = zipfile.ZIP_DEFLATED, compresslevel: int = None, parquet: bool = False):
+    """Zip bytes, yielded as they are produced.
+
+    With month (e.g. "Nov 2025") the zip also holds a CSV per source listed in
+    combined.attrs["source_rows"]. Those files get the UTF-8 BOM the sample
+    uploads have, so Excel opens them with the right encoding. With parquet it
+    holds the Parquet file of the combined contacts too.
+
+    The "zip" stage time counts only the work done here, not the time spent
+    waiting for the client to take each chunk.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression, compresslevel=compresslevel) as zf:
+        files = [(COMBINED_CSV_NAME, combined, False)]
+        if month:
+            for label, (start, stop) in combined.attrs.get("source_rows", {}).items():
+                files.append((source_csv_name(label, month), combined.iloc[start:stop], True))
+
+        for name, df, bom in files:
+            with _entry(zf, name) as entry:
+                for data in iter_csv(df, chunk_rows, bom):
+                    entry.write(data)
+                    yield sink.drain()
+                    sink.resume()
+
+        if parquet:
+            with _stored_entry(zf, PARQUET_NAME) as entry, _parquet_writer(entry) as writer:
+                for start in range(0, len(combined), chunk_rows):
+                    writer.write_table(to_parquet_table(combined.iloc[start:start + chunk_rows]))
+                    yield sink.drain()
+                    sink.resume()
+
+        _write_source_errors(zf, combined.attrs.get("source_errors"))
+    yield sink.drain()
+    metrics.STAGE_SECONDS.observe(sink.busy, stage="zip")
+
+
+def _copy_spool(sink: _ZipSink, spool, entry):
+    spool.seek(0)
+    while True:
+        data = spool.read(SPOOL_READ_BYTES)
+        if not data:
+            break
+        entry.write(data)
+        yield sink.drain()
+        sink.resume()
+
+
+def iter_zip_batches(batches, month: str = None, chunk_rows: int = CHUNK_ROWS,
+                     compression: int = zipfile.ZIP_DEFLATED, compresslevel: int = None,
+                     parquet: bool = False, source_errors: dict = None):
+    """iter_zip() for a stream of (source label, contacts) batches instead of one frame.
+
+    Each batch goes into the combined CSV as it arrives. The per-source CSVs
+    (with month) and the Parquet file cannot be written at the same time, as a
+    zip entry must be finished before the next one starts, so they are spooled
+    to temporary files and copied in afterwards. source_errors is read once
+    the batches are used up, so it can be the dict the batches' producer fills in.
+
+    Here the "zip" stage time includes producing the batches.
+    """
+    sink = _ZipSink()
+    spools = {}
+    parquet_spool = tempfile.TemporaryFile() if parquet else None
+    writer = _parquet_writer(parquet_spool) if parquet else None
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=compression, compresslevel=compresslevel) as zf:
+            with _entry(zf, COMBINED_CSV_NAME) as entry:
+                header = True
+                for label, batch in batches:
+                    for data in iter_csv(batch, chunk_rows, header=header):
+                        entry.write(data)
+                        yield sink.drain()
+                        sink.resume()
+                    header = False
+
+                    if month:
+                        first = label not in spools
+                        if first:
+                            spools[label] = tempfile.TemporaryFile()
+                        for data in iter_csv(batch, chunk_rows, bom=first, header=first):
+                            spools[label].write(data)
+                    if writer is not None:
+                        for start in range(0, len(batch), chunk_rows):
+                            writer.write_table(to_parquet_table(batch.iloc[start:start + chunk_rows]))
+                if header:
+                    # No batches at all: the CSV still gets its header
+                    for data in iter_csv(pd.DataFrame(columns=CONTACT_COLUMNS)):
+                        entry.write(data)
+
+            for label, spool in spools.items():
+                with _entry(zf, source_csv_name(label, month)) as entry:
+                    yield from _copy_spool(sink, spool, entry)
+
+            if writer is not None:
+                writer.close()
+                with _stored_entry(zf, PARQUET_NAME) as entry:
+                    yield from _copy_spool(sink, parquet_spool, entry)
+
+            _write_source_errors(zf, source_errors)
+        yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+            parquet_spool.close()
+        for spool in spools.values():
+            spool.close()
+    metrics.STAGE_SECONDS.observe(sink.busy, stage="zip")
@@ -0,0 +1,153 @@
+"""Shared reader for the uploaded spreadsheets.
+
+SharePoint exports are wide (18+ columns) and we only use five or six of them,
+so we read the header row first, resolve the columns we need through their
+aliases, and then load just those. .xlsx files are parsed with python-calamine
+(Rust, much faster than openpyxl) when it is installed, otherwise with pandas'
+default openpyxl reader, which already opens workbooks read-only.
+
+Large CSVs can also be read a chunk of rows at a time with iter_table(), so
+a processor never holds more than one chunk of the raw file. CSVs given as a
+path (uploads spooled to disk, see uploads.py) are memory-mapped rather than
+read into a buffer.
+"""
+
+import importlib.util
+import logging
+import os
+import time
+
+import pandas as pd
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+
+def csv_chunk_rows() -> int:
+    """FOXTROT_CSV_CHUNK_ROWS, the rows iter_table() reads from a CSV at a time"""
+    rows = int(os.environ.get("FOXTROT_CSV_CHUNK_ROWS", DEFAULT_CHUNK_ROWS))
+    if rows < 1:
+        raise ValueError("FOXTROT_CSV_CHUNK_ROWS must be positive")
+    return rows
+
+
+def excel_engine():
+    """Fastest installed engine for pd.read_excel, None meaning pandas' default"""
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return None
+
+
+def _filename(source) -> str:
+    return getattr(source, "filename", None) or str(source)
+
+
+def is_csv(source) -> bool:
+    return _filename(source).lower().endswith(".csv")
+
+
+def _memory_map(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def get_column(df, possible_names):
+    """Try to find a column by checking possible names (case-insensitive)"""
+    columns = getattr(df, "columns", df)
+    df_columns_lower = {str(col).lower(): col for col in columns}
+    for name in possible_names:
+        if name.lower() in df_columns_lower:
+            return df_columns_lower[name.lower()]
+    # If not found, return the first option
+    return possible_names[0]
+
+
+def read_header(source) -> list:
+    """Column names of the first sheet/CSV without reading any data rows"""
+    if is_csv(source):
+        header = pd.read_csv(source, nrows=0).columns
+    else:
+        header = pd.read_excel(source, nrows=0, engine=excel_engine()).columns
+    _rewind(source)
+    return list(header)
+
+
+def _usecols(source, columns: dict):
+    """{column in the file: canonical name} for the wanted columns the file has, None for all columns"""
+    if not columns:
+        return None
+    header = read_header(source)
+    usecols = {}
+    for canonical, aliases in columns.items():
+        found = get_column(header, aliases)
+        if found in header:
+            usecols[found] = canonical
+    return usecols
+
+
+def read_table(source, columns: dict = None) -> pd.DataFrame:
+    """Read a .csv/.xlsx upload, loading only the wanted columns.
+
+    columns maps each canonical column name to its accepted aliases. Columns
+    found in the file are returned under their canonical name; ones that are
+    missing are simply absent. Without columns the whole sheet is read. CSV
+    columns are all read as text.
+    """
+    started = time.perf_counter()
+    usecols = _usecols(source, columns)
+
+    if is_csv(source):
+        # As text, like iter_table(), so "007" is not read as the number 7.0
+        df = pd.read_csv(source, usecols=list(usecols) if usecols is not None else None, dtype=str,
+                         memory_map=_memory_map(source))
+    else:
+        df = pd.read_excel(source, usecols=list(usecols) if usecols is not None else None,
+                           engine=excel_engine())
+    if usecols:
+        df = df.rename(columns=usecols)
+
+    elapsed = time.perf_counter() - started
+    metrics.READ_SECONDS.observe(elapsed, format="csv" if is_csv(source) else "xlsx")
+    logger.info("Parsed %s: %d rows, %d columns in %.3fs", _filename(source), len(df), len(df.columns), elapsed)
+    return df
+
+
+def iter_table(source, columns: dict = None, chunk_rows: int = None):
+    """Yield the upload as frames of at most chunk_rows rows, projected like read_table().
+
+    Only CSVs are chunked; a workbook comes back as one frame. Chunks keep the
+    row numbers of the file in their index. Every CSV column is read as text,
+    so a chunk whose values happen to all look like numbers is not turned into
+    floats when the rest of the file is text.
+    """
+    if not is_csv(source):
+        yield read_table(source, columns)
+        return
+
+    started = time.perf_counter()
+    usecols = _usecols(source, columns)
+    reader = pd.read_csv(source, usecols=list(usecols) if usecols is not None else None, dtype=str,
+                         chunksize=chunk_rows or csv_chunk_rows(), memory_map=_memory_map(source))
+    # Only the parsing counts, not the time the consumer spends on each chunk
+    busy = time.perf_counter() - started
+    rows = chunks = 0
+    with reader:
+        while True:
+            started = time.perf_counter()
+            chunk = next(reader, None)
+            busy += time.perf_counter() - started
+            if chunk is None:
+                break
+            rows += len(chunk)
+            chunks += 1
+            yield chunk.rename(columns=usecols) if usecols else chunk
+
+    metrics.READ_SECONDS.observe(busy, format="csv")
+    logger.info("Parsed %s: %d rows in %d chunks in %.3fs", _filename(source), rows, chunks, busy)
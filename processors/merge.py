@@ -0,0 +1,145 @@
+"""Merge contacts that appear in more than one source before uploading.
+
+The same person is often in EQ, an SP list and the website list. Uploading the
+concatenated frame sends a member call and a tags call per row, and later rows
+overwrite the merge fields of earlier ones. Here rows are grouped on the
+normalised email (a hash group-by, linear in the number of rows), their tags are
+unioned, and each merge field is taken from the highest-priority source that
+has a value for it.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .common import make_tag_tuple
+from .diff import normalize_emails
+
+# Highest priority first. The default makes later sources win, which is what
+# uploading them one after another used to leave in Mailchimp.
+DEFAULT_SOURCE_PRIORITY = (
+    "Website",
+    "ROW agents",
+    "SP US_AGENTS",
+    "SP US_DIRECT",
+    "SP UK_REFERRERS",
+    "SP UK_DIRECT",
+    "EQ",
+)
+
+# Taken together from one row, so a first name is never paired with someone else's surname
+NAME_FIELDS = ["Name", "Fname", "Lname"]
+# Each taken from the highest-priority row where it is filled in
+SINGLE_FIELDS = ["Organisation", "Country"]
+
+
+def source_priority() -> tuple:
+    """FOXTROT_SOURCE_PRIORITY as source labels, highest first; unlisted sources rank after, in default order"""
+    configured = [s.strip() for s in os.environ.get("FOXTROT_SOURCE_PRIORITY", "").split(",") if s.strip()]
+    unknown = [s for s in configured if s not in DEFAULT_SOURCE_PRIORITY]
+    if unknown:
+        raise ValueError(
+            f"Unknown source(s) in FOXTROT_SOURCE_PRIORITY: {', '.join(unknown)}. "
+            f"Expected some of: {', '.join(DEFAULT_SOURCE_PRIORITY)}"
+        )
+    return tuple(configured) + tuple(s for s in DEFAULT_SOURCE_PRIORITY if s not in configured)
+
+
+def _source_ranks(combined: pd.DataFrame, priority) -> np.ndarray:
+    """Priority rank of each row's source, from attrs["source_rows"]; all equal without it"""
+    ranks = np.zeros(len(combined), dtype=np.int64)
+    rank_of = {label: rank for rank, label in enumerate(priority)}
+    for label, (start, stop) in combined.attrs.get("source_rows", {}).items():
+        ranks[start:stop] = rank_of.get(label, len(priority))
+    return ranks
+
+
+def _filled(values: pd.Series) -> np.ndarray:
+    return (values.notna() & (values.astype(str).str.strip() != "")).to_numpy()
+
+
+def _union_tags(tags: pd.Series, codes: np.ndarray, positions: np.ndarray, groups: np.ndarray) -> list:
+    """Union of each email's tag sets in row order, as one shared tuple per distinct union.
+
+    Works on factorised tag sets, so the Python loop is per email over small
+    ints and each distinct combination of tag sets is only built once.
+    """
+    set_codes, tag_sets = pd.factorize(tags.iloc[positions])
+    email_codes = codes[positions]
+
+    # Distinct (email, tag set) pairs, in the order the tag sets first appear per email
+    _, first = np.unique(email_codes * len(tag_sets) + set_codes, return_index=True)
+    first = first[np.lexsort((first, email_codes[first]))]
+    pair_emails = email_codes[first].tolist()
+    pair_sets = set_codes[first].tolist()
+
+    combos = {}
+    for email, tag_set in zip(pair_emails, pair_sets):
+        combos.setdefault(email, []).append(tag_set)
+
+    unions = {}
+    result = []
+    for email in groups.tolist():
+        combo = tuple(combos[email])
+        if combo not in unions:
+            unions[combo] = make_tag_tuple(dict.fromkeys(t for c in combo for t in tag_sets[c]))
+        result.append(unions[combo])
+    return result
+
+
+def merge_duplicates(combined: pd.DataFrame, priority=DEFAULT_SOURCE_PRIORITY) -> pd.DataFrame:
+    """One row per normalised email, kept at the position of its first occurrence.
+
+    Rows without a usable email are left alone for the uploader to reject. The
+    result's attrs hold "duplicates_merged" (rows folded into another) and
+    "api_calls_saved" (the member and tags calls those rows would have made).
+    """
+    keys = normalize_emails(combined["Email1"])
+    usable = keys.str.contains("@", regex=False).to_numpy()
+    codes, _ = pd.factorize(keys.where(usable))
+    counts = np.bincount(codes[codes >= 0]) if usable.any() else np.zeros(0, dtype=np.int64)
+    duplicated = usable & (counts[np.maximum(codes, 0)] > 1 if len(counts) else False)
+
+    merged = combined.copy()
+    merged.attrs = {k: v for k, v in combined.attrs.items() if k != "source_rows"}
+    if not duplicated.any():
+        merged.attrs.update(duplicates_merged=0, api_calls_saved=0)
+        return merged
+
+    # Rows of duplicated emails, best first within each email: by source
+    # priority, then later rows ahead of earlier ones
+    positions = np.flatnonzero(duplicated)
+    ranks = _source_ranks(combined, priority)[positions]
+    order = np.lexsort((-positions, ranks, codes[positions]))
+    rows = positions[order]
+    group = codes[rows]
+    first_in_group = np.r_[True, group[1:] != group[:-1]]
+
+    # Each email keeps the row where it first appeared
+    keep_at = pd.Series(positions).groupby(codes[positions]).min()
+    target = keep_at.loc[group[first_in_group]].to_numpy()
+
+    def best_rows(filled: np.ndarray) -> pd.Series:
+        """Per email, the best row with the field filled in, else its best row overall"""
+        best = pd.Series(rows[first_in_group], index=group[first_in_group])
+        candidates = rows[filled[rows]]
+        found = pd.Series(candidates, index=codes[candidates])
+        found = found[~found.index.duplicated()]
+        return found.reindex(best.index).fillna(best).astype(np.int64)
+
+    name_rows = best_rows(_filled(combined["Name"])).to_numpy()
+    for field in NAME_FIELDS:
+        merged.iloc[target, merged.columns.get_loc(field)] = combined[field].to_numpy()[name_rows]
+    for field in SINGLE_FIELDS:
+        field_rows = best_rows(_filled(combined[field])).to_numpy()
+        merged.iloc[target, merged.columns.get_loc(field)] = combined[field].to_numpy()[field_rows]
+
+    merged_tags = _union_tags(combined["Tags"], codes, positions, group[first_in_group])
+    merged.iloc[target, merged.columns.get_loc("Tags")] = pd.array(merged_tags, dtype=object)
+
+    dropped = np.setdiff1d(positions, target)
+    calls_saved = len(dropped) + int((combined["Tags"].iloc[dropped].map(len) > 0).sum())
+    merged = merged.drop(index=merged.index[dropped]).reset_index(drop=True)
+    merged.attrs.update(duplicates_merged=len(dropped), api_calls_saved=calls_saved)
+    return merged
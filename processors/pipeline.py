@@ -0,0 +1,316 @@
+"""Run the processors for the uploaded files and combine their output.
+
+Each source (EQ, the four SP lists, ROW agents, website) is independent and
+dominated by CPU-bound spreadsheet parsing, so sources that are not in the
+parse cache run in a pool of worker processes. Output is still concatenated in
+the fixed source order below, and a source that fails is reported in
+combined.attrs["source_errors"] without discarding the others.
+
+Uploads with a CSV too big to hold whole go through iter_contact_batches()
+instead, which runs the sources one after another and yields their contacts
+a chunk of rows at a time.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+
+import pandas as pd
+
+import metrics
+from .eq import process_eq_files
+from .sp import iter_sp_batches, process_sp_files
+from .website import iter_website_batches, process_website_files
+from .row_agents import iter_row_agents_batches, process_row_agents_files
+from .common import contact_frame
+from .cache import open_parse_cache
+from .ingest import is_csv
+from .uploads import UploadedFile, snapshot_upload
+
+logger = logging.getLogger(__name__)
+
+# Bytes; a CSV upload bigger than this is streamed rather than read whole
+DEFAULT_STREAM_BYTES = 64 * 1024 * 1024
+
+# Chunked counterpart of each processor. EQ has none: telling which contacts
+# are new needs the whole start snapshot, so both EQ files are read whole.
+_BATCHES = {
+    process_sp_files: iter_sp_batches,
+    process_row_agents_files: iter_row_agents_batches,
+    process_website_files: iter_website_batches,
+}
+
+
+class Source(NamedTuple):
+    label: str      # how errors name the source, e.g. "SP UK_DIRECT"
+    name: str       # processor name in the parse cache key
+    fn: object
+    files: list
+    params: dict
+
+
+def source_workers() -> int:
+    """FOXTROT_SOURCE_WORKERS, defaulting to the number of CPUs; 1 processes in-line"""
+    workers = int(os.environ.get("FOXTROT_SOURCE_WORKERS", os.cpu_count() or 1))
+    if workers < 1:
+        raise ValueError("FOXTROT_SOURCE_WORKERS must be positive")
+    return workers
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool shared between requests, so worker start-up is paid once and not per upload.
+
+    Workers are spawned rather than forked: the web process runs job threads,
+    and forking a multi-threaded process is unsafe.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _portable(file):
+    """Paths and UploadedFile copies pickle to a worker; other streams are copied first"""
+    if isinstance(file, (str, os.PathLike, UploadedFile)):
+        return file
+    return snapshot_upload(file)
+
+
+def _size(file) -> int:
+    if hasattr(file, "getbuffer"):
+        return file.getbuffer().nbytes
+    if hasattr(file, "seek"):
+        position = file.tell()
+        size = file.seek(0, os.SEEK_END)
+        file.seek(position)
+        return size
+    try:
+        return os.path.getsize(file)
+    except OSError:
+        return 0
+
+
+def _process_source(source: Source) -> tuple:
+    """The source's frame and the metrics recorded making it, which a worker sends back to the parent"""
+    with metrics.capture(propagate=False) as recorded:
+        with metrics.PROCESSOR_SECONDS.time(source=source.label):
+            df = source.fn(*source.files, **source.params)
+        metrics.PROCESSOR_ROWS.inc(len(df), source=source.label)
+        metrics.BYTES_READ.inc(sum(_size(f) for f in source.files), source=source.label)
+    return df, recorded
+
+
+def _run_sources(sources: list, workers: int) -> list:
+    """Each source's (frame, metrics), or the exception its processor raised, in source order"""
+    outcomes = []
+    if min(workers, len(sources)) <= 1:
+        for source in sources:
+            try:
+                outcomes.append(_process_source(source))
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    pool = _process_pool(workers)
+    futures = [
+        pool.submit(_process_source, source._replace(files=[_portable(f) for f in source.files]))
+        for source in sources
+    ]
+    for future in futures:
+        try:
+            outcomes.append(future.result())
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            _discard_pool(pool)
+            outcomes.append(e)
+        except Exception as e:
+            outcomes.append(e)
+    return outcomes
+
+
+def _sources(eq_base_start, eq_base_end, sp_uk_direct, sp_uk_referrers, sp_us_direct,
+             sp_us_referrers, row_agents_file, website_file, upload_date_label) -> list:
+    """Processors to run for the uploaded files, in the order their output is combined"""
+    if not upload_date_label:
+        return []
+
+    label = {"upload_date_label": upload_date_label}
+    sources = []
+
+    # EQ
+    if eq_base_start and eq_base_end:
+        sources.append(Source("EQ", "eq", process_eq_files, [eq_base_start, eq_base_end], label))
+
+    # SP
+    for uploaded_file, list_type in (
+        (sp_uk_direct, "UK_DIRECT"),
+        (sp_uk_referrers, "UK_REFERRERS"),
+        (sp_us_direct, "US_DIRECT"),
+        (sp_us_referrers, "US_AGENTS"),
+    ):
+        if uploaded_file:
+            sources.append(Source(f"SP {list_type}", "sp", process_sp_files, [uploaded_file],
+                                  dict(label, list_type=list_type)))
+
+    # ROW agents
+    if row_agents_file:
+        sources.append(Source("ROW agents", "row_agents", process_row_agents_files, [row_agents_file], label))
+
+    # Website
+    if website_file:
+        sources.append(Source("Website", "website", process_website_files, [website_file], label))
+
+    return sources
+
+
+def generate_combined_dataframe(eq_base_start, eq_base_end, sp_uk_direct, sp_uk_referrers,
+                                sp_us_direct, sp_us_referrers, row_agents_file,
+                                website_file, upload_date_label, workers: int = None):
+    """Generate combined DataFrame from all uploaded files.
+
+    Returns None when no source was uploaded, and raises ValueError when every
+    source failed. Otherwise failures are listed in attrs["source_errors"] as
+    {source label: message}, attrs["source_rows"] maps each processed
+    source's label to its (start, stop) row range, and attrs["churn"] holds
+    {source label: {"removed": n, "changed": n}} for sources that compare
+    snapshots (EQ).
+    """
+    sources = _sources(eq_base_start, eq_base_end, sp_uk_direct, sp_uk_referrers, sp_us_direct,
+                       sp_us_referrers, row_agents_file, website_file, upload_date_label)
+    if not sources:
+        return None
+
+    cache = open_parse_cache()
+    frames = [None] * len(sources)
+    keys = [None] * len(sources)
+    if cache is not None:
+        for i, source in enumerate(sources):
+            keys[i] = cache.key(source.name, source.files, **source.params)
+            frames[i] = cache.fetch(source.name, keys[i])
+
+    pending = [i for i, frame in enumerate(frames) if frame is None]
+    outcomes = _run_sources([sources[i] for i in pending], workers or source_workers())
+
+    errors = {}
+    for i, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("Processing %s failed: %r", sources[i].label, outcome)
+            errors[sources[i].label] = str(outcome) or type(outcome).__name__
+            metrics.SOURCE_ERRORS.inc(source=sources[i].label)
+            continue
+        frames[i], recorded = outcome
+        metrics.registry().merge(recorded)
+        if cache is not None:
+            cache.put(keys[i], frames[i])
+
+    processed = [(source.label, frame) for source, frame in zip(sources, frames) if frame is not None]
+    if not processed:
+        raise ValueError("; ".join(f"{label}: {message}" for label, message in errors.items()))
+
+    with metrics.STAGE_SECONDS.time(stage="combine"):
+        # With every frame in the contact dtypes this chains their Arrow buffers rather than copying rows
+        combined = pd.concat([contact_frame(frame) for _, frame in processed], ignore_index=True)
+    combined.attrs["source_errors"] = errors
+
+    # Sources are concatenated in order, so each one is a contiguous block of rows
+    source_rows = {}
+    start = 0
+    for label, frame in processed:
+        source_rows[label] = (start, start + len(frame))
+        start += len(frame)
+    combined.attrs["source_rows"] = source_rows
+    combined.attrs["churn"] = {label: frame.attrs["churn"] for label, frame in processed if "churn" in frame.attrs}
+    return combined
+
+
+def stream_bytes() -> int:
+    """FOXTROT_STREAM_BYTES, the CSV size above which uploads are streamed in chunks"""
+    limit = int(os.environ.get("FOXTROT_STREAM_BYTES", DEFAULT_STREAM_BYTES))
+    if limit < 0:
+        raise ValueError("FOXTROT_STREAM_BYTES must not be negative")
+    return limit
+
+
+def should_stream(files) -> bool:
+    """True when one of the uploaded files is a CSV bigger than stream_bytes()"""
+    limit = stream_bytes()
+    return any(f and is_csv(f) and _size(f) > limit for f in files)
+
+
+def _whole(source: Source):
+    yield source.fn(*source.files, **source.params)
+
+
+def _timed_batches(source: Source, chunk_rows: int):
+    """The source's batches, recording its metrics; time the consumer spends on a batch is not counted"""
+    produce = _BATCHES.get(source.fn)
+    batches = produce(*source.files, chunk_rows=chunk_rows, **source.params) if produce else _whole(source)
+    busy = 0.0
+    rows = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            batch = next(batches, None)
+            busy += time.perf_counter() - started
+            if batch is None:
+                break
+            rows += len(batch)
+            yield batch
+    finally:
+        metrics.PROCESSOR_SECONDS.observe(busy, source=source.label)
+        metrics.PROCESSOR_ROWS.inc(rows, source=source.label)
+        metrics.BYTES_READ.inc(sum(_size(f) for f in source.files), source=source.label)
+
+
+def iter_contact_batches(eq_base_start, eq_base_end, sp_uk_direct, sp_uk_referrers,
+                         sp_us_direct, sp_us_referrers, row_agents_file, website_file,
+                         upload_date_label, chunk_rows: int = None, source_errors: dict = None):
+    """Yield (source label, contacts) batches of at most chunk_rows rows, in source order.
+
+    The streaming counterpart of generate_combined_dataframe(): only one chunk
+    of one source is in memory at a time (EQ aside, which comes as one batch),
+    and the parse cache is not used. A source that fails is added to
+    source_errors as it happens; rows it yielded before failing stay yielded.
+    ValueError is raised at the end when no source produced anything.
+    """
+    sources = _sources(eq_base_start, eq_base_end, sp_uk_direct, sp_uk_referrers, sp_us_direct,
+                       sp_us_referrers, row_agents_file, website_file, upload_date_label)
+    errors = source_errors if source_errors is not None else {}
+    produced = False
+    for source in sources:
+        rows = 0
+        try:
+            for batch in _timed_batches(source, chunk_rows):
+                rows += len(batch)
+                produced = True
+                yield source.label, batch
+        except Exception as e:
+            logger.error("Processing %s failed: %r", source.label, e)
+            message = str(e) or type(e).__name__
+            errors[source.label] = f"{message} (after {rows} rows)" if rows else message
+            metrics.SOURCE_ERRORS.inc(source=source.label)
+
+    if errors and not produced:
+        raise ValueError("; ".join(f"{label}: {message}" for label, message in errors.items()))
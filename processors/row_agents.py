@@ -1,33 +1,52 @@
-import pandas as pd
-from .common import CONTACT_COLUMNS, split_name, technical_tags_to_interest
-
-def process_row_agents_files(uploaded_file, upload_date_label: str) -> pd.DataFrame:
-    df_raw = pd.read_excel(uploaded_file)
-
-    df = pd.DataFrame()
-
-    #Normalise columns (The row_agents file has slightly different column names)
-    df["Fname"] = df_raw["First Name"].fillna("").astype(str).str.strip()
-    df["Lname"] = df_raw["Last Name"].fillna("").astype(str).str.strip()
-    df["Name"] = (df["Fname"] + " " + df["Lname"]).str.strip()
-    df["Email1"] = df_raw["Contact Email Address"].fillna("").astype(str).str.strip()
-    df["Organisation"] = df_raw["Organisation"].fillna("").astype(str).str.strip()
-    df["Country"] = df_raw["Country"].fillna("GB").astype(str).str.upper()
-
-    tags_list = []
-    for _, row in df_raw.iterrows():
-        tags = [
-            "SP",
-            "Non-European Associate",
-            "Foreign Associates",
-            row.get("Country", "unknown"),
-            upload_date_label,
-        ]
-
-        interests = technical_tags_to_interest(row.get("Technical Tags", ""))
-        tags.extend(interests)
-
-        tags_list.append('"' + '","'.join([str(t) for t in tags if t]) + '"')
-
-    df["Tags"] = tags_list
-    return df[CONTACT_COLUMNS]
\ No newline at end of file
+import pandas as pd
+from .classify import classifier
+from .common import contact_frame, tags_by_key
+from .ingest import iter_table, read_table
+
+ROW_AGENTS_COLUMNS = {
+    "First Name": ["First Name"],
+    "Last Name": ["Last Name"],
+    "Contact Email Address": ["Contact Email Address"],
+    "Organisation": ["Organisation"],
+    "Country": ["Country"],
+    "Technical Tags": ["Technical Tags"],
+}
+
+def _normalise(df_raw, upload_date_label: str) -> pd.DataFrame:
+    df = pd.DataFrame()
+
+    #Normalise columns (The row_agents file has slightly different column names)
+    df["Fname"] = df_raw["First Name"].fillna("").astype(str).str.strip()
+    df["Lname"] = df_raw["Last Name"].fillna("").astype(str).str.strip()
+    df["Name"] = (df["Fname"] + " " + df["Lname"]).str.strip()
+    df["Email1"] = df_raw["Contact Email Address"].fillna("").astype(str).str.strip()
+    df["Organisation"] = df_raw["Organisation"].fillna("").astype(str).str.strip()
+    df["Country"] = df_raw["Country"].fillna("GB").astype(str).str.upper()
+
+    # Only the country and technical interests vary per row
+    if "Technical Tags" in df_raw.columns:
+        interests = classifier("interest").classify(df_raw["Technical Tags"])
+    else:
+        interests = pd.Series([()] * len(df_raw), index=df_raw.index, dtype=object)
+
+    def make_tags(country, interests):
+        tags = [
+            "SP",
+            "Non-European Associate",
+            "Foreign Associates",
+            country,
+            upload_date_label,
+        ]
+        tags.extend(interests)
+        return [t for t in tags if t]
+
+    df["Tags"] = tags_by_key(pd.DataFrame({"country": df_raw["Country"], "interests": interests}), make_tags)
+    return contact_frame(df)
+
+def process_row_agents_files(uploaded_file, upload_date_label: str) -> pd.DataFrame:
+    return _normalise(read_table(uploaded_file, ROW_AGENTS_COLUMNS), upload_date_label)
+
+def iter_row_agents_batches(uploaded_file, upload_date_label: str, chunk_rows: int = None):
+    """process_row_agents_files() a chunk of rows at a time"""
+    for chunk in iter_table(uploaded_file, ROW_AGENTS_COLUMNS, chunk_rows):
+        yield _normalise(chunk, upload_date_label)
@@ -1,108 +1,108 @@
-import pandas as pd
-
-from .common import (
-    CONTACT_COLUMNS,
-    split_name,
-    technical_tags_to_interest,
-    region_from_state_uk,
-)
-
-def _read_any_excel_or_csv(file_storage):
-    filename = file_storage.filename.lower()
-    if filename.endswith(".csv"):
-        return pd.read_csv(file_storage)
-    else:
-        return pd.read_excel(file_storage)
-
-def _get_column(df, possible_names):
-    """Try to find a column by checking possible names (case-insensitive)"""
-    df_columns_lower = {col.lower(): col for col in df.columns}
-    for name in possible_names:
-        if name.lower() in df_columns_lower:
-            return df_columns_lower[name.lower()]
-    # If not found, return the first option
-    return possible_names[0]
-    
-def process_sp_files(uploaded_file, upload_date_label: str, list_type: str) -> pd.DataFrame:
-    # List Types: UK_DIRECT, UK_REFERRERS, US_DIRECT, US_REFERRERS
-    df_raw = _read_any_excel_or_csv(uploaded_file)
-
-    # Print available columns for debugging
-    print(f"Available columns in uploaded file: {list(df_raw.columns)}")
-
-    # Normalise the columns
-    df = pd.DataFrame()
-
-    # Try to find columns with flexible naming
-    fname_col = _get_column(df_raw, ["First Name", "Fname", "FirstName","first_name"])
-    lname_col = _get_column(df_raw, ["Last Name", "Lname", "LastName", "last_name"])
-    email_col = _get_column(df_raw, ["Contact Email Address", "Email", "Email Address", "email", "Email1"])
-    org_col = _get_column(df_raw, ["Organisation", "Organization", "Company", "organisation"])
-
-
-    df["Fname"] = df_raw["First Name"].fillna("").astype(str).str.strip()
-    df["Lname"] = df_raw["Last Name"].fillna("").astype(str).str.strip()
-    df["Name"] = (df["Fname"] + " " + df["Lname"]).str.strip()
-    df["Email1"] = df_raw["Contact Email Address"].fillna("").astype(str).str.strip()
-    df["Organisation"] = df_raw["Organisation"].fillna("").astype(str).str.strip()
-
-    # Country based on the List Type
-    if list_type in ["UK_DIRECT", "UK_REFERRERS"]:
-        df["Country"] = "GB"
-    else:
-        df["Country"] = "US"
-    
-    # Tags
-    tags_list = []
-
-    for idx, row in df_raw.iterrows():
-        tags = []
-
-        # Source tag
-        tags.append("SP")
-
-        if list_type in {"US_DIRECT", "US_REFERRERS"}:
-            tags.append("US")
-
-        #Contact type
-        if list_type == "UK_DIRECT":
-            tags.append("DIRECT client or prospect")
-        elif list_type == "UK_REFERRERS":
-            tags.append("UK Referrer")
-        elif list_type == "US_DIRECT":
-            tags.append("In House")
-            tags.append("Direct client or prospect")
-        elif list_type == "US_AGENTS":
-            tags.append(["Foreign Associates", "Non-European Associate", "US", "US Associate"])
-        
-        tags.append(upload_date_label)
-
-        # Region
-        if list_type in {"UK_DIRECT", "UK_REFERRERS"}:
-            region = region_from_state_uk(row.get("State/Area"))
-            tags.append(region)
-        else:
-            # Simplified region tagging for US lists
-            state = str(row.get("State/Area") or "").strip()
-            if state:
-                tags.append(f"US-{state[:2].upper()}")
-            else:
-                tags.append("US - Region Unknown")
-        
-        # Technical interests
-        interests = technical_tags_to_interest(row.get("Technical Tags"))
-        tags.extend(interests)
-
-        # deduplicate + join
-        cleaned = []
-        for t in tags:
-            if t and t not in cleaned:
-                cleaned.append(t)
-        
-        tags_list.append('"' + '","'.join(str(t) for t in cleaned) + '"')
-
-    df["Tags"] = tags_list
-
-    # Return the columns
-    return df[CONTACT_COLUMNS]
-    
\ No newline at end of file
+import pandas as pd
+
+from .classify import classifier
+from .common import contact_frame, map_unique, tags_by_key
+
+from .ingest import get_column as _get_column, iter_table, read_table
+
+# Columns we use from the SharePoint export, with the names they may go by
+SP_COLUMNS = {
+    "First Name": ["First Name", "Fname", "FirstName", "first_name"],
+    "Last Name": ["Last Name", "Lname", "LastName", "last_name"],
+    "Contact Email Address": ["Contact Email Address", "Email", "Email Address", "email", "Email1"],
+    "Organisation": ["Organisation", "Organization", "Company", "organisation"],
+    "State/Area": ["State/Area"],
+    "Technical Tags": ["Technical Tags"],
+}
+
+def _read_any_excel_or_csv(file_storage):
+    return read_table(file_storage, SP_COLUMNS)
+
+def _column_or_blank(df, name):
+    # A missing column tags the same as an empty cell
+    if name in df.columns:
+        return df[name]
+    return pd.Series("", index=df.index, dtype=object)
+
+def _region_us(state_area):
+    state = str(state_area or "").strip()
+    if state:
+        return f"US-{state[:2].upper()}"
+    return "US - Region Unknown"
+
+def _normalise(df_raw, upload_date_label: str, list_type: str) -> pd.DataFrame:
+    # Normalise the columns
+    df = pd.DataFrame()
+
+    # Try to find columns with flexible naming
+    fname_col = _get_column(df_raw, SP_COLUMNS["First Name"])
+    lname_col = _get_column(df_raw, SP_COLUMNS["Last Name"])
+    email_col = _get_column(df_raw, SP_COLUMNS["Contact Email Address"])
+    org_col = _get_column(df_raw, SP_COLUMNS["Organisation"])
+
+
+    df["Fname"] = df_raw[fname_col].fillna("").astype(str).str.strip()
+    df["Lname"] = df_raw[lname_col].fillna("").astype(str).str.strip()
+    df["Name"] = (df["Fname"] + " " + df["Lname"]).str.strip()
+    df["Email1"] = df_raw[email_col].fillna("").astype(str).str.strip()
+    df["Organisation"] = df_raw[org_col].fillna("").astype(str).str.strip()
+
+    # Country based on the List Type
+    if list_type in ["UK_DIRECT", "UK_REFERRERS"]:
+        df["Country"] = "GB"
+    else:
+        df["Country"] = "US"
+    
+    # Tags
+    tags = []
+
+    # Source tag
+    tags.append("SP")
+
+    if list_type in {"US_DIRECT", "US_REFERRERS"}:
+        tags.append("US")
+
+    #Contact type
+    if list_type == "UK_DIRECT":
+        tags.append("DIRECT client or prospect")
+    elif list_type == "UK_REFERRERS":
+        tags.append("UK Referrer")
+    elif list_type == "US_DIRECT":
+        tags.append("In House")
+        tags.append("Direct client or prospect")
+    elif list_type == "US_AGENTS":
+        tags.append(["Foreign Associates", "Non-European Associate", "US", "US Associate"])
+
+    tags.append(upload_date_label)
+
+    # Region and technical interests are the only per-row parts, so work them
+    # out once per distinct value and build the tag string per combination
+    if list_type in {"UK_DIRECT", "UK_REFERRERS"}:
+        region = classifier("uk_region").classify(_column_or_blank(df_raw, "State/Area"))
+    else:
+        # Simplified region tagging for US lists
+        region = map_unique(_column_or_blank(df_raw, "State/Area"), _region_us)
+
+    interests = classifier("interest").classify(_column_or_blank(df_raw, "Technical Tags"))
+
+    def make_tags(region, interests):
+        # deduplicate
+        cleaned = []
+        for t in tags + [region, *interests]:
+            if t and t not in cleaned:
+                cleaned.append(t)
+        return cleaned
+
+    df["Tags"] = tags_by_key(pd.DataFrame({"region": region, "interests": interests}), make_tags)
+
+    # Return the columns
+    return contact_frame(df)
+
+def process_sp_files(uploaded_file, upload_date_label: str, list_type: str) -> pd.DataFrame:
+    # List Types: UK_DIRECT, UK_REFERRERS, US_DIRECT, US_REFERRERS
+    return _normalise(_read_any_excel_or_csv(uploaded_file), upload_date_label, list_type)
+
+def iter_sp_batches(uploaded_file, upload_date_label: str, list_type: str, chunk_rows: int = None):
+    """process_sp_files() a chunk of rows at a time"""
+    for chunk in iter_table(uploaded_file, SP_COLUMNS, chunk_rows):
+        yield _normalise(chunk, upload_date_label, list_type)
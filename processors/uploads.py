@@ -0,0 +1,140 @@
+"""Copies of the uploaded files that outlive the request, within size limits.
+
+Flask closes the uploaded FileStorage streams when the request ends, but the
+processors may run after that: in a background job, or while a zip streams
+out. Small uploads are copied into memory. Anything bigger is spooled to a
+temporary file on disk and handed to the readers by path, so pandas can
+memory-map a CSV, the Excel engines read the workbook straight from the
+file, and a worker process is sent the path instead of the bytes. close()
+deletes the temporary file.
+
+FOXTROT_MAX_FILE_BYTES caps each file, checked while it is copied, and
+FOXTROT_MAX_REQUEST_BYTES caps the whole /process request through Flask's
+MAX_CONTENT_LENGTH. Either set to 0 turns that limit off.
+"""
+
+import io
+import os
+import tempfile
+
+# Bytes
+DEFAULT_MAX_FILE_BYTES = 100 * 1024 * 1024
+DEFAULT_MAX_REQUEST_BYTES = 400 * 1024 * 1024
+# Uploads up to this size stay in memory, bigger ones go to a temporary file
+SPOOL_MEMORY_BYTES = 1024 * 1024
+COPY_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _limit(name: str, default: int):
+    limit = int(os.environ.get(name, default))
+    if limit < 0:
+        raise ValueError(f"{name} must not be negative")
+    return limit or None
+
+
+def max_file_bytes():
+    """FOXTROT_MAX_FILE_BYTES, None for no limit"""
+    return _limit("FOXTROT_MAX_FILE_BYTES", DEFAULT_MAX_FILE_BYTES)
+
+
+def max_request_bytes():
+    """FOXTROT_MAX_REQUEST_BYTES, None for no limit"""
+    return _limit("FOXTROT_MAX_REQUEST_BYTES", DEFAULT_MAX_REQUEST_BYTES)
+
+
+def describe_bytes(size: int) -> str:
+    if size < 1024 * 1024:
+        return f"{size:,} bytes"
+    return f"{size / (1024 * 1024):g} MB"
+
+
+class UploadedFile(io.BytesIO):
+    """In-memory copy of an uploaded file that outlives the request it came in on"""
+
+    def __init__(self, data: bytes, filename: str):
+        super().__init__(data)
+        self.filename = filename
+
+
+class SpooledUpload(os.PathLike):
+    """Uploaded file copied to a temporary file; readers open it by path"""
+
+    def __init__(self, path: str, filename: str):
+        self.path = path
+        self.filename = filename
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"SpooledUpload({self.filename!r} at {self.path!r})"
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def snapshot_upload(file_storage):
+    """Copy a werkzeug FileStorage so a background job can read it after the request ends"""
+    if not file_storage:
+        return None
+    return UploadedFile(file_storage.read(), file_storage.filename)
+
+
+def spool_upload(file_storage, max_bytes: int = None, memory_bytes: int = None):
+    """Copy an upload into memory, or to a temporary file once it is bigger than memory_bytes.
+
+    memory_bytes defaults to SPOOL_MEMORY_BYTES. Raises UploadTooLarge, leaving
+    nothing behind, when the upload is bigger than max_bytes.
+    """
+    if not file_storage:
+        return None
+    if memory_bytes is None:
+        memory_bytes = SPOOL_MEMORY_BYTES
+    filename = file_storage.filename
+    head = file_storage.read(memory_bytes + 1)
+    if max_bytes is not None and len(head) > max_bytes:
+        raise UploadTooLarge(f"{filename} is larger than the {describe_bytes(max_bytes)} limit per file")
+    if len(head) <= memory_bytes:
+        return UploadedFile(head, filename)
+
+    # Keep the extension, which is how the readers tell a CSV from a workbook
+    fd, path = tempfile.mkstemp(prefix="foxtrot-upload-", suffix=os.path.splitext(filename)[1])
+    spooled = SpooledUpload(path, filename)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(head)
+            size = len(head)
+            for block in iter(lambda: file_storage.read(COPY_BYTES), b""):
+                size += len(block)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(f"{filename} is larger than the {describe_bytes(max_bytes)} limit per file")
+                f.write(block)
+    except BaseException:
+        spooled.close()
+        raise
+    return spooled
+
+
+def spool_uploads(files: list, max_bytes: int = None) -> list:
+    """spool_upload() each of files (None stays None); on failure the ones already copied are removed"""
+    spooled = []
+    try:
+        for f in files:
+            spooled.append(spool_upload(f, max_bytes))
+    except BaseException:
+        close_uploads(spooled)
+        raise
+    return spooled
+
+
+def close_uploads(files):
+    for f in files:
+        if f is not None:
+            f.close()
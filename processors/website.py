@@ -1,34 +1,43 @@
-import pandas as pd
-from .common import CONTACT_COLUMNS
-
-def _read_any(file_storage):
-    fname = file_storage.filename.lower()
-    if fname.endswith(".csv"):
-        return pd.read_csv(file_storage)
-    else:
-        return pd.read_excel(file_storage)
-    
-def process_website_files(uploaded_file, upload_date_label: str) -> pd.DataFrame:
-    df_raw = _read_any(uploaded_file)
-
-    #Normalise the columns
-    df = pd.DataFrame()
-    df["Fname"] = df_raw["Fname"].fillna("").astype(str).str.strip()
-    df["Lname"] = df_raw["Lname"].fillna("").astype(str).str.strip()
-    df["Name"] = (df["Fname"] + " " + df["Lname"]).str.strip()
-    df["Email1"] = df_raw["Email1"].fillna("").astype(str).str.strip()
-    df["Organisation"] = df_raw["Organisation"].fillna("").astype(str).str.strip()
-    df["Country"] = df_raw["Country"].fillna("GB").astype(str).str.upper()
-
-    tags_list = []
-    for _, row in df.iterrows():
-        tags = [
-            "Website",
-            upload_date_label,
-            "Direct client or prospect",
-            row["Country"],
-        ]
-        tags_list.append('"' + '","'.join(str(t) for t in tags) + '"')
-
-    df["Tags"] = tags_list
-    return df[CONTACT_COLUMNS]
\ No newline at end of file
+import pandas as pd
+from .common import contact_frame, tags_by_key
+from .ingest import iter_table, read_table
+
+WEBSITE_COLUMNS = {
+    "Fname": ["Fname"],
+    "Lname": ["Lname"],
+    "Email1": ["Email1"],
+    "Organisation": ["Organisation"],
+    "Country": ["Country"],
+}
+
+def _read_any(file_storage):
+    return read_table(file_storage, WEBSITE_COLUMNS)
+    
+def _normalise(df_raw, upload_date_label: str) -> pd.DataFrame:
+    #Normalise the columns
+    df = pd.DataFrame()
+    df["Fname"] = df_raw["Fname"].fillna("").astype(str).str.strip()
+    df["Lname"] = df_raw["Lname"].fillna("").astype(str).str.strip()
+    df["Name"] = (df["Fname"] + " " + df["Lname"]).str.strip()
+    df["Email1"] = df_raw["Email1"].fillna("").astype(str).str.strip()
+    df["Organisation"] = df_raw["Organisation"].fillna("").astype(str).str.strip()
+    df["Country"] = df_raw["Country"].fillna("GB").astype(str).str.upper()
+
+    def make_tags(country):
+        return [
+            "Website",
+            upload_date_label,
+            "Direct client or prospect",
+            country,
+        ]
+
+    df["Tags"] = tags_by_key(df[["Country"]], make_tags)
+    return contact_frame(df)
+
+def process_website_files(uploaded_file, upload_date_label: str) -> pd.DataFrame:
+    return _normalise(_read_any(uploaded_file), upload_date_label)
+
+def iter_website_batches(uploaded_file, upload_date_label: str, chunk_rows: int = None):
+    """process_website_files() a chunk of rows at a time, for CSVs too big to hold whole"""
+    for chunk in iter_table(uploaded_file, WEBSITE_COLUMNS, chunk_rows):
+        yield _normalise(chunk, upload_date_label)
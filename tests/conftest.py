@@ -0,0 +1,30 @@
+import pytest
+from main import app as flask_app
+
+
+@pytest.fixture
+def app():
+    """Flask app for pytest-flask's client fixture."""
+    flask_app.config.update(TESTING=True)
+    return flask_app
+
+
+@pytest.fixture(autouse=True)
+def no_parse_cache(monkeypatch):
+    """Keep tests from reading or writing the on-disk parse cache."""
+    monkeypatch.setenv("FOXTROT_CACHE_DIR", "")
+
+
+@pytest.fixture(autouse=True)
+def no_sync_db(monkeypatch):
+    """Keep tests from writing foxtrot_sync.sqlite3 or downloading the audience."""
+    monkeypatch.setenv("FOXTROT_SYNC_DB", "")
+
+
+@pytest.fixture(autouse=True)
+def fresh_mailchimp_config():
+    """Re-read the Mailchimp configuration in every test, since tests patch the environment."""
+    from main import mailchimp_clients
+    mailchimp_clients.reset()
+    yield
+    mailchimp_clients.reset()
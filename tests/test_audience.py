@@ -0,0 +1,169 @@
+import os
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from uploader.audience import AudienceSnapshot
+from uploader.common import Contact, subscriber_hash
+from uploader.sync_state import SyncState
+from uploader.upload import upload_contacts
+
+
+class FakeAudienceLists:
+    """Local stand-in for client.lists holding one audience in memory"""
+
+    def __init__(self, members=()):
+        self.members = {}
+        for email, status, merge_fields, tags in members:
+            self.members[subscriber_hash(email)] = {
+                "id": subscriber_hash(email), "email_address": email, "status": status,
+                "merge_fields": dict(merge_fields), "tags": [{"id": i, "name": t} for i, t in enumerate(tags)],
+            }
+        self.pages = 0
+        self.writes = []
+
+    def get_list_members_info(self, list_id, fields=None, count=10, offset=0):
+        self.pages += 1
+        members = list(self.members.values())
+        return {"members": members[offset:offset + count], "total_items": len(members)}
+
+    def set_list_member(self, list_id, member_hash, body):
+        self.writes.append(("member", body["email_address"]))
+        member = self.members.setdefault(member_hash, {
+            "id": member_hash, "email_address": body["email_address"], "status": body["status_if_new"],
+            "merge_fields": {}, "tags": [],
+        })
+        member["merge_fields"].update(body["merge_fields"])
+
+    def update_list_member_tags(self, list_id, member_hash, body):
+        member = self.members[member_hash]
+        self.writes.append(("tags", member["email_address"], [t["name"] for t in body["tags"]]))
+        member["tags"] += [{"id": 0, "name": t["name"]} for t in body["tags"]]
+
+
+class FakeClient:
+    def __init__(self, members=()):
+        self.lists = FakeAudienceLists(members)
+
+
+AUDIENCE = [
+    ("same@test.com", "subscribed", {"FNAME": "S", "LNAME": "Ame", "COMPANY": "Co"}, ["SP"]),
+    ("moved@test.com", "subscribed", {"FNAME": "M", "LNAME": "Oved", "COMPANY": "Old Co"}, ["SP"]),
+    ("tagged@test.com", "subscribed", {"FNAME": "T", "LNAME": "Agged", "COMPANY": "Co"}, ["sp"]),
+    ("gone@test.com", "unsubscribed", {"FNAME": "G", "LNAME": "One", "COMPANY": "Co"}, []),
+    ("bounced@test.com", "cleaned", {"FNAME": "B", "LNAME": "Ounced", "COMPANY": "Co"}, []),
+]
+
+
+def _contact(email, fname, lname, tags):
+    return Contact(email, subscriber_hash(email), {"FNAME": fname, "LNAME": lname, "COMPANY": "Co"}, list(tags))
+
+
+def _combined():
+    rows = [
+        ("same@test.com", "S", "Ame", '"SP"'),
+        ("moved@test.com", "M", "Oved", '"SP"'),
+        ("tagged@test.com", "T", "Agged", '"SP","GB"'),
+        ("gone@test.com", "G", "One", '"SP"'),
+        ("bounced@test.com", "B", "Ounced", ""),
+        ("new@test.com", "N", "Ew", '"Website"'),
+    ]
+    return pd.DataFrame({
+        "Name": [f"{f} {l}" for _, f, l, _ in rows],
+        "Fname": [f for _, f, _, _ in rows],
+        "Lname": [l for _, _, l, _ in rows],
+        "Email1": [e for e, _, _, _ in rows],
+        "Organisation": ["Co"] * len(rows),
+        "Country": [""] * len(rows),
+        "Tags": [t for _, _, _, t in rows],
+    })
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    snapshot = AudienceSnapshot(str(tmp_path / "sync.sqlite3"))
+    yield snapshot
+    snapshot.close()
+
+
+class TestAudienceSnapshot:
+    """Tests for AudienceSnapshot."""
+
+    def test_refresh_pages_through_the_audience(self, snapshot):
+        """Every member is fetched, a page at a time."""
+        client = FakeClient(AUDIENCE)
+        assert snapshot.refresh(client, "list1", page_size=2) == 5
+        assert client.lists.pages == 3
+
+    def test_refresh_replaces_the_previous_snapshot(self, snapshot):
+        """Members no longer in the audience drop out of the snapshot."""
+        snapshot.refresh(FakeClient(AUDIENCE), "list1")
+        snapshot.refresh(FakeClient(AUDIENCE[:1]), "list1")
+        to_send, _, up_to_date = snapshot.plan("list1", [_contact("moved@test.com", "M", "Oved", [])])
+        assert up_to_date == 0
+        assert to_send[0].upsert
+
+    def test_plan(self, snapshot):
+        """Only new and changed members are upserted, and only missing tags are sent."""
+        snapshot.refresh(FakeClient(AUDIENCE), "list1")
+        to_send, left_alone, up_to_date = snapshot.plan("list1", [
+            _contact("same@test.com", "S", "Ame", ["SP"]),
+            Contact("moved@test.com", subscriber_hash("moved@test.com"),
+                    {"FNAME": "M", "LNAME": "Oved", "COMPANY": "New Co"}, ["SP"]),
+            _contact("tagged@test.com", "T", "Agged", ["SP", "GB"]),
+            _contact("gone@test.com", "G", "One", ["SP"]),
+            _contact("new@test.com", "N", "Ew", ["Website"]),
+        ])
+        assert left_alone == 1
+        assert up_to_date == 1
+        assert [(c.email, c.upsert, c.tags) for c in to_send] == [
+            ("moved@test.com", True, []),
+            ("tagged@test.com", False, ["GB"]),
+            ("new@test.com", True, ["Website"]),
+        ]
+
+
+class TestUploadContactsWithAudience:
+    """Tests for upload_contacts() planned against the audience."""
+
+    @patch.dict(os.environ, {"MAILCHIMP_RATE_LIMIT": "1000"})
+    def test_minimal_writes(self, snapshot):
+        """Only the needed calls are made, and a second run makes none."""
+        client = FakeClient(AUDIENCE)
+        snapshot.refresh(client, "list1")
+        results = upload_contacts(_combined(), client, "list1", audience=snapshot)
+
+        assert results["left_alone"] == 2
+        assert results["up_to_date"] == 1
+        assert results["successful"] == 3
+        assert sorted(client.lists.writes) == [
+            ("member", "moved@test.com"),
+            ("member", "new@test.com"),
+            ("tags", "new@test.com", ["Website"]),
+            ("tags", "tagged@test.com", ["GB"]),
+        ]
+
+        client.lists.writes.clear()
+        snapshot.refresh(client, "list1")
+        again = upload_contacts(_combined(), client, "list1", audience=snapshot)
+        assert client.lists.writes == []
+        assert again["up_to_date"] == 4
+
+    @patch.dict(os.environ, {"MAILCHIMP_RATE_LIMIT": "1000"})
+    def test_sync_state_defers_to_the_audience(self, snapshot, tmp_path):
+        """A contact synced before but deleted from the audience since is sent again."""
+        client = FakeClient(AUDIENCE)
+        state = SyncState(str(tmp_path / "sync.sqlite3"))
+        snapshot.refresh(client, "list1")
+        upload_contacts(_combined(), client, "list1", sync_state=state, audience=snapshot)
+
+        del client.lists.members[subscriber_hash("new@test.com")]
+        client.lists.writes.clear()
+        snapshot.refresh(client, "list1")
+        results = upload_contacts(_combined(), client, "list1", sync_state=state, audience=snapshot)
+
+        assert sorted(client.lists.writes) == [("member", "new@test.com"), ("tags", "new@test.com", ["Website"])]
+        assert results["skipped"] == 2
+        assert results["up_to_date"] == 1
+        assert results["left_alone"] == 2
+        assert results["successful"] == 1
+        state.close()
@@ -0,0 +1,152 @@
+import io
+import json
+import tarfile
+import pandas as pd
+from uploader.batch import parse_batch_results, upload_contacts_batch
+from uploader.common import Contact, new_results, prepare_contacts, subscriber_hash
+
+
+def _archive(ops):
+    """Build a response_body_url style .tar.gz holding one JSON results file"""
+    payload = json.dumps(ops).encode()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        info = tarfile.TarInfo("results/part-1.json")
+        info.size = len(payload)
+        tar.addfile(info, io.BytesIO(payload))
+    return buf.getvalue()
+
+
+class FakeBatches:
+    """Finishes every batch on the second status poll, failing operations on fail_paths.
+
+    The first time an operation on a throttle_paths path is run it comes back 429.
+    """
+
+    def __init__(self, fail_paths=(), throttle_paths=(), never_finish=False):
+        self.fail_paths = fail_paths
+        self.throttle_paths = set(throttle_paths)
+        self.never_finish = never_finish
+        self.submitted = {}
+        self.polls = {}
+
+    def start(self, body):
+        batch_id = f"b{len(self.submitted)}"
+        self.submitted[batch_id] = body["operations"]
+        return {"id": batch_id, "status": "pending"}
+
+    def status(self, batch_id):
+        self.polls[batch_id] = self.polls.get(batch_id, 0) + 1
+        if self.never_finish or self.polls[batch_id] < 2:
+            return {"id": batch_id, "status": "started"}
+        return {"id": batch_id, "status": "finished", "response_body_url": batch_id}
+
+    def results_for(self, batch_id):
+        ops = []
+        for op in self.submitted[batch_id]:
+            failed = any(p in op["path"] for p in self.fail_paths)
+            throttled = [p for p in self.throttle_paths if p in op["path"]]
+            self.throttle_paths.difference_update(throttled)
+            ops.append({
+                "status_code": 429 if throttled else 400 if failed else 200,
+                "operation_id": op["operation_id"],
+                "response": json.dumps({"detail": "bad"}) if failed else "",
+            })
+        return _archive(ops)
+
+
+class FakeClient:
+    def __init__(self, fail_paths=(), throttle_paths=(), never_finish=False):
+        self.batches = FakeBatches(fail_paths, throttle_paths, never_finish)
+
+
+def _combined():
+    return pd.DataFrame({
+        "Name": ["A One", "B Two", "C Three"],
+        "Fname": ["A", "B", "C"],
+        "Lname": ["One", "Two", "Three"],
+        "Email1": ["a@test.com", "not-an-email", "c@test.com"],
+        "Organisation": ["Co", "", "Co"],
+        "Country": ["GB", "US", "GB"],
+        "Tags": ['"SP","GB"', '"SP"', ""],
+    })
+
+
+class TestParseBatchResults:
+    """Tests for parse_batch_results() function."""
+
+    def test_reads_status_and_body(self):
+        """Each operation id maps to its status code and decoded body."""
+        archive = _archive([
+            {"status_code": 200, "operation_id": "0", "response": '{"id": "x"}'},
+            {"status_code": 204, "operation_id": "1", "response": ""},
+        ])
+        assert parse_batch_results(archive) == {"0": (200, {"id": "x"}), "1": (204, None)}
+
+
+class TestUploadContactsBatch:
+    """Tests for upload_contacts_batch() function."""
+
+    def _run(self, client):
+        results = new_results()
+        contacts = prepare_contacts(_combined(), results)
+        return upload_contacts_batch(client, "list1", contacts, results,
+                                     poll_interval=0, fetch=client.batches.results_for)
+
+    def test_counts_match_serial_path(self):
+        """Invalid emails fail up front, the rest succeed."""
+        results = self._run(FakeClient())
+        assert results["total"] == 3
+        assert results["successful"] == 2
+        assert results["failed"] == 1
+        assert results["errors"][0]["reason"] == "Invalid email address format"
+
+    def test_tags_only_sent_for_contacts_with_tags(self):
+        """Only contacts with tags get a tag operation in the second round."""
+        client = FakeClient()
+        self._run(client)
+        tag_ops = [op for ops in client.batches.submitted.values() for op in ops if op["method"] == "POST"]
+        assert len(tag_ops) == 1
+        assert tag_ops[0]["path"].endswith("/tags")
+
+    def test_failed_member_operation_is_reported(self):
+        """A failed upsert is reported and its tags are not sent."""
+        client = FakeClient(fail_paths=["members/" + subscriber_hash("a@test.com")])
+        results = self._run(client)
+        assert results["successful"] == 1
+        assert results["failed"] == 2
+        assert "bad" in results["errors"][1]["reason"]
+        assert not any(op["method"] == "POST" for ops in client.batches.submitted.values() for op in ops)
+
+    def test_throttled_operations_are_resubmitted(self, monkeypatch):
+        """Operations that come back 429 go into a new batch and succeed there."""
+        monkeypatch.setattr("uploader.retry.BASE_DELAY", 0.001)
+        client = FakeClient(throttle_paths=["members/" + subscriber_hash("c@test.com")])
+        results = self._run(client)
+        assert results["successful"] == 2
+        assert results["failed"] == 1
+        resubmitted = [ops for ops in client.batches.submitted.values() if len(ops) == 1 and ops[0]["method"] == "PUT"]
+        assert len(resubmitted) == 1
+
+    def test_tag_only_contacts_skip_the_upsert(self):
+        """A contact planned with upsert=False only gets its tag operation."""
+        client = FakeClient()
+        contact = Contact("a@test.com", subscriber_hash("a@test.com"), {"FNAME": "A"}, ["GB"], upsert=False)
+        results = upload_contacts_batch(client, "list1", [contact], new_results(),
+                                        poll_interval=0, fetch=client.batches.results_for)
+        assert results["successful"] == 1
+        ops = [op for ops in client.batches.submitted.values() for op in ops]
+        assert [op["method"] for op in ops] == ["POST"]
+
+    def test_batch_that_never_finishes_times_out(self):
+        """Operations of a batch still pending at the deadline fail as batch_timeout instead of hanging."""
+        client = FakeClient(never_finish=True)
+        results = new_results()
+        contacts = prepare_contacts(_combined(), results)
+        upload_contacts_batch(client, "list1", contacts, results, poll_interval=0.01,
+                              fetch=client.batches.results_for, timeout=0.05)
+        assert results["successful"] == 0
+        assert results["failed"] == 3
+        assert [e["kind"] for e in results["errors"]] == ["invalid_email", "batch_timeout", "batch_timeout"]
+        # No tag round for contacts whose upsert never finished
+        assert not any(op["method"] == "POST" for ops in client.batches.submitted.values() for op in ops)
@@ -0,0 +1,79 @@
+import os
+import pytest
+from benchmarks.generate import generate
+from benchmarks.run import compare, measure, parse_size
+from processors.pipeline import UploadedFile, generate_combined_dataframe
+
+FIELDS = ["eq_base_start", "eq_base_end", "sp_uk_direct", "sp_uk_referrers",
+          "sp_us_direct", "sp_us_agents", "row_agents", "website_list"]
+
+
+def _uploads(paths):
+    uploads = []
+    for field in FIELDS:
+        with open(paths[field], "rb") as f:
+            uploads.append(UploadedFile(f.read(), os.path.basename(paths[field])))
+    return uploads
+
+
+class TestGenerate:
+    """Tests for the synthetic input generator."""
+
+    def test_inputs_go_through_the_pipeline(self, tmp_path):
+        """Generated workbooks and CSVs are accepted by every processor."""
+        for excel in (True, False):
+            paths = generate(str(tmp_path / str(excel)), 200, excel=excel)
+            assert sorted(paths) == sorted(FIELDS)
+            combined = generate_combined_dataframe(*_uploads(paths), "Upload 02-Oct-25", workers=1)
+            assert combined.attrs["source_errors"] == {}
+            assert len(combined.attrs["source_rows"]) == 7
+
+    def test_files_are_reused(self, tmp_path):
+        """A second call with the same arguments does not rewrite the files."""
+        paths = generate(str(tmp_path), 100, excel=False)
+        before = os.path.getmtime(paths["website_list"])
+        assert generate(str(tmp_path), 100, excel=False) == paths
+        assert os.path.getmtime(paths["website_list"]) == before
+
+
+class TestParseSize:
+    """Tests for parse_size() function."""
+
+    def test_format_is_part_of_the_size(self):
+        """A size reads CSVs at every row count, and workbooks only when asked for."""
+        assert parse_size("1M") == (1_000_000, False)
+        assert parse_size("100k-xlsx") == (100_000, True)
+
+    def test_unknown_sizes(self):
+        """Unknown row counts and 1M workbooks are rejected."""
+        for name in ("10k", "1M-xlsx", "100k-csv"):
+            with pytest.raises(ValueError):
+                parse_size(name)
+
+
+class TestCompare:
+    """Tests for compare() function."""
+
+    BASELINE = {"1k": {"eq": {"seconds": 1.0, "peak_mb": 10.0}}}
+
+    def test_within_tolerance(self):
+        """Small slowdowns are not regressions."""
+        results = {"1k": {"eq": {"seconds": 1.4, "peak_mb": 11.0}, "new_step": {"seconds": 9.0}}}
+        assert compare(results, self.BASELINE, time_tolerance=0.5, memory_tolerance=0.2) == []
+
+    def test_slower_and_bigger(self):
+        """Time and memory regressions are both reported."""
+        results = {"1k": {"eq": {"seconds": 1.6, "peak_mb": 13.0}}}
+        regressions = compare(results, self.BASELINE, time_tolerance=0.5, memory_tolerance=0.2)
+        assert len(regressions) == 2
+        assert regressions[0].startswith("1k eq: 1.600s")
+
+
+class TestMeasure:
+    """Tests for measure() function."""
+
+    def test_records_time_and_memory(self):
+        """Wall time and peak traced memory are recorded."""
+        result = measure(lambda: bytearray(5_000_000), repeat=2)
+        assert result["seconds"] >= 0
+        assert result["peak_mb"] >= 5
@@ -0,0 +1,139 @@
+import io
+import os
+import tempfile
+import pandas as pd
+from processors.cache import ParseCache, cache_stats, open_parse_cache
+from processors.common import CONTACT_DTYPES, contact_frame
+from processors.pipeline import generate_combined_dataframe
+from processors.sp import process_sp_files
+from processors.uploads import UploadedFile
+
+SAMPLE_SP = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sample-monthly-data", "sp_downloads",
+                         "SP Download 30 Oct 2025 - UK Direct.xlsx")
+
+
+def _sp_upload():
+    with open(SAMPLE_SP, "rb") as f:
+        return UploadedFile(f.read(), os.path.basename(SAMPLE_SP))
+
+
+class Upload(io.BytesIO):
+    """Stands in for a werkzeug FileStorage"""
+
+    def __init__(self, data, filename="list.xlsx"):
+        super().__init__(data)
+        self.filename = filename
+
+
+def _frame():
+    shared = ("SP", "Nov 2025")
+    return pd.DataFrame({
+        "Email1": ["a@x.com", "b@x.com", "c@x.com"],
+        "Country": ["GB", "US", ""],
+        "Tags": [shared, shared, ()],
+    })
+
+
+class TestParseCache:
+    """Tests for ParseCache."""
+
+    def test_round_trip_keeps_tag_tuples(self, tmp_path):
+        """Tags come back as tuples, shared between rows with the same tags."""
+        cache = ParseCache(str(tmp_path))
+        cache.put("k", _frame())
+        df = cache.get("k")
+        assert df["Tags"].tolist() == [("SP", "Nov 2025"), ("SP", "Nov 2025"), ()]
+        assert df["Tags"][0] is df["Tags"][1]
+        assert df["Email1"].tolist() == ["a@x.com", "b@x.com", "c@x.com"]
+
+    def test_fetch_counts_hits_and_misses(self, tmp_path):
+        """fetch() finds what put() stored under the same key and counts the outcome."""
+        cache = ParseCache(str(tmp_path))
+        key = cache.key("sp", [Upload(b"data")], upload_date_label="Nov 2025")
+
+        before = cache_stats()
+        assert cache.fetch("sp", key) is None
+        cache.put(key, _frame())
+        again = cache.fetch("sp", cache.key("sp", [Upload(b"data")], upload_date_label="Nov 2025"))
+        after = cache_stats()
+
+        assert again["Tags"].tolist() == _frame()["Tags"].tolist()
+        assert after["hits"] - before["hits"] == 1
+        assert after["misses"] - before["misses"] == 1
+
+    def test_key_depends_on_content_and_params(self, tmp_path):
+        """Different bytes or parameters give different keys, and streams are rewound."""
+        cache = ParseCache(str(tmp_path))
+        upload = Upload(b"data")
+        key = cache.key("sp", [upload], list_type="UK_DIRECT")
+        assert upload.read() == b"data"
+        assert key == cache.key("sp", [Upload(b"data", "renamed.xlsx")], list_type="UK_DIRECT")
+        assert key != cache.key("sp", [Upload(b"other")], list_type="UK_DIRECT")
+        assert key != cache.key("sp", [Upload(b"data")], list_type="US_DIRECT")
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Oldest entries are removed once the directory is over its size limit."""
+        cache = ParseCache(str(tmp_path), max_bytes=10 ** 9)
+        cache.put("old", _frame())
+        cache.put("new", _frame())
+        os.utime(tmp_path / "old.parquet", (1, 1))
+        cache.max_bytes = os.path.getsize(tmp_path / "new.parquet")
+        cache._evict()
+        assert cache.get("old") is None
+        assert cache.get("new") is not None
+
+    def test_unstorable_frame_is_not_cached(self, tmp_path):
+        """A frame Parquet cannot hold is returned as-is and simply not cached."""
+        cache = ParseCache(str(tmp_path))
+        mixed = _frame().assign(Country=pd.Series([1, "GB", None], dtype=object))
+        cache.put("k", mixed)
+        assert cache.get("k") is None
+        assert os.listdir(tmp_path) == []
+
+
+    def test_unreadable_entry_is_a_miss(self, tmp_path):
+        """An entry that cannot be read back is dropped rather than failing the run."""
+        cache = ParseCache(str(tmp_path))
+        (tmp_path / "k.parquet").write_bytes(b"not parquet")
+        assert cache.get("k") is None
+        assert os.listdir(tmp_path) == []
+
+    def test_processor_output_round_trips(self, tmp_path):
+        """A real processor's contact frame reads back equal, in the contact dtypes."""
+        cache = ParseCache(str(tmp_path))
+        df = contact_frame(process_sp_files(_sp_upload(), "Nov 2025", "UK_DIRECT"))
+        cache.put("k", df)
+        cached = cache.get("k")
+        assert {col: cached[col].dtype for col in CONTACT_DTYPES} == CONTACT_DTYPES
+        pd.testing.assert_frame_equal(cached, df)
+
+    def test_second_pipeline_run_is_a_hit(self, tmp_path, monkeypatch):
+        """The same upload processed twice is served from the cache the second time, unchanged."""
+        monkeypatch.setenv("FOXTROT_CACHE_DIR", str(tmp_path))
+        files = [None, None, None, None, None, None, None, None, "Nov 2025"]
+
+        before = cache_stats()
+        files[2] = _sp_upload()
+        first = generate_combined_dataframe(*files, workers=1)
+        files[2] = _sp_upload()
+        second = generate_combined_dataframe(*files, workers=1)
+        after = cache_stats()
+
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 1
+        pd.testing.assert_frame_equal(second, first)
+        assert second.attrs == first.attrs
+
+class TestOpenParseCache:
+    """Tests for open_parse_cache() function."""
+
+    def test_disabled_by_empty_dir(self, monkeypatch):
+        """An empty FOXTROT_CACHE_DIR turns the cache off."""
+        monkeypatch.setenv("FOXTROT_CACHE_DIR", "")
+        assert open_parse_cache() is None
+
+    def test_default_is_outside_the_working_directory(self, monkeypatch):
+        """Without FOXTROT_CACHE_DIR the cache lives in the temp directory."""
+        monkeypatch.delenv("FOXTROT_CACHE_DIR")
+        cache = open_parse_cache()
+        assert cache.directory == os.path.join(tempfile.gettempdir(), "foxtrot_cache")
@@ -0,0 +1,89 @@
+import os
+import pandas as pd
+import pytest
+from unittest.mock import MagicMock, patch
+from uploader.checkpoint import Checkpoint, run_key
+from uploader.common import Contact
+from uploader.upload import upload_contacts
+
+
+def _contact(email, company="Co"):
+    return Contact(email, email.upper(), {"COMPANY": company}, [])
+
+
+def _combined(n):
+    return pd.DataFrame({
+        "Name": ["A B"] * n,
+        "Fname": ["A"] * n,
+        "Lname": ["B"] * n,
+        "Email1": [f"user{i}@test.com" for i in range(n)],
+        "Organisation": ["Co"] * n,
+        "Country": ["GB"] * n,
+        "Tags": [""] * n,
+    })
+
+
+class TestRunKey:
+    """Tests for run_key() function."""
+
+    def test_order_does_not_matter(self):
+        """The same contacts in another order are the same run."""
+        a, b = _contact("a@test.com"), _contact("b@test.com")
+        assert run_key("list1", [a, b]) == run_key("list1", [b, a])
+
+    def test_changed_contact_is_a_new_run(self):
+        """Different details or a different audience give a different run."""
+        key = run_key("list1", [_contact("a@test.com")])
+        assert run_key("list1", [_contact("a@test.com", company="New Co")]) != key
+        assert run_key("list2", [_contact("a@test.com")]) != key
+
+
+class TestCheckpoint:
+    """Tests for Checkpoint."""
+
+    def test_marked_contacts_are_done_after_reopening(self, tmp_path):
+        """Marks survive closing the database, and finish() clears them."""
+        path = str(tmp_path / "sync.sqlite3")
+        contacts = [_contact("a@test.com"), _contact("b@test.com")]
+        checkpoint = Checkpoint(path)
+        checkpoint.mark("run1", contacts[0])
+        checkpoint.close()
+
+        checkpoint = Checkpoint(path)
+        to_send, done = checkpoint.split_done("run1", contacts)
+        assert done == 1
+        assert [c.email for c in to_send] == ["b@test.com"]
+
+        checkpoint.finish("run1")
+        assert checkpoint.split_done("run1", contacts) == (contacts, 0)
+
+
+class TestResumedUpload:
+    """Tests for upload_contacts() with a checkpoint."""
+
+    @patch.dict(os.environ, {"MAILCHIMP_RATE_LIMIT": "1000", "MAILCHIMP_CONCURRENCY": "1"})
+    def test_interrupted_upload_resumes(self, tmp_path):
+        """A re-run after a crash only sends the contacts the first attempt did not finish."""
+        path = str(tmp_path / "sync.sqlite3")
+        finished = []
+
+        def crash_after_three(rows):
+            finished.append(rows)
+            if len(finished) == 3:
+                raise RuntimeError("worker died")
+
+        checkpoint = Checkpoint(path)
+        with pytest.raises(RuntimeError):
+            upload_contacts(_combined(10), MagicMock(), "list1", progress=crash_after_three, checkpoint=checkpoint)
+        checkpoint.close()
+
+        client = MagicMock()
+        checkpoint = Checkpoint(path)
+        results = upload_contacts(_combined(10), client, "list1", checkpoint=checkpoint)
+        # Contacts already in flight when it crashed may have finished too
+        assert results["resumed"] >= 3
+        assert results["successful"] == 10 - results["resumed"]
+        assert client.lists.set_list_member.call_count == results["successful"]
+
+        # A completed run leaves nothing behind, so the next upload starts afresh
+        assert upload_contacts(_combined(10), MagicMock(), "list1", checkpoint=checkpoint)["resumed"] == 0
@@ -0,0 +1,69 @@
+import json
+import numpy as np
+import pandas as pd
+from processors.classify import Classifier, classifier
+from processors.common import region_from_state_uk, technical_tags_to_interest
+
+INTERESTS = [
+    {"label": "Patent Interest", "contains": ["patent"]},
+    {"label": "TM Interest", "contains": ["tm", "trade mark", "trade-mark"]},
+]
+
+
+class TestClassifier:
+    """Tests for Classifier."""
+
+    def test_multiple_labels(self):
+        """Every matching rule applies, in rule order."""
+        interest = Classifier(INTERESTS, multiple=True)
+        assert interest("104;#TMs;#95;#Patents") == ("Patent Interest", "TM Interest")
+        assert interest("Trade-Mark") == ("TM Interest",)
+        assert interest("chemical") == ()
+        assert interest(np.nan) == ()
+
+    def test_first_match_wins(self):
+        """Single-label tables take the first matching rule, else the default."""
+        region = Classifier([
+            {"label": "A", "contains": ["york"]},
+            {"label": "B", "contains": ["new"]},
+        ], default="Unknown")
+        assert region("New York") == "A"
+        assert region("Newport") == "B"
+        assert region("Leeds") == "Unknown"
+        assert region(5) == "Unknown"
+
+    def test_patterns_are_literal(self):
+        """Regex characters in a pattern are matched as text."""
+        assert Classifier([{"label": "X", "contains": ["a.b"]}], default="-")("axb") == "-"
+
+    def test_classify_series(self):
+        """A column is classified per distinct value, missing values get the default."""
+        region = Classifier([{"label": "Scotland", "contains": ["glasgow"]}], default="Unknown")
+        values = pd.Series(["Glasgow", "Leeds", np.nan, "glasgow west"], index=[5, 6, 7, 8])
+        result = region.classify(values)
+        assert result.tolist() == ["Scotland", "Unknown", "Unknown", "Scotland"]
+        assert result.index.tolist() == [5, 6, 7, 8]
+
+
+class TestConfiguredClassifiers:
+    """Tests for the shipped rule file."""
+
+    def test_region_labels(self):
+        """Region labels match the ones used in Mailchimp."""
+        assert region_from_state_uk("ABERDEEN") == "Aberdeen & North Scotland"
+        assert region_from_state_uk("north east") == "Newcastle & North-East England"
+        assert region_from_state_uk("London") == "London & South-East England"
+        assert region_from_state_uk(None) == "UK - Region Unknown"
+
+    def test_interests(self):
+        """The scalar helper still returns a list."""
+        assert technical_tags_to_interest("Design;#Patent") == ["Patent Interest", "Design Interest"]
+
+    def test_rules_from_env(self, tmp_path, monkeypatch):
+        """FOXTROT_CLASSIFIERS points at another rule file."""
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({"uk_region": {"default": "?", "rules": [
+            {"label": "Leeds & Yorkshire", "contains": ["leeds"]},
+        ]}}))
+        monkeypatch.setenv("FOXTROT_CLASSIFIERS", str(path))
+        assert classifier("uk_region")("Leeds") == "Leeds & Yorkshire"
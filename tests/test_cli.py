@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+import cli
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sample-monthly-data")
+
+
+class TestDetectFiles:
+    """Tests for telling the month's files apart by name."""
+
+    def test_sample_directory(self):
+        """Every source in sample-monthly-data lands in its form field, EQ by date."""
+        found = {slot: os.path.basename(path) for slot, path in cli.detect_files(SAMPLE_DIR).items()}
+        assert found == {
+            "eq_base_start": "EQ list download - 1 Oct 2025 - base.xlsx",
+            "eq_base_end": "EQ list download - 30 October 2025 - base.xlsx",
+            "sp_uk_direct": "SP Download 30 Oct 2025 - UK Direct.xlsx",
+            "sp_uk_referrers": "SP Download 30 Oct 2025 - UK Referrers.xlsx",
+            "sp_us_direct": "SP Download 30 Oct 2025 - US Direct.xlsx",
+            "sp_us_agents": "SP Download 30 Oct 2025 - US Agents.xlsx",
+            "row_agents": "Master SP List - ROW Agents - Nov 2025.xlsx",
+            "website_list": "Master Website List - Nov 2025.xlsx",
+        }
+
+    def test_two_files_for_one_list(self, tmp_path):
+        """Two downloads of the same SP list are an error rather than a guess."""
+        (tmp_path / "sp_downloads").mkdir()
+        (tmp_path / "sp_downloads" / "SP Download 1 Oct 2025 - UK Direct.xlsx").touch()
+        (tmp_path / "sp_downloads" / "SP Download 30 Oct 2025 - UK Direct.csv").touch()
+        with pytest.raises(ValueError, match="sp_uk_direct"):
+            cli.detect_files(str(tmp_path))
+
+    def test_single_eq_download(self, tmp_path):
+        """EQ needs both the start and the end of the period."""
+        (tmp_path / "eq_downloads").mkdir()
+        (tmp_path / "eq_downloads" / "EQ list download - 1 Oct 2025 - base.xlsx").touch()
+        with pytest.raises(ValueError, match="found 1"):
+            cli.detect_files(str(tmp_path))
+
+
+class TestRun:
+    """Tests for the command-line runs."""
+
+    def test_export(self, tmp_path, capsys):
+        """The zip is written and the JSON report on stdout has the rows and timings."""
+        out = tmp_path / "upload.zip"
+        code = cli.main([SAMPLE_DIR, "--export", str(out), "--per-source", "--parquet", "--workers", "1",
+                         "--label", "Upload 02-Oct-25"])
+        report = json.loads(capsys.readouterr().out)
+
+        assert code == cli.EXIT_OK
+        assert report["status"] == "ok"
+        assert report["rows"] == 35
+        assert report["source_errors"] == {}
+        assert report["churn"] == {"EQ": {"removed": 0, "changed": 5}}
+        assert {"process", "zip"} <= set(report["metrics"]["stages"])
+        assert len(report["metrics"]["sources"]) == 7
+        with zipfile.ZipFile(out) as zf:
+            assert len(zf.namelist()) == 9
+        assert not os.path.exists(f"{out}.partial")
+
+    def test_failed_source_is_partial(self, tmp_path, capsys):
+        """A source that cannot be processed still exports the others, with exit code 3."""
+        data = tmp_path / "data"
+        shutil.copytree(os.path.join(SAMPLE_DIR, "master_spreadsheets"), data / "master_spreadsheets")
+        (data / "sp_downloads").mkdir()
+        (data / "sp_downloads" / "SP Download 30 Oct 2025 - UK Direct.csv").write_text("Nothing,Useful\n1,2\n")
+
+        code = cli.main([str(data), "--export", str(tmp_path / "upload.zip"), "--workers", "1"])
+        report = json.loads(capsys.readouterr().out)
+        assert code == cli.EXIT_PARTIAL
+        assert report["status"] == "partial"
+        assert list(report["source_errors"]) == ["SP UK_DIRECT"]
+
+    def test_nothing_found(self, tmp_path, capsys):
+        """A directory without source files is a usage error and writes nothing."""
+        out = tmp_path / "upload.zip"
+        assert cli.main([str(tmp_path), "--export", str(out)]) == cli.EXIT_USAGE
+        assert json.loads(capsys.readouterr().out)["status"] == "failed"
+        assert not out.exists()
+
+    def test_upload_needs_configuration(self, capsys, monkeypatch):
+        """Missing Mailchimp settings stop the run before anything is processed."""
+        monkeypatch.delenv("MAILCHIMP_API_KEY", raising=False)
+        with patch("upload_run.generate_combined_dataframe") as mock_generate:
+            assert cli.main([SAMPLE_DIR, "--upload"]) == cli.EXIT_USAGE
+        assert "MAILCHIMP_API_KEY" in json.loads(capsys.readouterr().out)["error"]
+        mock_generate.assert_not_called()
+
+    @patch.dict(os.environ, {"MAILCHIMP_API_KEY": "abc-us1", "MAILCHIMP_AUDIENCE_ID": "list1"})
+    @patch("upload_run.upload_contacts")
+    def test_upload_with_failures(self, mock_upload, capsys):
+        """Contacts that fail to upload make the run partial, and the counts are reported."""
+        mock_upload.return_value = {"total": 30, "successful": 29, "failed": 1, "errors": []}
+        code = cli.main([SAMPLE_DIR, "--upload", "--workers", "1"])
+        report = json.loads(capsys.readouterr().out)
+        assert code == cli.EXIT_PARTIAL
+        assert report["upload"]["failed"] == 1
+        assert mock_upload.call_args.args[2] == "list1"
+
+    def test_does_not_import_flask(self):
+        """Loading the CLI pulls in neither Flask nor pandas."""
+        check = "import sys, cli; print(sorted(m for m in ('flask', 'pandas') if m in sys.modules))"
+        out = subprocess.run([sys.executable, "-c", check], cwd=os.path.dirname(cli.__file__),
+                             capture_output=True, text=True, check=True).stdout
+        assert out.strip() == "[]"
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import pytest
+from mailchimp_marketing.api_client import ApiClientError
+from uploader import retry
+from uploader.client import MailchimpClients
+
+
+class _PingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    throttle = False
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        received = json.loads(self.rfile.read(length)) if length else None
+        body = json.dumps({"health_status": "Everything's Chimpy!", "received": received}).encode()
+        if self.throttle:
+            self.send_response(429)
+            self.send_header("Retry-After", "2")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_PUT = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mailchimp_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/3.0"
+    _PingHandler.throttle = False
+    server.shutdown()
+    server.server_close()
+
+
+ENV = {"MAILCHIMP_API_KEY": "abc-us1", "MAILCHIMP_AUDIENCE_ID": "list1"}
+
+
+class TestMailchimpClients:
+    """Tests for the shared, pooled Mailchimp client."""
+
+    @patch.dict(os.environ, ENV)
+    def test_client_is_shared(self):
+        """Every caller gets the same client, configured for the key's data centre."""
+        clients = MailchimpClients()
+        client = clients.client()
+        assert clients.client() is client
+        assert client.api_client.server == "us1"
+        assert clients.config().audience_id == "list1"
+
+    def test_config_is_validated_once(self):
+        """A valid configuration is kept; an invalid one raises until it is fixed."""
+        clients = MailchimpClients()
+        with patch.dict(os.environ, {}, clear=True):
+            with pytest.raises(ValueError, match="MAILCHIMP_API_KEY"):
+                clients.config()
+        with patch.dict(os.environ, ENV):
+            config = clients.config()
+        with patch.dict(os.environ, {}, clear=True):
+            assert clients.config() is config
+
+    @patch.dict(os.environ, ENV)
+    def test_connections_are_reused(self, mailchimp_server):
+        """Sequential calls go over one keep-alive connection."""
+        clients = MailchimpClients()
+        client = clients.client()
+        client.api_client.host = mailchimp_server
+
+        for _ in range(5):
+            assert client.ping.get()["health_status"] == "Everything's Chimpy!"
+        stats = clients.stats()
+        assert stats == {"requests": 5, "connections": 1, "reuse_rate": 0.8}
+
+    @patch.dict(os.environ, ENV)
+    def test_bodies_and_stats_since(self, mailchimp_server):
+        """Request bodies are sent as JSON, and stats(since=...) counts only later calls."""
+        clients = MailchimpClients()
+        client = clients.client()
+        client.api_client.host = mailchimp_server
+
+        client.ping.get()
+        before = clients.stats()
+        response = client.lists.set_list_member("list1", "hash", {"email_address": "a@x.com"})
+        assert response["received"] == {"email_address": "a@x.com"}
+        assert clients.stats(since=before) == {"requests": 1, "connections": 0, "reuse_rate": 1.0}
+
+    @patch.dict(os.environ, ENV)
+    def test_retry_after_reaches_the_error(self, mailchimp_server):
+        """A 429's Retry-After header is attached to the ApiClientError the SDK raises."""
+        clients = MailchimpClients()
+        client = clients.client()
+        client.api_client.host = mailchimp_server
+        _PingHandler.throttle = True
+
+        with pytest.raises(ApiClientError) as raised:
+            retry.call(client.ping.get)
+        assert raised.value.status_code == 429
+        assert raised.value.retry_after == 2.0
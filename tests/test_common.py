@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from processors.common import (
+    CONTACT_COLUMNS, CONTACT_DTYPES, contact_frame, format_tags, map_unique, split_name, split_names,
+    tags_by_key,
+)
+
+
+class TestSplitNames:
+    """Tests for split_names() function."""
+
+    def test_matches_split_name(self):
+        """Vectorised split gives the same result as split_name(str(x)) per row."""
+        names = pd.Series(["Ann Lee", "  Bob   van  der Berg ", "Cher", "", np.nan, "Dr\tJo\nSmith", 42])
+        fnames, lnames = split_names(names)
+        expected = [split_name(str(n)) for n in names]
+        assert list(zip(fnames, lnames)) == expected
+
+
+class TestMapUnique:
+    """Tests for map_unique() function."""
+
+    def test_fn_called_once_per_distinct_value(self):
+        """Each distinct value is mapped once, including missing values."""
+        calls = []
+
+        def fn(value):
+            calls.append(value)
+            return str(value).upper()
+
+        result = map_unique(pd.Series(["a", "b", "a", np.nan, np.nan]), fn)
+        assert result.tolist() == ["A", "B", "A", "NAN", "NAN"]
+        assert len(calls) == 3
+
+
+class TestTagsByKey:
+    """Tests for tags_by_key() function."""
+
+    def test_builds_tags_per_row(self):
+        """Every row gets the tag tuple of its key combination."""
+        keys = pd.DataFrame({"country": ["GB", "US", "GB", np.nan], "interest": ["P", "P", "T", "P"]})
+        result = tags_by_key(keys, lambda country, interest: ["SP", country, interest])
+        assert result.tolist() == [("SP", "GB", "P"), ("SP", "US", "P"), ("SP", "GB", "T"), ("SP", "nan", "P")]
+
+    def test_rows_share_one_tuple(self):
+        """Rows with the same key hold the same tuple object."""
+        result = tags_by_key(pd.DataFrame({"country": ["GB", "GB"]}), lambda country: ["SP", country])
+        assert result.iloc[0] is result.iloc[1]
+
+    def test_make_tags_called_once_per_combination(self):
+        """make_tags only runs for distinct key combinations."""
+        calls = []
+        keys = pd.DataFrame({"country": ["GB"] * 1000})
+        tags_by_key(keys, lambda country: calls.append(country) or [country])
+        assert calls == ["GB"]
+
+
+class TestFormatTags:
+    """Tests for format_tags() function."""
+
+    def test_quotes_and_joins(self):
+        """Tags are quoted and comma separated."""
+        assert format_tags(["SP", "GB"]) == '"SP","GB"'
+
+
+class TestContactFrame:
+    """Tests for contact_frame() function."""
+
+    def _contacts(self, countries):
+        n = len(countries)
+        return pd.DataFrame({
+            "Tags": [("SP",)] * n, "Name": ["A B"] * n, "Fname": ["A"] * n, "Lname": ["B"] * n,
+            "Email1": [f"a{i}@x.com" for i in range(n)], "Organisation": ["Org"] * n, "Country": countries,
+            "Extra": [1] * n,
+        })
+
+    def test_columns_and_dtypes(self):
+        """Contact columns come back in order, typed, with low-cardinality ones dictionary-encoded."""
+        df = contact_frame(self._contacts(["GB", "US", "GB"]))
+        assert list(df.columns) == CONTACT_COLUMNS
+        assert {col: df[col].dtype for col in CONTACT_DTYPES} == CONTACT_DTYPES
+        assert df["Country"].array._pa_array.chunk(0).dictionary.to_pylist() == ["GB", "US"]
+        assert df["Tags"].tolist() == [("SP",)] * 3
+
+    def test_typed_frame_is_left_alone(self):
+        """A frame already in the contact dtypes is returned without converting anything."""
+        df = contact_frame(self._contacts(["GB"]))
+        assert contact_frame(df) is df
+
+    def test_concat_keeps_buffers(self):
+        """Concatenating typed frames chains their Arrow chunks instead of copying rows."""
+        combined = pd.concat([contact_frame(self._contacts(["GB"])), contact_frame(self._contacts(["FR", "GB"]))],
+                             ignore_index=True)
+        assert combined["Country"].dtype == CONTACT_DTYPES["Country"]
+        assert combined["Email1"].array._pa_array.num_chunks == 2
+        assert combined["Country"].tolist() == ["GB", "FR", "GB"]
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+import pandas as pd
+from mailchimp_marketing.api_client import ApiClientError
+from uploader.common import new_results, prepare_contacts
+from uploader.concurrent import TokenBucket, upload_contacts_concurrent
+
+
+class FakeLists:
+    """Records peak in-flight calls and fails members whose email contains 'bad'"""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _call(self, body_email=None):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if body_email and "bad" in body_email:
+            raise ApiClientError({"detail": "rejected"}, status_code=400)
+
+    def set_list_member(self, list_id, subscriber_hash, body):
+        self._call(body["email_address"])
+
+    def update_list_member_tags(self, list_id, subscriber_hash, body):
+        self._call()
+
+
+class FakeClient:
+    def __init__(self):
+        self.lists = FakeLists()
+
+
+def _combined(n):
+    emails = [f"user{i}@test.com" for i in range(n)]
+    emails[3] = "bad3@test.com"
+    emails[5] = "no-at-sign"
+    return pd.DataFrame({
+        "Name": ["X Y"] * n,
+        "Fname": ["X"] * n,
+        "Lname": ["Y"] * n,
+        "Email1": emails,
+        "Organisation": ["Co"] * n,
+        "Country": ["GB"] * n,
+        "Tags": ['"SP","GB"' if i % 2 else "" for i in range(n)],
+    })
+
+
+class TestTokenBucket:
+    """Tests for TokenBucket."""
+
+    def test_limits_rate(self):
+        """Acquisitions beyond the burst wait for refills."""
+        async def run():
+            bucket = TokenBucket(rate=50, capacity=1)
+            start = time.monotonic()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(run()) >= 0.09
+
+
+class TestAdaptivePacing:
+    """Tests for TokenBucket.slow_down() and speed_up()."""
+
+    def test_halves_on_throttle_and_recovers(self):
+        """The rate is cut multiplicatively and climbs back additively, never past the start."""
+        bucket = TokenBucket(rate=10, increase=1)
+        bucket.slow_down()
+        bucket.slow_down()
+        assert bucket.rate == 2.5
+        for _ in range(20):
+            bucket.speed_up()
+        assert bucket.rate == 10
+
+    def test_never_below_min_rate(self):
+        """Repeated throttling stops at min_rate."""
+        bucket = TokenBucket(rate=10, min_rate=1)
+        for _ in range(10):
+            bucket.slow_down()
+        assert bucket.rate == 1
+
+    def test_retry_after_pauses_acquisitions(self):
+        """After a Retry-After nothing is acquired until it has passed."""
+        async def run():
+            bucket = TokenBucket(rate=1000)
+            bucket.slow_down(retry_after=0.1)
+            start = time.monotonic()
+            await bucket.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(run()) >= 0.09
+
+
+class ThrottlingLists(FakeLists):
+    """Throttles the first call for each member with a 429 and a short Retry-After"""
+
+    def __init__(self):
+        super().__init__(delay=0)
+        self.throttled = set()
+
+    def set_list_member(self, list_id, subscriber_hash, body):
+        self._call()
+        if subscriber_hash not in self.throttled:
+            self.throttled.add(subscriber_hash)
+            error = ApiClientError({"title": "Too Many Requests"}, status_code=429)
+            error.retry_after = 0.01
+            raise error
+
+
+class TestUploadContactsConcurrent:
+    """Tests for upload_contacts_concurrent() function."""
+
+    def test_counters_match_serial_path(self):
+        """Successes, failures and errors are counted per contact in row order."""
+        client = FakeClient()
+        results = new_results()
+        contacts = prepare_contacts(_combined(20), results)
+        upload_contacts_concurrent(client, "list1", contacts, results, concurrency=5, rate=1000)
+
+        assert results["total"] == 20
+        assert results["successful"] == 18
+        assert results["failed"] == 2
+        assert [e["email"] for e in results["errors"]] == ["no-at-sign", "bad3@test.com"]
+        assert results["errors"][1]["reason"].startswith("Mailchimp API error")
+
+    def test_counts_requests_not_rows(self):
+        """Contacts with tags cost two requests, without tags one."""
+        client = FakeClient()
+        results = new_results()
+        contacts = prepare_contacts(_combined(10), results)
+        upload_contacts_concurrent(client, "list1", contacts, results, concurrency=5, rate=1000)
+        # 9 valid contacts; odd rows have tags, minus row 5 (invalid) and row 3 (upsert fails)
+        assert client.lists.calls == 9 + 3
+
+    def test_throttled_calls_are_retried(self):
+        """A 429 is retried after its Retry-After instead of failing the contact."""
+        client = FakeClient()
+        client.lists = ThrottlingLists()
+        results = new_results()
+        contacts = prepare_contacts(_combined(8), results)
+        upload_contacts_concurrent(client, "list1", contacts, results, concurrency=2, rate=1000)
+        # Row 5 has no valid email; every other contact is throttled once, then succeeds
+        assert results["successful"] == 7
+        assert results["failed"] == 1
+        assert len(client.lists.throttled) == 7
+
+    def test_keeps_several_requests_in_flight(self):
+        """More than one request is in flight but never above the concurrency."""
+        client = FakeClient()
+        results = new_results()
+        contacts = prepare_contacts(_combined(30), results)
+        upload_contacts_concurrent(client, "list1", contacts, results, concurrency=4, rate=1000)
+        assert 1 < client.lists.peak <= 4
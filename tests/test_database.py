@@ -0,0 +1,41 @@
+from uploader import database
+from uploader.database import connect, lookup
+
+
+class TestConnect:
+    """Tests for connect() function."""
+
+    def test_wal_and_busy_timeout(self, tmp_path):
+        """Connections use WAL and wait for locks rather than failing straight away."""
+        conn = connect(str(tmp_path / "sync.sqlite3"))
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == database.BUSY_TIMEOUT * 1000
+        conn.close()
+
+    def test_reader_not_blocked_by_writer(self, tmp_path):
+        """A connection can read while another is part way through a write."""
+        path = str(tmp_path / "sync.sqlite3")
+        writer, reader = connect(path), connect(path)
+        with writer:
+            writer.execute("CREATE TABLE t (x INTEGER)")
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("INSERT INTO t VALUES (1)")
+        assert reader.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+        writer.commit()
+        assert reader.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+        writer.close()
+        reader.close()
+
+
+class TestLookup:
+    """Tests for lookup() function."""
+
+    def test_chunks_cover_every_key(self, tmp_path, monkeypatch):
+        """Keys beyond one chunk are all looked up, within the scope only."""
+        monkeypatch.setattr(database, "LOOKUP_CHUNK", 2)
+        conn = connect(str(tmp_path / "sync.sqlite3"))
+        conn.execute("CREATE TABLE t (scope TEXT, key TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", [("a", k) for k in "vwxyz"] + [("b", "v")])
+        rows = lookup(conn, "SELECT scope, key FROM t WHERE scope = ? AND key IN ({placeholders})", "a", list("vxyq"))
+        assert sorted(rows) == [("a", "v"), ("a", "x"), ("a", "y")]
+        conn.close()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from processors.diff import diff_snapshots, normalize_emails
+
+
+def _snapshot(rows):
+    return pd.DataFrame(rows, columns=["name", "email1", "organisation", "country"])
+
+
+class TestNormalizeEmails:
+    """Tests for normalize_emails() function."""
+
+    def test_lowercases_and_strips(self):
+        """Case and surrounding whitespace are ignored, missing becomes blank."""
+        result = normalize_emails(pd.Series([" A@X.com ", np.nan]))
+        assert result.tolist() == ["a@x.com", ""]
+
+
+class TestDiffSnapshots:
+    """Tests for diff_snapshots() function."""
+
+    def test_new_removed_and_changed(self):
+        """Each contact lands in exactly the right set."""
+        start = _snapshot([
+            ["Ann Lee", "ann@x.com", "Co", "GB"],
+            ["Bob Ray", "bob@x.com", "Co", "GB"],
+            ["Cat Day", "cat@x.com", "Co", "GB"],
+        ])
+        end = _snapshot([
+            ["Ann Lee", "ann@x.com", "Co", "GB"],
+            ["Cat Day", "cat@x.com", "New Co", "GB"],
+            ["Dan Fox", "dan@x.com", "Co", "US"],
+        ])
+        diff = diff_snapshots(start, end)
+        assert diff.new["email1"].tolist() == ["dan@x.com"]
+        assert diff.removed["email1"].tolist() == ["bob@x.com"]
+        assert diff.changed["email1"].tolist() == ["cat@x.com"]
+
+    def test_email_case_is_ignored(self):
+        """The same email in a different case is not a new contact."""
+        start = _snapshot([["Ann Lee", "Ann@X.com", "Co", "GB"]])
+        end = _snapshot([["Ann Lee", " ann@x.com", "Co", "GB"]])
+        diff = diff_snapshots(start, end)
+        assert diff.new.empty
+        assert diff.removed.empty
+        assert diff.changed.empty
+
+    def test_repeated_email_gives_one_row(self):
+        """An email repeated in the end snapshot is reported once, using its last row."""
+        start = _snapshot([["Ann Lee", "ann@x.com", "Co", "GB"]])
+        end = _snapshot([
+            ["Dan Fox", "dan@x.com", "Old Co", "US"],
+            ["Dan Fox", "DAN@x.com", "New Co", "US"],
+            ["Ann Lee", "ann@x.com", "Co", "GB"],
+        ])
+        diff = diff_snapshots(start, end)
+        assert len(diff.new) == 1
+        assert diff.new.iloc[0]["organisation"] == "New Co"
+
+    def test_new_contacts_sorted_by_email(self):
+        """New contacts come out in email order."""
+        start = _snapshot([])
+        end = _snapshot([["B", "b@x.com", "", ""], ["A", "a@x.com", "", ""]])
+        assert diff_snapshots(start, end).new["email1"].tolist() == ["a@x.com", "b@x.com"]
+
+    def test_missing_compare_column_counts_as_blank(self):
+        """A snapshot without a country column compares as blank country."""
+        start = _snapshot([["Ann Lee", "ann@x.com", "Co", np.nan]])
+        end = start.drop(columns=["country"])
+        assert diff_snapshots(start, end).changed.empty
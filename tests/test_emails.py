@@ -0,0 +1,42 @@
+import hashlib
+import pandas as pd
+from processors.emails import prepare_emails, subscriber_hashes
+
+
+class TestPrepareEmails:
+    """Tests for prepare_emails() function."""
+
+    def test_normalises_and_hashes(self):
+        """Valid emails are trimmed and lower-cased, with Mailchimp's subscriber hash."""
+        valid, rejected = prepare_emails(pd.DataFrame({"Email1": [" Ann@Example.COM ", "bob@example.co.uk"]}))
+        assert valid["Email1"].tolist() == ["ann@example.com", "bob@example.co.uk"]
+        assert valid["subscriber_hash"][0] == hashlib.md5(b"ann@example.com").hexdigest()
+        assert rejected.empty
+
+    def test_rejects_with_reasons(self):
+        """Blank and malformed addresses are rejected, keeping their original values and order."""
+        df = pd.DataFrame({
+            "Email1": ["ok@test.com", None, "  ", "ann at example.com", "a@b", "x@-bad-.com", "a..b@test.com"],
+            "Fname": list("ABCDEFG"),
+        })
+        valid, rejected = prepare_emails(df)
+        assert valid["Fname"].tolist() == ["A"]
+        assert rejected["Fname"].tolist() == list("BCDEFG")
+        assert rejected["Reason"].tolist() == ["Missing email address"] * 2 + ["Invalid email address format"] * 4
+        assert rejected["Email1"].tolist()[2] == "ann at example.com"
+
+    def test_keeps_attrs(self):
+        """Frame attrs such as source_errors survive the split."""
+        df = pd.DataFrame({"Email1": ["ok@test.com"]})
+        df.attrs["source_errors"] = {"EQ": "bad file"}
+        valid, _ = prepare_emails(df)
+        assert valid.attrs["source_errors"] == {"EQ": "bad file"}
+
+
+class TestSubscriberHashes:
+    """Tests for subscriber_hashes() function."""
+
+    def test_repeated_emails_share_a_hash(self):
+        """Each row gets the hash of its own email."""
+        hashes = subscriber_hashes(pd.Series(["a@x.com", "b@x.com", "a@x.com"]))
+        assert hashes[0] == hashes[2] != hashes[1]
@@ -0,0 +1,181 @@
+import io
+import time
+import zipfile
+import pandas as pd
+from processors.common import contact_frame, format_tags
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from processors.export import (
+    PARQUET_NAME, iter_csv, iter_zip, iter_zip_batches, to_parquet_table, zip_compression,
+)
+
+
+def _combined():
+    df = pd.DataFrame({
+        "Name": ["A B", "C D", "E F"], "Fname": ["A", "C", "E"], "Lname": ["B", "D", "F"],
+        "Email1": ["a@x.com", "c@x.com", "e@x.com"], "Organisation": ["Co, Ltd", "", "Org"],
+        "Country": ["GB", "US", "FR"], "Tags": [("EQ", "GB"), ("SP", "US"), ("Website",)],
+    })
+    df.attrs["source_rows"] = {"EQ": (0, 1), "SP US_DIRECT": (1, 2), "Website": (2, 3)}
+    return df
+
+
+class TestIterCsv:
+    """Tests for iter_csv() function."""
+
+    def test_chunks_match_one_shot(self):
+        """Joined chunks are exactly the CSV written in one go."""
+        chunks = list(iter_csv(_combined(), chunk_rows=2))
+        assert len(chunks) == 2
+        assert b"".join(chunks) == b"".join(iter_csv(_combined()))
+
+    def test_reads_back_like_to_csv(self):
+        """Arrow's quoting parses to the same values as pandas' own CSV."""
+        df = _combined()
+        expected = pd.read_csv(io.StringIO(df.assign(Tags=df["Tags"].map(format_tags)).to_csv(index=False)))
+        written = pd.read_csv(io.BytesIO(b"".join(iter_csv(contact_frame(df)))))
+        pd.testing.assert_frame_equal(written, expected)
+
+    def test_empty_frame_has_header(self):
+        """An empty frame still gives its header row."""
+        assert b"".join(iter_csv(_combined().iloc[:0])) == (
+            b'"Name","Fname","Lname","Email1","Organisation","Country","Tags"\n'
+        )
+
+
+class TestIterZip:
+    """Tests for iter_zip() function."""
+
+    def test_combined_only_by_default(self):
+        """Without a month only the combined CSV is written."""
+        data = b"".join(iter_zip(_combined(), chunk_rows=1))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.namelist() == ["mailchimp_upload_combined.csv"]
+            assert zf.read("mailchimp_upload_combined.csv").startswith(b'"Name",')
+
+    def test_per_source_files(self):
+        """Each source gets its own CSV named like the sample uploads."""
+        data = b"".join(iter_zip(_combined(), month="Nov 2025"))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.namelist() == [
+                "mailchimp_upload_combined.csv",
+                "Master EQ List - Nov 2025.csv",
+                "Master SP List - US Direct - Nov 2025.csv",
+                "Master Website List - Nov 2025.csv",
+            ]
+            us = zf.read("Master SP List - US Direct - Nov 2025.csv").decode("utf-8")
+        assert us.startswith('\ufeff"Name",')
+        assert us.splitlines()[1:] == ['"C D","C","D","c@x.com","","US","""SP"",""US"""']
+
+    def test_streams_in_pieces(self):
+        """Bytes are handed out while the zip is being written, not all at the end."""
+        pieces = [p for p in iter_zip(_combined(), chunk_rows=1) if p]
+        assert len(pieces) > 1
+
+    def test_parquet_file(self):
+        """With parquet the contacts are also written as Parquet, stored rather than deflated again."""
+        data = b"".join(iter_zip(_combined(), chunk_rows=2, parquet=True))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.namelist() == ["mailchimp_upload_combined.csv", PARQUET_NAME]
+            assert zf.getinfo(PARQUET_NAME).compress_type == zipfile.ZIP_STORED
+            parquet = pq.ParquetFile(io.BytesIO(zf.read(PARQUET_NAME)))
+        assert parquet.metadata.num_row_groups == 2
+        table = parquet.read(columns=["Email1", "Tags"])
+        assert table.column("Tags").to_pylist() == [["EQ", "GB"], ["SP", "US"], ["Website"]]
+
+    def test_compression_choice(self):
+        """The CSVs are compressed the way the chosen compression says."""
+        df = pd.concat([_combined()] * 200, ignore_index=True)
+        sizes = {}
+        for name in ("stored", "fast", "max"):
+            method, level = zip_compression(name)
+            data = b"".join(iter_zip(df, compression=method, compresslevel=level))
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                info = zf.getinfo("mailchimp_upload_combined.csv")
+            assert info.compress_type == method
+            sizes[name] = info.compress_size
+        assert sizes["stored"] > sizes["fast"] >= sizes["max"]
+
+
+    def test_entries_are_dated_now(self):
+        """Every file is stamped with the time the zip was written, not the 1980 ZipInfo default."""
+        today = time.localtime()[:3]
+        data = b"".join(iter_zip(_combined(), month="Nov 2025", parquet=True))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert {info.date_time[:3] for info in zf.infolist()} == {today}
+
+class TestToParquetTable:
+    """Tests for to_parquet_table() and zip_compression()."""
+
+    def test_typed_columns(self):
+        """Text stays text, Organisation and Country are dictionary-encoded and Tags is a list."""
+        table = to_parquet_table(_combined())
+        assert table.column_names == ["Name", "Fname", "Lname", "Email1", "Organisation", "Country", "Tags"]
+        assert table.schema.field("Email1").type == pa.string()
+        assert pa.types.is_dictionary(table.schema.field("Country").type)
+        assert table.schema.field("Tags").type == pa.list_(pa.string())
+        assert table.column("Organisation").to_pylist() == ["Co, Ltd", "", "Org"]
+
+    def test_unknown_compression(self):
+        """An unknown compression name is a ValueError; no name means the default."""
+        assert zip_compression(None) == (zipfile.ZIP_DEFLATED, None)
+        with pytest.raises(ValueError, match="stored, fast, max"):
+            zip_compression("zstd")
+
+
+class TestIterZipBatches:
+    """Tests for iter_zip_batches() function."""
+
+    def _batches(self, df):
+        for label, (start, stop) in df.attrs["source_rows"].items():
+            yield label, df.iloc[start:stop]
+
+    def test_matches_iter_zip(self):
+        """Every file in the zip is byte-for-byte what iter_zip() writes for the combined frame."""
+        df = _combined()
+        df.attrs["source_errors"] = {"SP UK_DIRECT": "bad file"}
+        expected = b"".join(iter_zip(df, month="Nov 2025"))
+        streamed = b"".join(iter_zip_batches(self._batches(df), month="Nov 2025", chunk_rows=1,
+                                             source_errors=df.attrs["source_errors"]))
+        with zipfile.ZipFile(io.BytesIO(expected)) as a, zipfile.ZipFile(io.BytesIO(streamed)) as b:
+            assert b.namelist() == a.namelist()
+            for name in a.namelist():
+                assert b.read(name) == a.read(name)
+
+    def test_parquet_matches_iter_zip(self):
+        """The Parquet file written from batches reads back as the one iter_zip() writes."""
+        df = _combined()
+        expected = b"".join(iter_zip(df, parquet=True))
+        streamed = b"".join(iter_zip_batches(self._batches(df), chunk_rows=1, parquet=True))
+        with zipfile.ZipFile(io.BytesIO(expected)) as a, zipfile.ZipFile(io.BytesIO(streamed)) as b:
+            assert b.namelist() == a.namelist()
+            # Row groups (and so dictionaries) differ, the values do not
+            assert pq.read_table(io.BytesIO(b.read(PARQUET_NAME))).to_pylist() == (
+                pq.read_table(io.BytesIO(a.read(PARQUET_NAME))).to_pylist()
+            )
+
+    def test_entries_are_dated_now(self):
+        """The streamed and spooled files are stamped with the current time too."""
+        today = time.localtime()[:3]
+        data = b"".join(iter_zip_batches(self._batches(_combined()), month="Nov 2025", parquet=True))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert {info.date_time[:3] for info in zf.infolist()} == {today}
+
+    def test_source_errors_read_after_batches(self):
+        """Errors added while the batches are produced still make it into the zip."""
+        errors = {}
+
+        def batches():
+            yield "EQ", _combined().iloc[:1]
+            errors["Website"] = "bad file"
+
+        data = b"".join(iter_zip_batches(batches(), source_errors=errors))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.read("source_errors.txt").decode() == "Website: bad file\n"
+
+    def test_no_batches_has_header(self):
+        """With no batches the combined CSV still has its header row."""
+        data = b"".join(iter_zip_batches(iter([])))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.read("mailchimp_upload_combined.csv") == b"".join(iter_csv(_combined().iloc[:0]))
@@ -0,0 +1,86 @@
+import io
+import pandas as pd
+from unittest.mock import patch
+from processors.ingest import get_column, iter_table, read_header, read_table
+
+
+class Upload(io.BytesIO):
+    """Stands in for a werkzeug FileStorage"""
+
+    def __init__(self, data, filename):
+        super().__init__(data)
+        self.filename = filename
+
+
+def _xlsx(df):
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+COLUMNS = {"First Name": ["First Name", "Fname"], "Email": ["Email", "Email1"], "Country": ["Country"]}
+
+
+class TestGetColumn:
+    """Tests for get_column() on a bare header list."""
+
+    def test_accepts_header_list(self):
+        """Works on a list of column names as well as a DataFrame."""
+        assert get_column(["fname", "Other"], ["First Name", "Fname"]) == "fname"
+
+
+class TestReadTable:
+    """Tests for read_table() function."""
+
+    def test_csv_projects_and_renames(self):
+        """Only wanted columns are loaded, under their canonical names."""
+        upload = Upload(b"fname,EMAIL1,Notes,Other\nAnn,a@x.com,n,o\n", "list.csv")
+        df = read_table(upload, COLUMNS)
+        assert list(df.columns) == ["First Name", "Email"]
+        assert df.iloc[0].tolist() == ["Ann", "a@x.com"]
+
+    def test_xlsx_projects_and_renames(self):
+        """Excel files are projected the same way."""
+        data = _xlsx(pd.DataFrame({"Notes": ["n"], "First Name": ["Ann"], "Email": ["a@x.com"], "Country": ["GB"]}))
+        df = read_table(Upload(data, "list.xlsx"), COLUMNS)
+        assert sorted(df.columns) == ["Country", "Email", "First Name"]
+        assert df.iloc[0]["Country"] == "GB"
+
+    def test_openpyxl_fallback(self):
+        """Without a faster engine installed the default reader is used."""
+        data = _xlsx(pd.DataFrame({"First Name": ["Ann"], "Email": ["a@x.com"]}))
+        with patch("processors.ingest.excel_engine", return_value=None):
+            df = read_table(Upload(data, "list.xlsx"), COLUMNS)
+        assert df.iloc[0]["First Name"] == "Ann"
+
+    def test_header_probe_rewinds(self):
+        """Reading the header leaves the stream at the start."""
+        upload = Upload(b"a,b\n1,2\n", "x.csv")
+        assert read_header(upload) == ["a", "b"]
+        assert upload.tell() == 0
+
+
+class TestIterTable:
+    """Tests for iter_table() function."""
+
+    def test_csv_in_chunks(self):
+        """A CSV comes back a chunk at a time, projected and renamed like read_table()."""
+        upload = Upload(b"fname,EMAIL1,Notes\nAnn,a@x.com,n\nBob,b@x.com,n\nCy,c@x.com,n\n", "list.csv")
+        chunks = list(iter_table(upload, COLUMNS, chunk_rows=2))
+        assert [len(c) for c in chunks] == [2, 1]
+        assert list(chunks[1].columns) == ["First Name", "Email"]
+        assert chunks[1].index.tolist() == [2]
+        assert chunks[1].iloc[0].tolist() == ["Cy", "c@x.com"]
+
+    def test_csv_values_stay_text(self):
+        """A chunk of number-like values is not turned into floats."""
+        upload = Upload(b"Fname,Email1\n007,a@x.com\n,b@x.com\n", "list.csv")
+        chunk = next(iter_table(upload, COLUMNS, chunk_rows=2))
+        assert chunk["First Name"].iloc[0] == "007"
+
+    def test_workbook_in_one_piece(self):
+        """Workbooks are not chunked."""
+        data = _xlsx(pd.DataFrame({"First Name": ["Ann", "Bob", "Cy"], "Email": ["a@x.com", "b@x.com", "c@x.com"]}))
+        chunks = list(iter_table(Upload(data, "list.xlsx"), COLUMNS, chunk_rows=1))
+        assert len(chunks) == 1
+        assert len(chunks[0]) == 3
@@ -0,0 +1,180 @@
+import io
+import os
+import pandas as pd
+from unittest.mock import patch
+from jobs import Job, JobQueue
+import main
+
+
+class TestJobQueue:
+    """Tests for JobQueue and Job."""
+
+    def test_results_recorded_when_done(self):
+        """Return value of the job function becomes the results."""
+        queue = JobQueue(max_workers=1)
+        job = queue.submit(lambda job, x: {"total": x}, 3)
+        assert job.wait(5)
+        assert job.stage == "done"
+        assert job.results == {"total": 3}
+        assert queue.get(job.id) is job
+
+    def test_exception_marks_job_failed(self):
+        """An exception fails the job and keeps its message."""
+        def boom(job):
+            raise ValueError("no files")
+
+        queue = JobQueue(max_workers=1)
+        job = queue.submit(boom)
+        assert job.wait(5)
+        assert job.stage == "failed"
+        assert job.error == "no files"
+
+    def test_status_reports_rate_and_eta(self):
+        """Rate and ETA are derived from rows done in the current stage."""
+        job = Job("j1")
+        job.set_stage("uploading", rows_total=100)
+        job.stage_started_at -= 10
+        job.advance(50)
+        status = job.status()
+        assert status["rows_done"] == 50
+        assert 4.9 < status["rate"] < 5.1
+        assert 9 < status["eta_seconds"] < 11
+
+
+class TestProcessUploadJob:
+    """Tests for the background /process upload flow."""
+
+    @patch.dict(os.environ, {"MAILCHIMP_API_KEY": "abc-us1", "MAILCHIMP_AUDIENCE_ID": "list1"})
+    @patch("upload_run.upload_contacts")
+    @patch("upload_run.generate_combined_dataframe")
+    def test_upload_is_queued_and_results_rendered(self, mock_generate, mock_upload, client):
+        """/process returns 202 with a job id, and the results page renders once done."""
+        seen = {}
+
+        def generate(*args, **kwargs):
+            # The website upload reached the worker as a readable copy
+            seen["filename"], seen["data"] = args[-2].filename, args[-2].read()
+            return pd.DataFrame({"Email1": ["a@test.com"]})
+
+        mock_generate.side_effect = generate
+        mock_upload.return_value = {"total": 1, "successful": 1, "failed": 0, "errors": []}
+
+        response = client.post("/process", data={
+            "action": "upload_to_mailchimp",
+            "upload_date_label": "Upload 02-Oct-25",
+            "website_list": (io.BytesIO(b"Email1\na@test.com\n"), "website.csv"),
+        }, content_type="multipart/form-data")
+        assert response.status_code == 202
+
+        job_id = next(iter(reversed(main.job_queue._jobs)))
+        assert main.job_queue.get(job_id).wait(5)
+
+        status = client.get(f"/jobs/{job_id}").get_json()
+        assert status["stage"] == "done"
+
+        results = client.get(f"/jobs/{job_id}/results")
+        assert results.status_code == 200
+        assert b"Successfully Uploaded" in results.data
+        assert b"Where the Time Went" in results.data
+        assert seen == {"filename": "website.csv", "data": b"Email1\na@test.com\n"}
+        # and was closed once the job finished with it
+        assert mock_generate.call_args.args[-2].closed
+
+    @patch.dict(os.environ, {"MAILCHIMP_API_KEY": "abc-us1", "MAILCHIMP_AUDIENCE_ID": "list1"})
+    @patch("upload_run.upload_contacts")
+    @patch("upload_run.generate_combined_dataframe")
+    def test_rejected_rows_are_downloadable(self, mock_generate, mock_upload, client):
+        """Rows with bad emails never reach the uploader and can be downloaded as CSV."""
+        mock_generate.return_value = pd.DataFrame({"Email1": [" A@Test.com", "nope", None]})
+        mock_upload.return_value = {"total": 3, "successful": 1, "failed": 2, "errors": []}
+
+        client.post("/process", data={
+            "action": "upload_to_mailchimp",
+            "upload_date_label": "Upload 02-Oct-25",
+            "website_list": (io.BytesIO(b"Email1\na@test.com\n"), "website.csv"),
+        }, content_type="multipart/form-data")
+        job_id = next(iter(reversed(main.job_queue._jobs)))
+        assert main.job_queue.get(job_id).wait(5)
+
+        uploaded = mock_upload.call_args.args[0]
+        assert uploaded["Email1"].tolist() == ["a@test.com"]
+        assert b"Download rejected rows" in client.get(f"/jobs/{job_id}/results").data
+
+        response = client.get(f"/jobs/{job_id}/rejected.csv")
+        assert response.status_code == 200
+        assert response.get_data(as_text=True).splitlines() == [
+            '"Email1","Reason"', '"nope","Invalid email address format"', ',"Missing email address"',
+        ]
+
+    @patch.dict(os.environ, {"MAILCHIMP_API_KEY": "abc-us1", "MAILCHIMP_AUDIENCE_ID": "list1"})
+    @patch("upload_run.open_audience_snapshot", return_value=None)
+    @patch("upload_run.upload_contacts")
+    @patch("upload_run.generate_combined_dataframe")
+    def test_results_are_saved_and_paged(self, mock_generate, mock_upload, _audience, client, monkeypatch, tmp_path):
+        """Failures are saved, paged, filtered by reason, downloadable, and outlive the job."""
+        monkeypatch.setenv("FOXTROT_SYNC_DB", str(tmp_path / "sync.sqlite3"))
+        monkeypatch.setattr(main, "PAGE_SIZE", 2)
+        mock_generate.return_value = pd.DataFrame({"Email1": ["a@test.com"]})
+        errors = [{"email": f"user{i}@test.com", "reason": f"error {i}", "kind": "http_400" if i < 3 else "http_500"}
+                  for i in range(5)]
+        mock_upload.return_value = {"total": 5, "successful": 0, "failed": 5, "errors": errors}
+
+        client.post("/process", data={
+            "action": "upload_to_mailchimp",
+            "upload_date_label": "Upload 02-Oct-25",
+            "website_list": (io.BytesIO(b"Email1\na@test.com\n"), "website.csv"),
+        }, content_type="multipart/form-data")
+        job_id = next(iter(reversed(main.job_queue._jobs)))
+        assert main.job_queue.get(job_id).wait(5)
+        assert "errors" not in main.job_queue.get(job_id).results
+
+        page = client.get(f"/jobs/{job_id}/results?page=2").get_data(as_text=True)
+        assert "user2@test.com" in page and "user1@test.com" not in page
+        assert "Page 2 of 3" in page
+        assert "http_500 (2)" in page
+
+        filtered = client.get(f"/jobs/{job_id}/results?reason=http_500").get_data(as_text=True)
+        assert "user3@test.com" in filtered and "user0@test.com" not in filtered
+
+        # After the job is gone (pruned, or the server restarted) the results are still there
+        del main.job_queue._jobs[job_id]
+        assert client.get(f"/jobs/{job_id}/results").status_code == 200
+        log = client.get(f"/jobs/{job_id}/errors.csv?reason=http_400")
+        assert log.get_data(as_text=True).splitlines() == [
+            '"Email","Reason","Kind"',
+            '"user0@test.com","error 0","http_400"',
+            '"user1@test.com","error 1","http_400"',
+            '"user2@test.com","error 2","http_400"',
+        ]
+
+    @patch.dict(os.environ, {"MAILCHIMP_API_KEY": "abc-us1", "MAILCHIMP_AUDIENCE_ID": "list1"})
+    @patch("upload_run.open_audience_snapshot", return_value=None)
+    @patch("upload_run.upload_contacts")
+    @patch("upload_run.generate_combined_dataframe")
+    def test_results_kept_when_save_fails(self, mock_generate, mock_upload, _audience, client, monkeypatch, tmp_path):
+        """A results database that cannot be opened leaves the job done with its failures in memory."""
+        monkeypatch.setenv("FOXTROT_SYNC_DB", str(tmp_path / "missing" / "sync.sqlite3"))
+        monkeypatch.setattr("upload_run.open_sync_state", lambda: None)
+        monkeypatch.setattr("upload_run.open_checkpoint", lambda: None)
+        mock_generate.return_value = pd.DataFrame({"Email1": ["a@test.com"]})
+        errors = [{"email": "user0@test.com", "reason": "error 0", "kind": "http_400"}]
+        mock_upload.return_value = {"total": 1, "successful": 0, "failed": 1, "errors": errors}
+
+        response = client.post("/process", data={
+            "action": "upload_to_mailchimp",
+            "upload_date_label": "Upload 02-Oct-25",
+            "website_list": (io.BytesIO(b"Email1\na@test.com\n"), "website.csv"),
+        }, content_type="multipart/form-data")
+        assert response.status_code == 202
+        job_id = next(iter(reversed(main.job_queue._jobs)))
+        job = main.job_queue.get(job_id)
+        assert job.wait(5)
+        assert job.stage == "done"
+        assert job.results["errors"] == errors
+        assert "user0@test.com" in client.get(f"/jobs/{job_id}/results").get_data(as_text=True)
+
+    def test_unknown_job_is_404(self, client):
+        """Polling an unknown job id returns 404."""
+        assert client.get("/jobs/nope").status_code == 404
+        assert client.get("/jobs/nope/results").status_code == 404
+        assert client.get("/jobs/nope/errors.csv").status_code == 404
@@ -1,7 +1,8 @@
 import pytest
 from unittest.mock import patch
 import os
-from main import parse_tags_from_csv, validate_mailchimp_config
+from main import validate_mailchimp_config
+from uploader.common import parse_tags_from_csv
 
 
 class TestParseTagsFromCSV:
@@ -109,3 +110,145 @@ class TestFlaskRoutes:
         """POST /process with no files redirects."""
         response = client.post("/process", data={"action": "generate_zip"})
         assert response.status_code == 302
+
+    def test_cache_stats_route(self, client):
+        """GET /cache reports parse cache hits and misses."""
+        response = client.get("/cache")
+        assert response.status_code == 200
+        assert set(response.get_json()) == {"hits", "misses"}
+
+    def test_connection_stats_route(self, client):
+        """GET /mailchimp/connections reports connection reuse."""
+        response = client.get("/mailchimp/connections")
+        assert response.status_code == 200
+        assert set(response.get_json()) == {"requests", "connections", "reuse_rate"}
+
+    def test_metrics_route(self, client):
+        """GET /metrics serves the Prometheus text format."""
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        assert "# TYPE foxtrot_mailchimp_request_seconds histogram" in response.get_data(as_text=True)
+
+
+    def test_file_over_the_limit(self, client, monkeypatch):
+        """A file over FOXTROT_MAX_FILE_BYTES is refused with 413."""
+        import io
+        monkeypatch.setenv("FOXTROT_MAX_FILE_BYTES", "10")
+        response = client.post("/process", data={
+            "action": "generate_zip",
+            "upload_date_label": "Nov 2025",
+            "website_list": (io.BytesIO(b"Fname,Lname,Email1\nA,B,a@x.com\n"), "website.csv"),
+        }, content_type="multipart/form-data")
+        assert response.status_code == 413
+        assert b"website.csv is larger than" in response.data
+
+    def test_request_over_the_limit(self, app, client, monkeypatch):
+        """A request body over MAX_CONTENT_LENGTH is refused with 413 before it is read."""
+        import io
+        monkeypatch.setitem(app.config, "MAX_CONTENT_LENGTH", 100)
+        response = client.post("/process", data={
+            "action": "generate_zip",
+            "upload_date_label": "Nov 2025",
+            "website_list": (io.BytesIO(b"x" * 1000), "website.csv"),
+        }, content_type="multipart/form-data")
+        assert response.status_code == 413
+        assert b"limit" in response.data
+
+class TestDownloadZip:
+    """Tests for download_zip() function."""
+
+    def test_tags_are_quoted_in_csv(self, app):
+        """Tag tuples are written in the "a","b" CSV format."""
+        import io
+        import zipfile
+        import pandas as pd
+        from main import download_zip
+
+        combined = pd.DataFrame({
+            "Name": ["A B"], "Fname": ["A"], "Lname": ["B"], "Email1": ["a@test.com"],
+            "Organisation": ["Co"], "Country": ["GB"], "Tags": [("SP", "GB")],
+        })
+        with app.test_request_context():
+            response = download_zip(combined)
+            response.direct_passthrough = False
+            data = response.get_data()
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            csv = zf.read("mailchimp_upload_combined.csv").decode()
+        assert '"""SP"",""GB"""' in csv
+
+    def test_source_errors_are_listed(self, app):
+        """Sources that failed to process are named in source_errors.txt."""
+        import io
+        import zipfile
+        import pandas as pd
+        from main import download_zip
+
+        combined = pd.DataFrame({
+            "Name": ["A B"], "Fname": ["A"], "Lname": ["B"], "Email1": ["a@test.com"],
+            "Organisation": ["Co"], "Country": ["GB"], "Tags": [("SP",)],
+        })
+        combined.attrs["source_errors"] = {"SP US_AGENTS": "bad file"}
+        with app.test_request_context():
+            response = download_zip(combined)
+            response.direct_passthrough = False
+            data = response.get_data()
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.read("source_errors.txt").decode() == "SP US_AGENTS: bad file\n"
+
+    def test_parquet_and_compression_options(self, client):
+        """The form's Parquet and compression choices reach the zip."""
+        import io
+        import zipfile
+
+        website = b"Fname,Lname,Email1,Organisation,Country\nA,B,a@x.com,Org,GB\n"
+        response = client.post("/process", data={
+            "action": "generate_zip",
+            "upload_date_label": "Nov 2025",
+            "include_parquet": "1",
+            "zip_compression": "stored",
+            "website_list": (io.BytesIO(website), "website.csv"),
+        }, content_type="multipart/form-data")
+        assert response.status_code == 200
+
+        with zipfile.ZipFile(io.BytesIO(response.get_data())) as zf:
+            assert zf.namelist() == ["mailchimp_upload_combined.csv", "mailchimp_upload_combined.parquet"]
+            assert {info.compress_type for info in zf.infolist()} == {zipfile.ZIP_STORED}
+
+    def test_unknown_compression(self, client):
+        """An unknown compression choice is refused before anything is processed."""
+        import io
+
+        response = client.post("/process", data={
+            "action": "generate_zip",
+            "upload_date_label": "Nov 2025",
+            "zip_compression": "zstd",
+            "website_list": (io.BytesIO(b"Email1\na@x.com\n"), "website.csv"),
+        }, content_type="multipart/form-data")
+        assert response.status_code == 400
+
+    def test_large_csv_is_streamed(self, client, monkeypatch):
+        """A CSV over FOXTROT_STREAM_BYTES is processed in chunks as the zip is sent."""
+        import io
+        import zipfile
+
+        monkeypatch.setenv("FOXTROT_STREAM_BYTES", "10")
+        monkeypatch.setenv("FOXTROT_CSV_CHUNK_ROWS", "1")
+        website = b"Fname,Lname,Email1,Organisation,Country\nA,B,a@x.com,Org,GB\nC,D,c@x.com,Org,FR\n"
+        with patch("main.generate_combined_dataframe") as mock_combine:
+            response = client.post("/process", data={
+                "action": "generate_zip",
+                "upload_date_label": "Nov 2025",
+                "website_list": (io.BytesIO(website), "website.csv"),
+            }, content_type="multipart/form-data")
+        assert response.status_code == 200
+        mock_combine.assert_not_called()
+
+        with zipfile.ZipFile(io.BytesIO(response.get_data())) as zf:
+            csv = zf.read("mailchimp_upload_combined.csv").decode()
+        assert csv.splitlines()[1:] == [
+            '"A B","A","B","a@x.com","Org","GB","""Website"",""Nov 2025"",""Direct client or prospect"",""GB"""',
+            '"C D","C","D","c@x.com","Org","FR","""Website"",""Nov 2025"",""Direct client or prospect"",""FR"""',
+        ]
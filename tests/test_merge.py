@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+from processors.merge import merge_duplicates, source_priority
+
+
+def _combined():
+    df = pd.DataFrame({
+        "Name": ["Ann Lee", "Bob Ray", "Annie Lee", "", "x"],
+        "Fname": ["Ann", "Bob", "Annie", "", "x"],
+        "Lname": ["Lee", "Ray", "Lee", "", ""],
+        "Email1": ["ann@x.com", "bob@x.com", " ANN@x.com", "ann@x.com", "not-an-email"],
+        "Organisation": ["EQ Org", "", np.nan, "Web Org", ""],
+        "Country": ["GB", "US", "", "", ""],
+        "Tags": [("EQ", "GB"), ("SP", "US"), ("SP", "GB"), ("Website",), ("Website",)],
+    })
+    df.attrs["source_rows"] = {"EQ": (0, 1), "SP UK_DIRECT": (1, 3), "Website": (3, 5)}
+    return df
+
+
+class TestMergeDuplicates:
+    """Tests for merge_duplicates() function."""
+
+    def test_default_priority_prefers_later_sources(self):
+        """One row per email at its first position, later sources winning each field they fill."""
+        merged = merge_duplicates(_combined())
+        assert merged["Email1"].tolist() == ["ann@x.com", "bob@x.com", "not-an-email"]
+        ann = merged.iloc[0]
+        # Website has no name, so the name comes from SP as a whole
+        assert (ann["Name"], ann["Fname"], ann["Lname"]) == ("Annie Lee", "Annie", "Lee")
+        assert ann["Organisation"] == "Web Org"
+        assert ann["Country"] == "GB"
+        assert ann["Tags"] == ("EQ", "GB", "SP", "Website")
+
+    def test_configured_priority(self):
+        """A source listed first wins its fields."""
+        merged = merge_duplicates(_combined(), priority=("EQ", "Website", "SP UK_DIRECT"))
+        ann = merged.iloc[0]
+        assert (ann["Name"], ann["Organisation"], ann["Country"]) == ("Ann Lee", "EQ Org", "GB")
+
+    def test_reports_calls_saved(self):
+        """Each folded row saves its member call and its tags call."""
+        merged = merge_duplicates(_combined())
+        assert merged.attrs["duplicates_merged"] == 2
+        assert merged.attrs["api_calls_saved"] == 4
+        assert "source_rows" not in merged.attrs
+
+    def test_no_duplicates_is_unchanged(self):
+        """Without duplicates the frame is returned as it was."""
+        df = _combined().iloc[[0, 1, 4]].reset_index(drop=True)
+        merged = merge_duplicates(df)
+        pd.testing.assert_frame_equal(merged, df)
+        assert merged.attrs["duplicates_merged"] == 0
+
+
+class TestSourcePriority:
+    """Tests for source_priority() function."""
+
+    def test_configured_sources_come_first(self, monkeypatch):
+        """Listed sources lead, the rest follow in default order."""
+        monkeypatch.setenv("FOXTROT_SOURCE_PRIORITY", "EQ, SP UK_DIRECT")
+        priority = source_priority()
+        assert priority[:3] == ("EQ", "SP UK_DIRECT", "Website")
+        assert len(priority) == 7
+
+    def test_unknown_source(self, monkeypatch):
+        """A typo in the setting is a configuration error."""
+        monkeypatch.setenv("FOXTROT_SOURCE_PRIORITY", "EQQ")
+        with pytest.raises(ValueError, match="EQQ"):
+            source_priority()
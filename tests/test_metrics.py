@@ -0,0 +1,89 @@
+import pickle
+import pandas as pd
+import pytest
+import metrics
+from metrics import Counter, Histogram, Registry, capture
+from processors.pipeline import generate_combined_dataframe
+from uploader.common import new_results, prepare_contacts
+
+REQUESTS = Counter("test_requests_total", "Requests seen in tests", ["route"])
+LATENCY = Histogram("test_latency_seconds", "Latency seen in tests", ["route"], buckets=(0.1, 1.0))
+
+
+def _website_csv(*emails):
+    from processors.pipeline import UploadedFile
+    rows = "".join(f"{e},F,L,F L,Co,GB\n" for e in emails)
+    return UploadedFile(f"Email1,Fname,Lname,Name,Organisation,Country\n{rows}".encode(), "website.csv")
+
+
+class TestRegistry:
+    """Tests for counters, histograms and the text format."""
+
+    def test_render_counter_and_histogram(self):
+        """Histogram buckets are cumulative and end with +Inf, sum and count."""
+        with capture(propagate=False) as recorded:
+            REQUESTS.inc(route="/process")
+            REQUESTS.inc(2, route="/process")
+            LATENCY.observe(0.05, route="/process")
+            LATENCY.observe(0.5, route="/process")
+            LATENCY.observe(5, route="/process")
+        text = recorded.render()
+        assert 'test_requests_total{route="/process"} 3' in text
+        assert 'test_latency_seconds_bucket{route="/process",le="0.1"} 1' in text
+        assert 'test_latency_seconds_bucket{route="/process",le="1.0"} 2' in text
+        assert 'test_latency_seconds_bucket{route="/process",le="+Inf"} 3' in text
+        assert 'test_latency_seconds_count{route="/process"} 3' in text
+        assert "# TYPE test_latency_seconds histogram" in text
+
+    def test_label_values_are_escaped(self):
+        """Quotes, backslashes and newlines in label values are escaped."""
+        with capture(propagate=False) as recorded:
+            REQUESTS.inc(route='a"b\\c\nd')
+        assert 'test_requests_total{route="a\\"b\\\\c\\nd"} 1' in recorded.render()
+
+    def test_wrong_labels_raise(self):
+        """Recording with labels the metric was not declared with is an error."""
+        with pytest.raises(ValueError):
+            REQUESTS.inc(path="/")
+
+    def test_capture_propagates_to_outer(self):
+        """A nested capture adds its values to the enclosing one on exit."""
+        with capture(propagate=False) as outer:
+            with capture() as inner:
+                REQUESTS.inc(route="/jobs")
+            with capture(propagate=False):
+                REQUESTS.inc(route="/jobs")
+        assert inner.value("test_requests_total", route="/jobs") == 1
+        assert outer.value("test_requests_total", route="/jobs") == 1
+
+    def test_survives_pickling(self):
+        """A worker's registry can be sent back to the parent and merged."""
+        with capture(propagate=False) as recorded:
+            LATENCY.observe(0.2, route="/process")
+        merged = Registry()
+        merged.merge(pickle.loads(pickle.dumps(recorded)))
+        merged.merge(recorded)
+        assert merged.value("test_latency_seconds", route="/process") == 2
+
+
+class TestInstrumentation:
+    """The pipeline and uploader record what the results page summarises."""
+
+    def test_processing_is_recorded_per_source(self):
+        """Rows, bytes and time are recorded for each processed source."""
+        upload = _website_csv("a@x.com", "b@x.com")
+        with capture(propagate=False) as recorded:
+            generate_combined_dataframe(None, None, None, None, None, None, None, upload, "Nov 2025", workers=1)
+        summary = metrics.summary(recorded)
+        assert summary["sources"][0]["source"] == "Website"
+        assert summary["sources"][0]["rows"] == 2
+        assert summary["sources"][0]["bytes"] == len(upload.getvalue())
+        assert recorded.value("foxtrot_read_seconds", format="csv") == 1
+
+    def test_failures_are_counted_by_reason(self):
+        """Invalid emails are counted under a short reason, not the full message."""
+        combined = pd.DataFrame({"Email1": ["no-at-sign", "a@x.com"], "Fname": ["A", "B"], "Lname": ["", ""],
+                                 "Organisation": ["", ""], "Country": ["", ""], "Tags": [(), ()]})
+        with capture(propagate=False) as recorded:
+            prepare_contacts(combined, new_results())
+        assert metrics.summary(recorded)["failures"] == {"invalid_email": 1}
@@ -0,0 +1,155 @@
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from processors.pipeline import UploadedFile, generate_combined_dataframe, iter_contact_batches, should_stream
+
+
+def _contacts(email, tag):
+    return pd.DataFrame({
+        "Name": ["A B"], "Fname": ["A"], "Lname": ["B"], "Email1": [email],
+        "Organisation": [""], "Country": ["GB"], "Tags": [(tag,)],
+    })
+
+
+def _row_agents_csv(email):
+    return UploadedFile(
+        f"First Name,Last Name,Contact Email Address,Organisation,Country,Technical Tags\nA,B,{email},Org,FR,Patents\n".encode(),
+        "row_agents.csv",
+    )
+
+
+def _website_csv(email):
+    return UploadedFile(f"Fname,Lname,Email1,Organisation,Country\nA,B,{email},Org,GB\n".encode(), "website.csv")
+
+
+def _eq_csv(*rows):
+    lines = ["Name,Email1,Organisation,Postcode,Country"] + [",".join(row) for row in rows]
+    return UploadedFile(("\n".join(lines) + "\n").encode(), "eq.csv")
+
+
+class TestGenerateCombinedDataframe:
+    """Tests for generate_combined_dataframe() function."""
+
+    @patch("processors.pipeline.process_website_files")
+    @patch("processors.pipeline.process_sp_files")
+    def test_failed_source_keeps_the_others(self, mock_sp, mock_website):
+        """A failing source is reported and the rest are combined in source order."""
+        def sp(uploaded_file, upload_date_label, list_type):
+            if list_type == "UK_REFERRERS":
+                raise KeyError("Contact Email Address")
+            return _contacts(f"{list_type}@x.com", list_type)
+
+        mock_sp.side_effect = sp
+        mock_website.return_value = _contacts("web@x.com", "WEB")
+
+        combined = generate_combined_dataframe(
+            None, None, "uk.xlsx", "ref.xlsx", "us.xlsx", None, None, "web.csv", "Nov 2025", workers=1,
+        )
+        assert combined["Email1"].tolist() == ["UK_DIRECT@x.com", "US_DIRECT@x.com", "web@x.com"]
+        assert combined.attrs["source_errors"] == {"SP UK_REFERRERS": "'Contact Email Address'"}
+        assert combined.attrs["source_rows"] == {"SP UK_DIRECT": (0, 1), "SP US_DIRECT": (1, 2), "Website": (2, 3)}
+
+    @patch("processors.pipeline.process_website_files", side_effect=ValueError("bad file"))
+    def test_all_sources_failing_raises(self, mock_website):
+        """With nothing to combine, the errors are raised."""
+        with pytest.raises(ValueError, match="Website: bad file"):
+            generate_combined_dataframe(None, None, None, None, None, None, None, "web.csv", "Nov 2025", workers=1)
+
+    def test_nothing_uploaded(self):
+        """No files gives None, as before."""
+        assert generate_combined_dataframe(None, None, None, None, None, None, None, None, "Nov 2025") is None
+
+    def test_process_pool_matches_inline(self):
+        """Worker processes give the same frame, in the same order, as in-line processing."""
+        files = [None, None, None, None, None, None, _row_agents_csv("row@x.com"), _website_csv("web@x.com")]
+        inline = generate_combined_dataframe(*files, "Nov 2025", workers=1)
+        for f in files[-2:]:
+            f.seek(0)
+        pooled = generate_combined_dataframe(*files, "Nov 2025", workers=2)
+        pd.testing.assert_frame_equal(pooled, inline)
+        assert pooled["Email1"].tolist() == ["row@x.com", "web@x.com"]
+        assert pooled.attrs["source_errors"] == {}
+
+    def test_eq_churn_is_counted(self):
+        """Contacts removed from or changed in EQ are counted per source; only new ones are combined."""
+        start = _eq_csv(("Ann Lee", "ann@x.com", "Co", "", "GB"), ("Bob Ray", "bob@x.com", "Co", "", "GB"))
+        end = _eq_csv(("Ann Lee", "ann@x.com", "New Co", "", "GB"), ("Dan Fox", "dan@x.com", "Co", "", "US"))
+        combined = generate_combined_dataframe(start, end, None, None, None, None, None, None, "Nov 2025", workers=1)
+        assert combined["Email1"].tolist() == ["dan@x.com"]
+        assert combined.attrs["churn"] == {"EQ": {"removed": 1, "changed": 1}}
+
+    @patch("processors.pipeline.process_website_files")
+    def test_cached_source_is_not_reprocessed(self, mock_website, tmp_path, monkeypatch):
+        """A second run with the same upload is served from the parse cache."""
+        monkeypatch.setenv("FOXTROT_CACHE_DIR", str(tmp_path))
+        mock_website.return_value = _contacts("web@x.com", "WEB")
+
+        first = generate_combined_dataframe(None, None, None, None, None, None, None,
+                                            _website_csv("web@x.com"), "Nov 2025", workers=1)
+        second = generate_combined_dataframe(None, None, None, None, None, None, None,
+                                             _website_csv("web@x.com"), "Nov 2025", workers=1)
+        assert mock_website.call_count == 1
+        assert second["Tags"].tolist() == first["Tags"].tolist() == [("WEB",)]
+
+
+class TestIterContactBatches:
+    """Tests for iter_contact_batches() function."""
+
+    def test_batches_match_combined_frame(self):
+        """Concatenated batches hold the same contacts, in the same order, as the combined frame."""
+        website = UploadedFile(
+            b"Fname,Lname,Email1,Organisation,Country\n"
+            + b"".join(f"A,B,web{i}@x.com,Org,gb\n".encode() for i in range(5)),
+            "website.csv",
+        )
+        files = [None, None, None, None, None, None, _row_agents_csv("row@x.com"), website]
+        batches = list(iter_contact_batches(*files, "Nov 2025", chunk_rows=2))
+        assert [(label, len(batch)) for label, batch in batches] == [
+            ("ROW agents", 1), ("Website", 2), ("Website", 2), ("Website", 1),
+        ]
+
+        for f in files[-2:]:
+            f.seek(0)
+        combined = generate_combined_dataframe(*files, "Nov 2025", workers=1)
+        streamed = pd.concat([batch for _, batch in batches], ignore_index=True)
+        pd.testing.assert_frame_equal(streamed, combined, check_dtype=False)
+
+    def test_numeric_looking_text_matches(self):
+        """A CSV gives the same contacts whether it is read whole or streamed, numbers-as-text included."""
+        def website():
+            return UploadedFile(
+                b"Fname,Lname,Email1,Organisation,Country\nA,B,a@x.com,123,GB\nC,D,c@x.com,007,FR\n",
+                "website.csv",
+            )
+
+        files = [None] * 7
+        whole = generate_combined_dataframe(*files, website(), "Nov 2025", workers=1)
+        streamed = pd.concat([b for _, b in iter_contact_batches(*files, website(), "Nov 2025", chunk_rows=1)],
+                             ignore_index=True)
+        assert whole["Organisation"].tolist() == ["123", "007"]
+        pd.testing.assert_frame_equal(streamed, whole, check_dtype=False)
+
+    @patch("processors.pipeline.process_sp_files", side_effect=ValueError("bad file"))
+    def test_failed_source_is_recorded(self, mock_sp):
+        """A failing source is noted in source_errors and the others still stream."""
+        errors = {}
+        batches = list(iter_contact_batches(None, None, "uk.csv", None, None, None, None,
+                                            _website_csv("web@x.com"), "Nov 2025", source_errors=errors))
+        assert [label for label, _ in batches] == ["Website"]
+        assert errors == {"SP UK_DIRECT": "bad file"}
+
+    @patch("processors.pipeline.process_website_files", side_effect=ValueError("bad file"))
+    def test_all_sources_failing_raises(self, mock_website):
+        """With nothing produced, the errors are raised at the end."""
+        with pytest.raises(ValueError, match="Website: bad file"):
+            list(iter_contact_batches(None, None, None, None, None, None, None, "web.csv", "Nov 2025"))
+
+
+class TestShouldStream:
+    """Tests for should_stream() function."""
+
+    def test_only_large_csvs_stream(self, monkeypatch):
+        """Only a CSV over FOXTROT_STREAM_BYTES switches to streaming."""
+        monkeypatch.setenv("FOXTROT_STREAM_BYTES", "100")
+        assert not should_stream([None, UploadedFile(b"x" * 200, "big.xlsx"), _website_csv("a@x.com")])
+        assert should_stream([None, UploadedFile(b"x" * 200, "big.csv")])
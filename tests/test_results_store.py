@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from uploader import results_store
+from uploader.results_store import MemoryResults, ResultsStore, error_log_csv
+
+
+def _results(failures=5):
+    errors = [
+        {"email": f"user{i}@test.com", "reason": f"Mailchimp API error: {i}", "kind": "http_400" if i % 2 else "http_500"}
+        for i in range(failures)
+    ]
+    return {"total": 10, "successful": 10 - failures, "failed": failures, "errors": errors}
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    """A ResultsStore holding run r1, and the MemoryResults equivalent."""
+    if request.param == "memory":
+        yield MemoryResults("r1", _results())
+        return
+    store = ResultsStore(str(tmp_path / "sync.sqlite3"))
+    store.save("r1", _results())
+    yield store
+    store.close()
+
+
+class TestResultsStore:
+    """Tests for ResultsStore and MemoryResults."""
+
+    def test_summary_leaves_out_errors(self, store):
+        """The summary is the results without the failed contacts; unknown runs are None."""
+        assert store.summary("r1") == {"total": 10, "successful": 5, "failed": 5}
+        assert store.summary("nope") is None
+
+    def test_kinds_most_common_first(self, store):
+        """Failures are counted per kind."""
+        assert store.kinds("r1") == {"http_500": 3, "http_400": 2}
+
+    def test_pages_in_failure_order(self, store):
+        """Pages follow the order contacts failed in, optionally of one kind."""
+        assert [e["email"] for e in store.errors("r1", offset=1, limit=2)] == ["user1@test.com", "user2@test.com"]
+        assert [e["email"] for e in store.errors("r1", "http_400")] == ["user1@test.com", "user3@test.com"]
+        assert store.count("r1") == 5
+        assert store.count("r1", "http_500") == 3
+
+    def test_error_log_csv(self, store, monkeypatch):
+        """The CSV holds every failure of the kind asked for, in chunks."""
+        monkeypatch.setattr(results_store, "STREAM_ROWS", 1)
+        chunks = list(error_log_csv(store, "r1", "http_400"))
+        assert "".join(chunks).splitlines() == [
+            '"Email","Reason","Kind"',
+            '"user1@test.com","Mailchimp API error: 1","http_400"',
+            '"user3@test.com","Mailchimp API error: 3","http_400"',
+        ]
+        assert len(chunks) > 1
+
+    def test_saved_runs_survive_reopening(self, tmp_path):
+        """Results are still there from a new connection, and saving again replaces them."""
+        path = str(tmp_path / "sync.sqlite3")
+        first = ResultsStore(path)
+        first.save("r1", _results())
+        first.save("r1", _results(failures=1))
+        first.close()
+
+        second = ResultsStore(path)
+        assert second.count("r1") == 1
+        assert second.summary("r1")["failed"] == 1
+        second.close()
+
+    def test_old_runs_expire(self, tmp_path, monkeypatch):
+        """Runs older than KEEP_SECONDS are dropped when another is saved."""
+        store = ResultsStore(str(tmp_path / "sync.sqlite3"))
+        store.save("old", _results())
+        monkeypatch.setattr(time, "time", lambda: 10 ** 12)
+        store.save("new", _results())
+        assert store.summary("old") is None
+        assert store.count("old") == 0
+        assert store.count("new") == 5
+        store.close()
@@ -0,0 +1,81 @@
+import email.utils
+import time
+import pytest
+from mailchimp_marketing.api_client import ApiClientError
+from uploader import retry
+
+
+class TestParseRetryAfter:
+    """Tests for parse_retry_after() function."""
+
+    def test_seconds(self):
+        """A delay in seconds is read as is."""
+        assert retry.parse_retry_after("7") == 7.0
+
+    def test_http_date(self):
+        """An HTTP date becomes the seconds until then."""
+        value = email.utils.formatdate(time.time() + 30, usegmt=True)
+        assert 25 < retry.parse_retry_after(value) <= 30
+
+    def test_missing_or_unreadable(self):
+        """No header or a nonsense value gives None."""
+        assert retry.parse_retry_after(None) is None
+        assert retry.parse_retry_after("soon") is None
+
+
+class TestBackoffDelay:
+    """Tests for backoff_delay() function."""
+
+    def test_grows_within_bounds(self):
+        """Delays are jittered below the exponential bound."""
+        for attempt in range(4):
+            assert 0 <= retry.backoff_delay(attempt) <= retry.BASE_DELAY * 2 ** attempt
+
+    def test_never_shorter_than_retry_after(self):
+        """Retry-After is a floor on the delay."""
+        assert retry.backoff_delay(0, retry_after=5) >= 5
+
+
+class TestWithRetries:
+    """Tests for with_retries() function."""
+
+    def _flaky(self, *errors):
+        calls = []
+
+        def fn(value):
+            calls.append(value)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return value
+
+        return fn, calls
+
+    def test_transient_errors_are_retried(self):
+        """5xx and failed requests are retried until the call succeeds."""
+        fn, calls = self._flaky(ApiClientError("down", status_code=503), ApiClientError("reset"))
+        assert retry.with_retries(fn, "x", operation="test", sleep=lambda s: None) == "x"
+        assert len(calls) == 3
+
+    def test_client_errors_are_not_retried(self):
+        """A 400 is raised straight away."""
+        fn, calls = self._flaky(ApiClientError("bad", status_code=400))
+        with pytest.raises(ApiClientError):
+            retry.with_retries(fn, "x", operation="test", sleep=lambda s: None)
+        assert len(calls) == 1
+
+    def test_gives_up_after_max_retries(self):
+        """The last error is raised once the retries are used up."""
+        fn, calls = self._flaky(*[ApiClientError("down", status_code=500)] * (retry.MAX_RETRIES + 1))
+        with pytest.raises(ApiClientError):
+            retry.with_retries(fn, "x", operation="test", sleep=lambda s: None)
+        assert len(calls) == retry.MAX_RETRIES + 1
+
+    def test_throttling_is_reported_with_retry_after(self):
+        """A 429 calls on_throttle with its Retry-After and waits at least that long."""
+        throttled = ApiClientError("slow down", status_code=429)
+        throttled.retry_after = 3.0
+        fn, _ = self._flaky(throttled)
+        seen, slept = [], []
+        retry.with_retries(fn, "x", operation="test", on_throttle=seen.append, sleep=slept.append)
+        assert seen == [3.0]
+        assert slept[0] >= 3.0
@@ -0,0 +1,82 @@
+import os
+import pandas as pd
+from unittest.mock import MagicMock, patch
+from uploader.common import Contact
+from uploader.sync_state import SyncState, contact_fingerprint
+from uploader.upload import upload_contacts
+
+
+def _contact(email="a@test.com", company="Co", tags=("SP", "GB")):
+    return Contact(email, email.upper(), {"FNAME": "A", "COMPANY": company}, list(tags))
+
+
+def _combined():
+    return pd.DataFrame({
+        "Name": ["A One", "B Two"],
+        "Fname": ["A", "B"],
+        "Lname": ["One", "Two"],
+        "Email1": ["a@test.com", "b@test.com"],
+        "Organisation": ["Co", "Co"],
+        "Country": ["GB", "GB"],
+        "Tags": ['"SP","GB"', '"SP"'],
+    })
+
+
+class TestContactFingerprint:
+    """Tests for contact_fingerprint() function."""
+
+    def test_tag_order_does_not_matter(self):
+        """The same tag set in a different order has the same fingerprint."""
+        assert contact_fingerprint(_contact(tags=["SP", "GB"])) == contact_fingerprint(_contact(tags=["GB", "SP"]))
+
+    def test_merge_field_change_changes_fingerprint(self):
+        """A changed merge field gives a different fingerprint."""
+        assert contact_fingerprint(_contact(company="Co")) != contact_fingerprint(_contact(company="New Co"))
+
+
+class TestSyncState:
+    """Tests for SyncState."""
+
+    def test_unchanged_contacts(self, tmp_path):
+        """Only contacts matching what was last pushed count as unchanged."""
+        state = SyncState(str(tmp_path / "sync.sqlite3"))
+        state.record("list1", [_contact("a@test.com"), _contact("b@test.com")])
+
+        unchanged = state.unchanged("list1", [
+            _contact("a@test.com"),
+            _contact("b@test.com", company="New Co"),
+            _contact("c@test.com"),
+        ])
+        assert unchanged == {"A@TEST.COM"}
+
+    def test_state_is_per_audience(self, tmp_path):
+        """A contact synced to one audience is not unchanged for another."""
+        state = SyncState(str(tmp_path / "sync.sqlite3"))
+        state.record("list1", [_contact()])
+        assert state.unchanged("list2", [_contact()]) == set()
+
+    def test_forgotten_contacts_are_changed(self, tmp_path):
+        """After forget() a contact is sent again."""
+        state = SyncState(str(tmp_path / "sync.sqlite3"))
+        state.record("list1", [_contact("a@test.com"), _contact("b@test.com")])
+        state.forget("list1", {"A@TEST.COM"})
+        assert state.unchanged("list1", [_contact("a@test.com"), _contact("b@test.com")]) == {"B@TEST.COM"}
+
+class TestUploadContactsWithSyncState:
+    """Tests for upload_contacts() with a sync state."""
+
+    @patch.dict(os.environ, {"MAILCHIMP_RATE_LIMIT": "1000"})
+    def test_second_run_skips_everything(self, tmp_path):
+        """Re-uploading the same frame makes no API calls and reports the skips."""
+        state = SyncState(str(tmp_path / "sync.sqlite3"))
+        client = MagicMock()
+
+        first = upload_contacts(_combined(), client, "list1", sync_state=state)
+        calls = client.lists.set_list_member.call_count
+        second = upload_contacts(_combined(), client, "list1", sync_state=state)
+
+        assert first["successful"] == 2
+        assert first["skipped"] == 0
+        assert second["skipped"] == 2
+        assert second["successful"] == 0
+        assert client.lists.set_list_member.call_count == calls
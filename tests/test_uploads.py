@@ -0,0 +1,87 @@
+import io
+import os
+import pickle
+import pytest
+from processors.ingest import iter_table, read_table
+from processors.uploads import (
+    SpooledUpload, UploadTooLarge, UploadedFile, close_uploads, spool_upload, spool_uploads,
+)
+
+
+class Upload(io.BytesIO):
+    """Stands in for a werkzeug FileStorage"""
+
+    def __init__(self, data, filename):
+        super().__init__(data)
+        self.filename = filename
+
+
+def _csv(rows):
+    return b"Email1,Country\n" + b"".join(f"user{i}@x.com,GB\n".encode() for i in range(rows))
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    """Temporary files go to a directory the test can list."""
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    return tmp_path
+
+
+class TestSpoolUpload:
+    """Tests for spool_upload() function."""
+
+    def test_small_upload_stays_in_memory(self, spool_dir):
+        """Uploads under the memory threshold are copied into memory."""
+        spooled = spool_upload(Upload(b"Email1\na@x.com\n", "website.csv"))
+        assert isinstance(spooled, UploadedFile)
+        assert spooled.read() == b"Email1\na@x.com\n"
+        assert os.listdir(spool_dir) == []
+
+    def test_large_upload_goes_to_disk(self, spool_dir):
+        """Bigger uploads are spooled to a file the readers open by path, removed on close."""
+        data = _csv(100)
+        spooled = spool_upload(Upload(data, "website.csv"), memory_bytes=64)
+        assert isinstance(spooled, SpooledUpload)
+        assert spooled.filename == "website.csv"
+        assert spooled.path.endswith(".csv")
+        with open(spooled, "rb") as f:
+            assert f.read() == data
+
+        assert len(read_table(spooled, {"Email1": ["Email1"]})) == 100
+        assert [len(chunk) for chunk in iter_table(spooled, chunk_rows=40)] == [40, 40, 20]
+        spooled.close()
+        assert os.listdir(spool_dir) == []
+
+    def test_pickles_as_a_path(self, spool_dir):
+        """A worker process gets the path, not the bytes."""
+        spooled = spool_upload(Upload(_csv(100), "website.csv"), memory_bytes=64)
+        copy = pickle.loads(pickle.dumps(spooled))
+        assert (copy.path, copy.filename) == (spooled.path, "website.csv")
+        spooled.close()
+
+    @pytest.mark.parametrize("memory_bytes", [64, 1024 * 1024])
+    def test_over_the_limit(self, spool_dir, memory_bytes):
+        """A file over the per-file limit is refused and nothing is left on disk."""
+        with pytest.raises(UploadTooLarge, match="website.csv is larger than"):
+            spool_upload(Upload(_csv(100), "website.csv"), max_bytes=500, memory_bytes=memory_bytes)
+        assert os.listdir(spool_dir) == []
+
+
+class TestSpoolUploads:
+    """Tests for spool_uploads() and close_uploads()."""
+
+    def test_failure_removes_earlier_copies(self, spool_dir, monkeypatch):
+        """When one file is refused the ones already spooled are removed."""
+        monkeypatch.setattr("processors.uploads.SPOOL_MEMORY_BYTES", 64)
+        small, big = Upload(_csv(10), "uk.csv"), Upload(_csv(100), "website.csv")
+        with pytest.raises(UploadTooLarge):
+            spool_uploads([None, small, big], max_bytes=1000)
+        assert small.tell() > 64  # uk.csv was spooled to disk before website.csv was refused
+        assert os.listdir(spool_dir) == []
+
+    def test_none_is_kept(self):
+        """Fields without an upload stay None and are skipped on close."""
+        spooled = spool_uploads([None, Upload(b"a\n", "x.csv")])
+        assert spooled[0] is None
+        close_uploads(spooled)
+        assert spooled[1].closed
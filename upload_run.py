@@ -0,0 +1,71 @@
+"""Process a set of source files and upload the contacts to Mailchimp.
+
+The stages of an upload run (process, merge, validate, plan, upload) shared by
+the /process background job and the command-line runner in cli.py. Nothing
+here imports Flask.
+"""
+
+from mailchimp_marketing.api_client import ApiClientError
+
+import metrics
+from processors.emails import prepare_emails
+from processors.merge import merge_duplicates
+from processors.pipeline import generate_combined_dataframe
+from uploader.audience import open_audience_snapshot
+from uploader.checkpoint import open_checkpoint
+from uploader.sync_state import open_sync_state
+from uploader.upload import upload_contacts
+
+
+def process_and_upload(job, files, upload_date_label, list_id, mode, priority, clients, workers: int = None):
+    """Build the combined frame from files and upload it to list_id, reporting progress on job.
+
+    clients is the uploader.client.MailchimpClients to call the API through.
+    Returns the results dict upload_results.html renders, with the run's
+    metrics under "metrics".
+    """
+    with metrics.capture() as run_metrics:
+        job.set_stage("processing")
+        with metrics.STAGE_SECONDS.time(stage="process"):
+            combined = generate_combined_dataframe(*files, upload_date_label, workers=workers)
+        if combined is None:
+            raise ValueError("No complete set of input files was uploaded")
+        with metrics.STAGE_SECONDS.time(stage="merge"):
+            combined = merge_duplicates(combined, priority)
+        # Bad addresses are set aside before any request is made
+        with metrics.STAGE_SECONDS.time(stage="validate"):
+            combined, rejected = prepare_emails(combined)
+        job.downloads["rejected.csv"] = rejected
+
+        client = clients.client()
+        sync_state = open_sync_state()
+        checkpoint = open_checkpoint()
+        audience = open_audience_snapshot()
+        connections_before = clients.stats()
+        try:
+            if audience is not None:
+                job.set_stage("planning")
+                with metrics.STAGE_SECONDS.time(stage="plan"):
+                    audience.refresh(client, list_id)
+
+            job.set_stage("uploading", rows_total=len(combined) + len(rejected))
+            with metrics.STAGE_SECONDS.time(stage="upload"):
+                results = upload_contacts(combined, client, list_id, mode=mode, progress=job.advance,
+                                          sync_state=sync_state, checkpoint=checkpoint, audience=audience,
+                                          rejected=rejected)
+        except ApiClientError as e:
+            raise RuntimeError(f"Mailchimp API error: {e.text}")
+        finally:
+            for store in (sync_state, checkpoint, audience):
+                if store is not None:
+                    store.close()
+
+    results["rejected"] = len(rejected)
+    results["source_errors"] = combined.attrs.get("source_errors", {})
+    results["duplicates_merged"] = combined.attrs["duplicates_merged"]
+    results["api_calls_saved"] = combined.attrs["api_calls_saved"]
+    results["churn"] = combined.attrs.get("churn", {})
+    results["metrics"] = metrics.summary(run_metrics)
+    # Approximate when jobs overlap, since the connection pool is shared
+    results["metrics"]["connections"] = clients.stats(since=connections_before)
+    return results
@@ -0,0 +1,149 @@
+"""Plan the smallest set of writes against what is already in the audience.
+
+Before uploading we page through the audience with lists.get_list_members_info
+(1000 members a call, only the fields we compare) into a local SQLite
+snapshot keyed by subscriber hash. Each contact is then checked against it:
+
+- members who unsubscribed or were cleaned are left alone
+- new members, and members whose merge fields differ, get the upsert
+- tag calls carry only the tags the member does not have yet
+- members that already match cost no calls at all
+"""
+
+import functools
+import json
+import os
+import time
+
+from . import retry
+from .database import DEFAULT_PATH, connect, lookup
+
+PAGE_SIZE = 1000
+MEMBER_FIELDS = [
+    "members.id",
+    "members.status",
+    "members.merge_fields",
+    "members.tags",
+    "total_items",
+]
+
+# Statuses we must not resubscribe or write to
+LEFT_ALONE = frozenset({"unsubscribed", "cleaned"})
+
+
+class AudienceSnapshot:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._conn = connect(path)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS audience_members (
+                    list_id TEXT NOT NULL,
+                    subscriber_hash TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    merge_fields TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    PRIMARY KEY (list_id, subscriber_hash)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS audience_snapshots (
+                    list_id TEXT PRIMARY KEY,
+                    members INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL
+                )"""
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def refresh(self, client, list_id: str, page_size: int = PAGE_SIZE) -> int:
+        """Replace the snapshot of list_id with the audience as it is now; returns the member count"""
+        rows = []
+        offset = 0
+        while True:
+            fetch_page = functools.partial(client.lists.get_list_members_info, list_id,
+                                           fields=MEMBER_FIELDS, count=page_size, offset=offset)
+            page = retry.with_retries(fetch_page, operation="get_list_members_info")
+            members = page.get("members", [])
+            for member in members:
+                rows.append((
+                    list_id,
+                    member["id"],
+                    member.get("status", ""),
+                    json.dumps(member.get("merge_fields") or {}),
+                    json.dumps([tag["name"] for tag in member.get("tags") or []]),
+                ))
+            offset += len(members)
+            if not members or offset >= page.get("total_items", 0):
+                break
+
+        with self._conn:
+            self._conn.execute("DELETE FROM audience_members WHERE list_id = ?", (list_id,))
+            self._conn.executemany("INSERT OR REPLACE INTO audience_members VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO audience_snapshots VALUES (?, ?, ?)",
+                               (list_id, len(rows), time.time()))
+        return len(rows)
+
+    def _members(self, list_id: str, hashes: list) -> dict:
+        rows = lookup(
+            self._conn,
+            "SELECT subscriber_hash, status, merge_fields, tags FROM audience_members "
+            "WHERE list_id = ? AND subscriber_hash IN ({placeholders})",
+            list_id, hashes,
+        )
+        return {
+            subscriber_hash: (status, json.loads(merge_fields), json.loads(tags))
+            for subscriber_hash, status, merge_fields, tags in rows
+        }
+
+    def plan(self, list_id: str, contacts: list) -> tuple:
+        """Return (contacts to send, number left alone because of their status, number already up to date).
+
+        A contact to send has upsert=False when only its tags need adding, and
+        its tags cut down to the ones the member does not have.
+        """
+        existing = self._members(list_id, [c.subscriber_hash for c in contacts])
+        to_send = []
+        left_alone = up_to_date = 0
+        for contact in contacts:
+            outcome, planned = _compare(contact, existing.get(contact.subscriber_hash))
+            if outcome == "send":
+                to_send.append(planned)
+            elif outcome == "left_alone":
+                left_alone += 1
+            else:
+                up_to_date += 1
+        return to_send, left_alone, up_to_date
+
+    def up_to_date(self, list_id: str, contacts: list) -> set:
+        """Subscriber hashes of the contacts that are in the audience and already match it"""
+        existing = self._members(list_id, [c.subscriber_hash for c in contacts])
+        return {
+            c.subscriber_hash for c in contacts
+            if _compare(c, existing.get(c.subscriber_hash))[0] == "up_to_date"
+        }
+
+
+def _compare(contact, member) -> tuple:
+    """("send", contact cut down to what is needed), ("left_alone", None) or ("up_to_date", None)"""
+    if member is None:
+        return "send", contact
+
+    status, merge_fields, tags = member
+    if status in LEFT_ALONE:
+        return "left_alone", None
+
+    changed = any(str(merge_fields.get(k, "")) != str(v) for k, v in contact.merge_fields.items())
+    have = {t.casefold() for t in tags}
+    missing = [t for t in contact.tags if t.casefold() not in have]
+    if changed or missing:
+        return "send", contact._replace(tags=missing, upsert=changed)
+    return "up_to_date", None
+
+def open_audience_snapshot():
+    """AudienceSnapshot in the FOXTROT_SYNC_DB database, or None when that is set to an empty string"""
+    path = os.environ.get("FOXTROT_SYNC_DB", DEFAULT_PATH)
+    if not path:
+        return None
+    return AudienceSnapshot(path)
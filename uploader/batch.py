@@ -0,0 +1,184 @@
+"""Bulk upserts through the Mailchimp Batch Operations API.
+
+Instead of two blocking calls per contact we pack the member upserts into
+/batches submissions, wait for Mailchimp to work through them and then read
+the gzipped per-operation results back. Tag updates go in a second round,
+only for members whose upsert succeeded, because Mailchimp does not promise
+to run the operations of a batch in order.
+https://mailchimp.com/developer/marketing/guides/run-async-requests-batch-endpoint/
+"""
+
+import io
+import json
+import tarfile
+import time
+import urllib.request
+
+import metrics
+from . import retry
+from .common import member_body, record_failure, tags_body
+
+# Operations per /batches submission
+BATCH_SIZE = 500
+POLL_INTERVAL = 2.0
+# Seconds; operations of batches still unfinished this long after the upload
+# started are failed with kind "batch_timeout" rather than waited on forever
+BATCH_TIMEOUT = 2 * 60 * 60
+# Seconds to wait on the response_body_url download
+FETCH_TIMEOUT = 120
+
+# Outcome of an operation whose batch had not finished by the deadline
+_TIMED_OUT = (None, None)
+
+
+def _fetch_results(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+        return response.read()
+
+
+def parse_batch_results(archive: bytes) -> dict:
+    """Read a response_body_url archive into {operation_id: (status_code, body)}"""
+    outcomes = {}
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith(".json"):
+                continue
+            for op in json.load(tar.extractfile(member)):
+                try:
+                    body = json.loads(op.get("response") or "null")
+                except ValueError:
+                    body = op.get("response")
+                outcomes[op["operation_id"]] = (int(op["status_code"]), body)
+    return outcomes
+
+
+def _run_round(client, operations, poll_interval, fetch, deadline, progress=None) -> dict:
+    """Submit operations in chunks, wait for every batch and merge their outcomes.
+
+    Operations of batches not finished by deadline (a time.monotonic() value)
+    get the _TIMED_OUT outcome.
+    """
+    batch_ids = []
+    batch_ops = {}
+    for start in range(0, len(operations), BATCH_SIZE):
+        chunk = operations[start:start + BATCH_SIZE]
+        batch = retry.with_retries(client.batches.start, {"operations": chunk}, operation="batches.start")
+        batch_ids.append(batch["id"])
+        batch_ops[batch["id"]] = chunk
+
+    outcomes = {}
+    pending = list(batch_ids)
+    while pending:
+        still_pending = []
+        for batch_id in pending:
+            status = retry.with_retries(client.batches.status, batch_id, operation="batches.status")
+            if status["status"] != "finished":
+                still_pending.append(batch_id)
+                continue
+            if status.get("response_body_url"):
+                with metrics.API_SECONDS.time(operation="batch_results"):
+                    archive = fetch(status["response_body_url"])
+                outcomes.update(parse_batch_results(archive))
+            if progress:
+                progress(len(batch_ops[batch_id]))
+        pending = still_pending
+        if pending and time.monotonic() >= deadline:
+            for batch_id in pending:
+                outcomes.update((op["operation_id"], _TIMED_OUT) for op in batch_ops[batch_id])
+                if progress:
+                    progress(len(batch_ops[batch_id]))
+            break
+        if pending:
+            time.sleep(poll_interval)
+    return outcomes
+
+
+def _transient(outcome) -> bool:
+    return outcome is not None and outcome[0] in retry.TRANSIENT_STATUSES
+
+
+def _run_operations(client, operations, poll_interval, fetch, deadline, progress=None) -> dict:
+    """_run_round, resubmitting operations that were throttled or hit a server error.
+
+    Each resubmission waits a jittered backoff first, and an operation is tried
+    at most retry.MAX_RETRIES more times, or until the deadline, before its
+    last outcome stands.
+    """
+    outcomes = _run_round(client, operations, poll_interval, fetch, deadline, progress)
+    for attempt in range(retry.MAX_RETRIES):
+        again = [op for op in operations if _transient(outcomes.get(op["operation_id"]))]
+        if not again or time.monotonic() >= deadline:
+            break
+        metrics.API_RETRIES.inc(len(again), operation="batch_operation")
+        time.sleep(retry.backoff_delay(attempt))
+        outcomes.update(_run_round(client, again, poll_interval, fetch, deadline))
+    return outcomes
+
+
+def _failure(outcome) -> tuple:
+    """(reason, kind) for record_failure"""
+    if outcome is _TIMED_OUT:
+        return "Mailchimp batch did not finish in time", "batch_timeout"
+    if outcome is None:
+        return "Mailchimp API error: no result returned for operation", "no_result"
+    return f"Mailchimp API error: {outcome[1]}", f"http_{outcome[0]}"
+
+
+def _ok(outcome) -> bool:
+    return outcome is not None and outcome is not _TIMED_OUT and 200 <= outcome[0] < 300
+
+
+def upload_contacts_batch(client, list_id: str, contacts: list, results: dict,
+                          poll_interval: float = POLL_INTERVAL, fetch=_fetch_results, progress=None,
+                          on_success=None, timeout: float = BATCH_TIMEOUT) -> dict:
+    """Upsert contacts and apply their tags using /batches.
+
+    progress, if given, is called with the number of contacts whose upsert batch
+    finished and on_success with each contact that was uploaded. Contacts with
+    upsert=False only get their tags. Operations still pending timeout seconds
+    after the start are recorded as failures.
+    """
+    deadline = time.monotonic() + timeout
+    member_ops = [
+        {
+            "method": "PUT",
+            "path": f"/lists/{list_id}/members/{contact.subscriber_hash}",
+            "operation_id": str(i),
+            "body": json.dumps(member_body(contact)),
+        }
+        for i, contact in enumerate(contacts)
+        if contact.upsert
+    ]
+    member_outcomes = _run_operations(client, member_ops, poll_interval, fetch, deadline, progress)
+    if progress and len(member_ops) < len(contacts):
+        progress(len(contacts) - len(member_ops))
+
+    tag_ops = []
+    for i, contact in enumerate(contacts):
+        outcome = member_outcomes.get(str(i)) if contact.upsert else (200, None)
+        if not _ok(outcome):
+            record_failure(results, contact.email, *_failure(outcome))
+        elif contact.tags:
+            tag_ops.append({
+                "method": "POST",
+                "path": f"/lists/{list_id}/members/{contact.subscriber_hash}/tags",
+                "operation_id": str(i),
+                "body": json.dumps(tags_body(contact)),
+            })
+        else:
+            results["successful"] += 1
+            if on_success:
+                on_success(contact)
+
+    tag_outcomes = _run_operations(client, tag_ops, poll_interval, fetch, deadline) if tag_ops else {}
+    for op in tag_ops:
+        contact = contacts[int(op["operation_id"])]
+        outcome = tag_outcomes.get(op["operation_id"])
+        if _ok(outcome):
+            results["successful"] += 1
+            if on_success:
+                on_success(contact)
+        else:
+            record_failure(results, contact.email, *_failure(outcome))
+
+    return results
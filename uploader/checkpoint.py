@@ -0,0 +1,85 @@
+"""Durable record of the contacts an upload has finished, so a re-run resumes.
+
+If the worker dies part way through a month's upload, the contacts it already
+pushed are listed here. Submitting the same files again gives the same run
+key (it is derived from the audience and the contacts being sent), and those
+contacts are skipped. A run that reaches the end clears its rows; from then on
+the sync state (sync_state.py) is what skips unchanged contacts.
+"""
+
+import hashlib
+import os
+import time
+
+from .database import DEFAULT_PATH, connect, lookup
+from .sync_state import contact_fingerprint
+
+# Finished contacts are written in groups of this many, or after FLUSH_SECONDS
+FLUSH_EVERY = 100
+FLUSH_SECONDS = 2.0
+
+
+def run_key(list_id: str, contacts: list) -> str:
+    """Same audience and the same contacts (in any order) give the same key"""
+    digest = hashlib.sha256(list_id.encode())
+    for fingerprint in sorted(f"{c.subscriber_hash}:{contact_fingerprint(c)}" for c in contacts):
+        digest.update(fingerprint.encode())
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._conn = connect(path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS upload_checkpoints (
+                run_key TEXT NOT NULL,
+                subscriber_hash TEXT NOT NULL,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (run_key, subscriber_hash)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+        self._pending = []
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def split_done(self, key: str, contacts: list) -> tuple:
+        """Return (contacts still to send, number already finished by an earlier attempt at this run)"""
+        done = {h for (h,) in lookup(
+            self._conn,
+            "SELECT subscriber_hash FROM upload_checkpoints WHERE run_key = ? AND subscriber_hash IN ({placeholders})",
+            key, [c.subscriber_hash for c in contacts],
+        )}
+        to_send = [c for c in contacts if c.subscriber_hash not in done]
+        return to_send, len(contacts) - len(to_send)
+
+    def mark(self, key: str, contact):
+        """Note a finished contact; written out in groups, see flush()"""
+        self._pending.append((key, contact.subscriber_hash, time.time()))
+        if len(self._pending) >= FLUSH_EVERY or time.monotonic() - self._flushed_at >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO upload_checkpoints VALUES (?, ?, ?)", self._pending)
+            self._pending = []
+        self._flushed_at = time.monotonic()
+
+    def finish(self, key: str):
+        """The run got to the end; its checkpoint is no longer needed"""
+        self._pending = [row for row in self._pending if row[0] != key]
+        with self._conn:
+            self._conn.execute("DELETE FROM upload_checkpoints WHERE run_key = ?", (key,))
+
+
+def open_checkpoint():
+    """Checkpoint in the FOXTROT_SYNC_DB database, or None when that is set to an empty string"""
+    path = os.environ.get("FOXTROT_SYNC_DB", DEFAULT_PATH)
+    if not path:
+        return None
+    return Checkpoint(path)
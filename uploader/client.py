@@ -0,0 +1,168 @@
+"""One Mailchimp client per process, over a pool of keep-alive connections.
+
+The SDK sends every call through the module-level requests functions, which
+open (and TLS-handshake) a fresh connection each time. Here the SDK's
+ApiClient.request is pointed at a shared requests.Session instead, whose pool
+holds up to MAX_CONNECTIONS connections (Mailchimp's per-account limit) and
+keeps them open between calls. The configuration is read and validated once
+and then reused. stats() reports how many calls went out over an existing
+connection.
+"""
+
+import json
+import os
+import threading
+from typing import NamedTuple
+
+import mailchimp_marketing as MailchimpMarketing
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import metrics
+from . import retry
+from .concurrent import MAX_CONNECTIONS
+
+# Seconds, as the SDK's own default
+DEFAULT_TIMEOUT = 120
+
+
+class MailchimpConfig(NamedTuple):
+    api_key: str
+    audience_id: str
+    server: str
+
+
+def read_config() -> MailchimpConfig:
+    """MAILCHIMP_API_KEY and MAILCHIMP_AUDIENCE_ID, raising ValueError when missing or malformed"""
+    api_key = os.environ.get("MAILCHIMP_API_KEY")
+    audience_id = os.environ.get("MAILCHIMP_AUDIENCE_ID")
+
+    if not api_key:
+        raise ValueError("MAILCHIMP_API_KEY environment variable not set")
+    if not audience_id:
+        raise ValueError("MAILCHIMP_AUDIENCE_ID environment variable not set")
+    if "-" not in api_key:
+        raise ValueError("Invalid MAILCHIMP_API_KEY format")
+
+    return MailchimpConfig(api_key, audience_id, api_key.split("-")[-1])
+
+
+class _Counts:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+    def add(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+def _counting_pool(base, counts: _Counts):
+    class CountingPool(base):
+        def _new_conn(self):
+            counts.add("connections")
+            metrics.MAILCHIMP_CONNECTIONS.inc()
+            return super()._new_conn()
+
+    return CountingPool
+
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools count the connections they open"""
+
+    def __init__(self, counts: _Counts, **kwargs):
+        self._counts = counts
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self._counts),
+            "https": _counting_pool(HTTPSConnectionPool, self._counts),
+        }
+
+
+class MailchimpClients:
+    """Hands out one shared, pooled Mailchimp client built from the validated configuration"""
+
+    def __init__(self, pool_size: int = MAX_CONNECTIONS, timeout: float = DEFAULT_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._config = None
+        self._client = None
+        self._session = None
+        self._counts = _Counts()
+
+    def config(self) -> MailchimpConfig:
+        """The configuration, validated on first use; a ValueError is raised again until it is fixed"""
+        with self._lock:
+            if self._config is None:
+                self._config = read_config()
+            return self._config
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        # pool_block makes extra threads wait for a free connection instead of opening more
+        adapter = _PooledAdapter(self._counts, pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _request(self, api_client):
+        """Replacement for ApiClient.request that sends the call over the shared session"""
+        session = self._session
+
+        def request(method, url, query_params=None, headers=None, body=None):
+            headers = dict(headers or {})
+            auth = None
+            if api_client.is_basic_auth:
+                auth = ("user", api_client.api_key)
+            if api_client.is_oauth:
+                headers["Authorization"] = "Bearer " + api_client.access_token
+            data = json.dumps(body) if method in ("POST", "PUT", "PATCH") else None
+            self._counts.add("requests")
+            metrics.MAILCHIMP_REQUESTS.inc()
+            response = session.request(method, url, params=query_params, data=data, headers=headers,
+                                       auth=auth, timeout=api_client.timeout)
+            retry.note_response(response)
+            return response
+
+        return request
+
+    def client(self):
+        config = self.config()
+        with self._lock:
+            if self._client is None:
+                self._session = self._new_session()
+                client = MailchimpMarketing.Client()
+                client.set_config({"api_key": config.api_key, "server": config.server, "timeout": self.timeout})
+                client.api_client.request = self._request(client.api_client)
+                self._client = client
+            return self._client
+
+    def stats(self, since: dict = None) -> dict:
+        """Calls made, connections opened, and the share of calls that reused a connection.
+
+        With since, an earlier stats() result, only what happened after it is counted.
+        """
+        requests_made, connections = self._counts.requests, self._counts.connections
+        if since:
+            requests_made -= since["requests"]
+            connections -= since["connections"]
+        return {
+            "requests": requests_made,
+            "connections": connections,
+            "reuse_rate": round(1 - connections / requests_made, 4) if requests_made else None,
+        }
+
+    def reset(self):
+        """Forget the configuration and close the pool, e.g. after the environment changes"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._config = None
+            self._client = None
+            self._session = None
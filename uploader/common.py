@@ -0,0 +1,133 @@
+import hashlib
+from typing import NamedTuple
+
+import metrics
+from processors.emails import HASH_COLUMN, MISSING_REASON, REASON_COLUMN, prepare_emails
+
+
+class Contact(NamedTuple):
+    email: str
+    subscriber_hash: str
+    merge_fields: dict
+    tags: list
+    # False when the member is already up to date and only tags are sent
+    upsert: bool = True
+
+
+"""CSV files store tags as a single string with quotes and commas. The combined
+  frame from processors/ already holds them as tuples, but a frame read back from
+  one of those CSVs needs parsing before the API gets its list of tag objects:"""
+def parse_tags_from_csv(tags_string):
+    """Parse tags from CSV format"""
+    if not isinstance(tags_string, str) or not tags_string.strip():
+        return []
+
+    # Split by "," and remove surrounding quotes
+    parts = tags_string.split('","')
+    tags = []
+    for part in parts:
+        clean_tag = part.strip('"').strip()
+        if clean_tag:
+            tags.append(clean_tag)
+
+    return tags
+
+
+def row_tags(tags) -> list:
+    """Tags of a combined row: a tuple from the processors, or a CSV-format string"""
+    if isinstance(tags, (tuple, list)):
+        return list(tags)
+    return parse_tags_from_csv(tags)
+
+
+def subscriber_hash(email: str) -> str:
+    """When making a call for information about a particular contact, the Marketing API uses the MD5 hash of the
+    lowercase version of the contacts email address. We use the MD5 hash because it makes
+    it less likely to leak email addresses—these hashes cant be translated back to an email address, so if your APIs calls were
+    leaked in some manner, your users email addresses remain unexposed.
+    https://mailchimp.com/developer/marketing/docs/methods-parameters/#path-parameters"""
+    return hashlib.md5(email.lower().encode()).hexdigest()
+
+
+def build_merge_fields(row) -> dict:
+    """Map a combined row onto Mailchimp merge fields"""
+    merge_fields = {
+        "FNAME": str(row.get("Fname", "")),
+        "LNAME": str(row.get("Lname", ""))
+    }
+
+    # Add Organisation if there
+    org = str(row.get("Organisation", "")).strip()
+    if org:
+        merge_fields["COMPANY"] = org
+
+    # Add Country if present
+    country = str(row.get("Country", "")).strip()
+    if country:
+        merge_fields["COUNTRY"] = country
+
+    return merge_fields
+
+
+def new_results() -> dict:
+    """Empty results dict in the shape upload_results.html renders"""
+    return {
+        "total": 0,
+        "successful": 0,
+        "failed": 0,
+        "errors": []
+    }
+
+
+def record_failure(results: dict, email, reason: str, kind: str = "unexpected"):
+    """Add a failed contact to results; kind is the short reason failures are counted under in /metrics"""
+    metrics.UPLOAD_FAILURES.inc(reason=kind)
+    results["failed"] += 1
+    results["errors"].append({
+        "email": str(email),
+        "reason": reason,
+        "kind": kind
+    })
+
+
+def prepare_contacts(combined, results: dict, rejected=None) -> list:
+    """Turn the combined frame into Contacts, recording rejected emails as failures.
+
+    The frame is split with processors.emails.prepare_emails unless that was
+    already done (it has a subscriber_hash column), in which case rejected
+    holds the rows it split off.
+    """
+    if HASH_COLUMN in combined.columns:
+        valid = combined
+    else:
+        valid, rejected = prepare_emails(combined)
+
+    if rejected is not None:
+        results["total"] += len(rejected)
+        for email, reason in zip(rejected["Email1"].tolist(), rejected[REASON_COLUMN].tolist()):
+            kind = "missing_email" if reason == MISSING_REASON else "invalid_email"
+            record_failure(results, email, reason, kind=kind)
+
+    results["total"] += len(valid)
+    return [
+        Contact(
+            email=row["Email1"],
+            subscriber_hash=row[HASH_COLUMN],
+            merge_fields=build_merge_fields(row),
+            tags=row_tags(row.get("Tags", "")),
+        )
+        for row in valid.to_dict("records")
+    ]
+
+
+def member_body(contact: Contact) -> dict:
+    """Request body for the add-or-update member call"""
+    return {
+        "email_address": contact.email,
+        "status_if_new": "subscribed",
+        "merge_fields": contact.merge_fields
+    }
+
+
+def tags_body(contact: Contact) -> dict:
+    return {"tags": [{"name": tag, "status": "active"} for tag in contact.tags]}
@@ -0,0 +1,172 @@
+"""Concurrent direct uploads.
+
+Mailchimp allows up to 10 simultaneous connections per account, so instead of
+one contact at a time (with a sleep after each) we keep several contacts in
+flight on a thread pool driven by asyncio. Every API request, not every row,
+takes a token from a shared bucket so the request rate stays under the limit
+however many tags a contact has.
+https://mailchimp.com/developer/marketing/docs/fundamentals/#api-limits
+
+The bucket's rate adapts: it is halved whenever Mailchimp throttles us (and
+paused for any Retry-After), then creeps back up towards the configured rate
+as calls succeed. Transient failures are retried, see retry.py.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mailchimp_marketing.api_client import ApiClientError
+
+import metrics
+from . import retry
+from .common import member_body, record_failure, tags_body
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = 10
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second with bursts of up to `capacity`.
+
+    slow_down() and speed_up() adjust the rate additive-increase /
+    multiplicative-decrease style, between min_rate and the starting rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, min_rate: float = None, increase: float = None):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else min(rate, 0.5)
+        # Back from min_rate to the full rate after roughly 10 seconds' worth of successful calls
+        self.increase = increase if increase is not None else max(rate / 100, 0.01)
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                self._tokens = 0
+                self._updated = time.monotonic()
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def slow_down(self, retry_after: float = None):
+        """Halve the rate, and hold every acquisition back for retry_after seconds if given"""
+        self._refill()
+        self.rate = max(self.rate / 2, self.min_rate)
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        metrics.API_THROTTLES.inc()
+        logger.info("Mailchimp throttled the upload; rate now %.2f requests/s", self.rate)
+
+    def speed_up(self):
+        if self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.rate + self.increase, self.max_rate)
+
+
+def concurrency_settings() -> tuple:
+    """MAILCHIMP_CONCURRENCY (capped at 10) and MAILCHIMP_RATE_LIMIT in requests per second"""
+    concurrency = int(os.environ.get("MAILCHIMP_CONCURRENCY", MAX_CONNECTIONS))
+    rate = float(os.environ.get("MAILCHIMP_RATE_LIMIT", 10))
+    if concurrency < 1 or rate <= 0:
+        raise ValueError("MAILCHIMP_CONCURRENCY and MAILCHIMP_RATE_LIMIT must be positive")
+    return min(concurrency, MAX_CONNECTIONS), rate
+
+
+async def _call(loop, executor, bucket, operation: str, fn, *args):
+    """Run a blocking SDK call on the pool, retrying transient failures and pacing the bucket.
+
+    Timed here rather than in the worker thread so the job's metrics see it.
+    """
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            with metrics.API_SECONDS.time(operation=operation):
+                result = await loop.run_in_executor(executor, retry.call, fn, *args)
+        except ApiClientError as e:
+            if not retry.is_transient(e) or attempt >= retry.MAX_RETRIES:
+                raise
+            retry_after = getattr(e, "retry_after", None)
+            if retry.is_throttled(e):
+                bucket.slow_down(retry_after)
+            metrics.API_RETRIES.inc(operation=operation)
+            await asyncio.sleep(retry.backoff_delay(attempt, retry_after))
+            attempt += 1
+            continue
+        bucket.speed_up()
+        return result
+
+
+async def _upload_one(loop, executor, bucket, client, list_id, contact):
+    """Returns None on success or the failure (reason, kind)"""
+    try:
+        # Add/update member
+        if contact.upsert:
+            await _call(loop, executor, bucket, "set_list_member",
+                        client.lists.set_list_member, list_id, contact.subscriber_hash, member_body(contact))
+
+        # Apply tags
+        if contact.tags:
+            await _call(loop, executor, bucket, "update_list_member_tags",
+                        client.lists.update_list_member_tags, list_id, contact.subscriber_hash, tags_body(contact))
+        return None
+
+    # Some error handling to avoid crashing entire upload if some things are wrong
+    except ApiClientError as e:
+        return f"Mailchimp API error: {e.text}", f"http_{e.status_code}"
+    except Exception as e:
+        return f"Unexpected error: {str(e)}", "unexpected"
+
+
+async def _upload_all(client, list_id, contacts, concurrency, rate, progress, on_success):
+    loop = asyncio.get_running_loop()
+    bucket = TokenBucket(rate)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def worker(contact):
+        async with slots:
+            failure = await _upload_one(loop, executor, bucket, client, list_id, contact)
+        # As each contact finishes, so a checkpoint taken mid-run is up to date
+        if failure is None and on_success:
+            on_success(contact)
+        if progress:
+            progress(1)
+        return failure
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return await asyncio.gather(*(worker(contact) for contact in contacts))
+
+
+def upload_contacts_concurrent(client, list_id: str, contacts: list, results: dict,
+                               concurrency: int = MAX_CONNECTIONS, rate: float = 10.0, progress=None,
+                               on_success=None) -> dict:
+    """Upsert contacts with several requests in flight, folding outcomes back in row order.
+
+    progress, if given, is called with the number of contacts just finished and
+    on_success with each contact as soon as it has been uploaded.
+    """
+    outcomes = asyncio.run(_upload_all(client, list_id, contacts, concurrency, rate, progress, on_success))
+    for contact, failure in zip(contacts, outcomes):
+        if failure is None:
+            results["successful"] += 1
+        else:
+            record_failure(results, contact.email, *failure)
+    return results
@@ -0,0 +1,36 @@
+"""The SQLite database the upload stores share, at FOXTROT_SYNC_DB.
+
+The sync state, checkpoints, audience snapshot and upload results each keep
+their own connection to the same file, from job threads and request threads
+at once. Connections are opened in WAL mode, so reading the results page does
+not wait for an upload writing its checkpoints, and with a busy timeout, so a
+writer waits its turn for the lock instead of failing with "database is
+locked".
+"""
+
+import sqlite3
+
+DEFAULT_PATH = "foxtrot_sync.sqlite3"
+
+# Seconds a connection waits for another connection's write lock
+BUSY_TIMEOUT = 30.0
+
+# Keeps IN (...) lookups well under SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def lookup(conn: sqlite3.Connection, query: str, scope: str, keys: list):
+    """Rows of query for keys, fetched LOOKUP_CHUNK keys at a time.
+
+    query takes scope as its first parameter and has an "IN ({placeholders})"
+    for the keys, e.g. "SELECT ... WHERE list_id = ? AND subscriber_hash IN ({placeholders})".
+    """
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[start:start + LOOKUP_CHUNK]
+        yield from conn.execute(query.format(placeholders=",".join("?" * len(chunk))), [scope, *chunk])
@@ -0,0 +1,189 @@
+"""Upload results kept in SQLite, read back a page at a time.
+
+A month's upload can fail thousands of contacts, and the results page used to
+render every one of them from the job's in-memory results, which were gone
+once the job was pruned or the server restarted. Each finished run's summary
+and failed contacts are saved here under the run id (the job id), and kept
+for KEEP_SECONDS. The
+failures are indexed by run and kind (the short reason /metrics counts them
+under), so the results page can fetch one page of one kind and the error log
+can be streamed out as CSV without loading the whole run.
+
+MemoryResults gives the same read methods over a results dict, for when
+FOXTROT_SYNC_DB is set to an empty string and nothing is saved.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+
+from .database import DEFAULT_PATH, connect
+
+PAGE_SIZE = 100
+# Failed contacts fetched from SQLite at a time when streaming the error log
+STREAM_ROWS = 1000
+# Runs finished longer ago than this are dropped when a new one is saved
+KEEP_SECONDS = 90 * 24 * 60 * 60
+
+
+class ResultsStore:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._conn = connect(path)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS upload_runs (
+                    run_id TEXT PRIMARY KEY,
+                    finished_at REAL NOT NULL,
+                    summary TEXT NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS upload_errors (
+                    run_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    email TEXT NOT NULL,
+                    reason TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    PRIMARY KEY (run_id, position)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS upload_errors_by_kind ON upload_errors (run_id, kind, position)"
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def save(self, run_id: str, results: dict):
+        """Store results under run_id, replacing any earlier save; results["errors"] goes in its own table"""
+        summary = {key: value for key, value in results.items() if key != "errors"}
+        rows = (
+            (run_id, position, error["email"], error["reason"], error.get("kind", "unexpected"))
+            for position, error in enumerate(results.get("errors", []))
+        )
+        expired = time.time() - KEEP_SECONDS
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM upload_errors WHERE run_id IN (SELECT run_id FROM upload_runs WHERE finished_at < ?)",
+                (expired,),
+            )
+            self._conn.execute("DELETE FROM upload_runs WHERE finished_at < ?", (expired,))
+            self._conn.execute("DELETE FROM upload_errors WHERE run_id = ?", (run_id,))
+            self._conn.executemany("INSERT INTO upload_errors VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO upload_runs VALUES (?, ?, ?)",
+                               (run_id, time.time(), json.dumps(summary, default=str)))
+
+    def summary(self, run_id: str):
+        """The run's results without the failed contacts, or None for an unknown run"""
+        row = self._conn.execute("SELECT summary FROM upload_runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def kinds(self, run_id: str) -> dict:
+        """{kind: number of failed contacts}, most common first"""
+        rows = self._conn.execute(
+            "SELECT kind, COUNT(*) AS failed FROM upload_errors WHERE run_id = ? "
+            "GROUP BY kind ORDER BY failed DESC, kind",
+            (run_id,),
+        ).fetchall()
+        return dict(rows)
+
+    def _where(self, run_id: str, kind: str) -> tuple:
+        if kind:
+            return "WHERE run_id = ? AND kind = ?", [run_id, kind]
+        return "WHERE run_id = ?", [run_id]
+
+    def count(self, run_id: str, kind: str = None) -> int:
+        where, params = self._where(run_id, kind)
+        return self._conn.execute(f"SELECT COUNT(*) FROM upload_errors {where}", params).fetchone()[0]
+
+    def errors(self, run_id: str, kind: str = None, offset: int = 0, limit: int = PAGE_SIZE) -> list:
+        """One page of the run's failed contacts (of one kind, if given), in the order they failed"""
+        where, params = self._where(run_id, kind)
+        rows = self._conn.execute(
+            f"SELECT email, reason, kind FROM upload_errors {where} ORDER BY position LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        ).fetchall()
+        return [{"email": email, "reason": reason, "kind": kind_} for email, reason, kind_ in rows]
+
+    def iter_errors(self, run_id: str, kind: str = None):
+        """Every failed contact of the run, read STREAM_ROWS at a time"""
+        where, params = self._where(run_id, kind)
+        last = -1
+        while True:
+            rows = self._conn.execute(
+                f"SELECT position, email, reason, kind FROM upload_errors {where} AND position > ? "
+                f"ORDER BY position LIMIT ?",
+                [*params, last, STREAM_ROWS],
+            ).fetchall()
+            if not rows:
+                return
+            for position, email, reason, kind_ in rows:
+                yield {"email": email, "reason": reason, "kind": kind_}
+            last = rows[-1][0]
+
+
+class MemoryResults:
+    """ResultsStore's read methods over one run's results dict"""
+
+    def __init__(self, run_id: str, results: dict):
+        self._run_id = run_id
+        self._results = results
+
+    def close(self):
+        pass
+
+    def summary(self, run_id: str):
+        if run_id != self._run_id:
+            return None
+        return {key: value for key, value in self._results.items() if key != "errors"}
+
+    def _errors(self, run_id: str, kind: str = None) -> list:
+        if run_id != self._run_id:
+            return []
+        return [
+            dict(error, kind=error.get("kind", "unexpected"))
+            for error in self._results.get("errors", [])
+            if not kind or error.get("kind", "unexpected") == kind
+        ]
+
+    def kinds(self, run_id: str) -> dict:
+        counts = {}
+        for error in self._errors(run_id):
+            counts[error["kind"]] = counts.get(error["kind"], 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+    def count(self, run_id: str, kind: str = None) -> int:
+        return len(self._errors(run_id, kind))
+
+    def errors(self, run_id: str, kind: str = None, offset: int = 0, limit: int = PAGE_SIZE) -> list:
+        return self._errors(run_id, kind)[offset:offset + limit]
+
+    def iter_errors(self, run_id: str, kind: str = None):
+        return iter(self._errors(run_id, kind))
+
+
+def error_log_csv(store, run_id: str, kind: str = None):
+    """The run's failed contacts as CSV text, STREAM_ROWS rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(["Email", "Reason", "Kind"])
+    written = 0
+    for error in store.iter_errors(run_id, kind):
+        writer.writerow([error["email"], error["reason"], error["kind"]])
+        written += 1
+        if written % STREAM_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def open_results_store():
+    """ResultsStore in the FOXTROT_SYNC_DB database, or None when that is set to an empty string"""
+    path = os.environ.get("FOXTROT_SYNC_DB", DEFAULT_PATH)
+    if not path:
+        return None
+    return ResultsStore(path)
@@ -0,0 +1,102 @@
+"""Retrying Mailchimp calls that failed for transient reasons.
+
+429 (throttled) and 5xx responses, and requests that never got a response,
+are worth another try after a pause. Pauses grow exponentially with full
+jitter (a random delay up to the exponential bound), so clients that were
+throttled together do not all come back at the same moment, and they are
+never shorter than the Retry-After the response asked for.
+https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+
+The SDK raises ApiClientError without the response headers, so the pooled
+client notes each failed response's Retry-After in a thread-local, and call()
+attaches it to the error raised on the same thread.
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+from mailchimp_marketing.api_client import ApiClientError
+
+import metrics
+
+MAX_RETRIES = 5
+BASE_DELAY = 0.5
+MAX_DELAY = 60.0
+
+TRANSIENT_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_local = threading.local()
+
+
+def parse_retry_after(value) -> float:
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP date), None if absent or unreadable"""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+def note_response(response):
+    """Remember a failed response's Retry-After for call() on this thread"""
+    if response.status_code in TRANSIENT_STATUSES:
+        _local.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+
+def call(fn, *args):
+    """fn(*args), attaching the response's Retry-After to an ApiClientError as retry_after"""
+    _local.retry_after = None
+    try:
+        return fn(*args)
+    except ApiClientError as e:
+        if getattr(e, "retry_after", None) is None:
+            e.retry_after = _local.retry_after
+        raise
+
+
+def is_transient(error) -> bool:
+    if not isinstance(error, ApiClientError):
+        return False
+    # The SDK raises without a status code when the request itself failed
+    return error.status_code is None or error.status_code in TRANSIENT_STATUSES
+
+
+def is_throttled(error) -> bool:
+    """Mailchimp asked us to slow down, not just to try again"""
+    return error.status_code == 429 or getattr(error, "retry_after", None) is not None
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Seconds to wait before retry number attempt + 1"""
+    delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def with_retries(fn, *args, operation: str, on_throttle=None, sleep=time.sleep):
+    """call(fn, *args), retried up to MAX_RETRIES times while it fails transiently.
+
+    on_throttle, if given, is called with the Retry-After seconds (or None)
+    each time Mailchimp throttles the call.
+    """
+    attempt = 0
+    while True:
+        try:
+            with metrics.API_SECONDS.time(operation=operation):
+                return call(fn, *args)
+        except ApiClientError as e:
+            if not is_transient(e) or attempt >= MAX_RETRIES:
+                raise
+            retry_after = getattr(e, "retry_after", None)
+            if on_throttle and is_throttled(e):
+                on_throttle(retry_after)
+            metrics.API_RETRIES.inc(operation=operation)
+            sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
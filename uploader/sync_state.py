@@ -0,0 +1,80 @@
+"""Local record of what we last pushed to Mailchimp for each contact.
+
+Most of a monthly SP snapshot is the same people with the same details as last
+month, and re-sending them costs two API calls each for no effect. We keep a
+fingerprint of the email, merge fields and tags last uploaded successfully,
+keyed by audience and subscriber hash, and only send contacts whose
+fingerprint has changed.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from .database import DEFAULT_PATH, connect, lookup
+
+
+def contact_fingerprint(contact) -> str:
+    payload = json.dumps(
+        {"email": contact.email, "merge_fields": contact.merge_fields, "tags": sorted(set(contact.tags))},
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class SyncState:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._conn = connect(path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS synced_contacts (
+                list_id TEXT NOT NULL,
+                subscriber_hash TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (list_id, subscriber_hash)
+            ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def _fingerprints(self, list_id: str, hashes: list) -> dict:
+        return dict(lookup(
+            self._conn,
+            "SELECT subscriber_hash, fingerprint FROM synced_contacts "
+            "WHERE list_id = ? AND subscriber_hash IN ({placeholders})",
+            list_id, hashes,
+        ))
+
+    def unchanged(self, list_id: str, contacts: list) -> set:
+        """Subscriber hashes of the contacts that match the last push"""
+        stored = self._fingerprints(list_id, [c.subscriber_hash for c in contacts])
+        return {c.subscriber_hash for c in contacts if stored.get(c.subscriber_hash) == contact_fingerprint(c)}
+
+    def record(self, list_id: str, contacts: list):
+        """Remember contacts that were pushed successfully"""
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO synced_contacts VALUES (?, ?, ?, ?)",
+                [(list_id, c.subscriber_hash, contact_fingerprint(c), now) for c in contacts],
+            )
+
+    def forget(self, list_id: str, hashes):
+        """Drop what we know about these contacts, so the next run sends them again"""
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM synced_contacts WHERE list_id = ? AND subscriber_hash = ?",
+                [(list_id, h) for h in hashes],
+            )
+
+
+def open_sync_state():
+    """SyncState at FOXTROT_SYNC_DB, or None when it is set to an empty string"""
+    path = os.environ.get("FOXTROT_SYNC_DB", DEFAULT_PATH)
+    if not path:
+        return None
+    return SyncState(path)
@@ -0,0 +1,94 @@
+import os
+
+import metrics
+from .batch import upload_contacts_batch
+from .checkpoint import run_key
+from .common import new_results, prepare_contacts
+from .concurrent import concurrency_settings, upload_contacts_concurrent
+
+UPLOAD_MODES = ("direct", "batch")
+
+
+def upload_mode() -> str:
+    """MAILCHIMP_UPLOAD_MODE picks between one call per contact and /batches"""
+    mode = os.environ.get("MAILCHIMP_UPLOAD_MODE", "direct").strip().lower()
+    if mode not in UPLOAD_MODES:
+        raise ValueError(f"MAILCHIMP_UPLOAD_MODE must be one of {', '.join(UPLOAD_MODES)}")
+    return mode
+
+
+def upload_contacts(combined, client, list_id: str, mode: str = "direct", progress=None,
+                    sync_state=None, checkpoint=None, audience=None, rejected=None) -> dict:
+    """Upload the combined frame to the audience and return the results dict.
+
+    combined may already have been through processors.emails.prepare_emails,
+    with the rows it rejected passed as rejected so they are reported.
+
+    progress, if given, is called with the number of rows finished since the last
+    call. With a SyncState, contacts unchanged since their last successful push
+    are skipped and counted in results["skipped"]. With a Checkpoint, contacts an
+    interrupted attempt at the same upload already finished are skipped and
+    counted in results["resumed"]. With a refreshed AudienceSnapshot, only new or
+    changed members and missing tags are sent; members already up to date are
+    counted in results["up_to_date"], and unsubscribed or cleaned ones in
+    results["left_alone"]. With both, the snapshot decides: a contact the sync
+    state calls unchanged is only skipped if the audience still matches it.
+    """
+    results = new_results()
+    contacts = prepare_contacts(combined, results, rejected)
+    if sync_state is not None:
+        unchanged = sync_state.unchanged(list_id, contacts)
+        if audience is not None and unchanged:
+            # Members deleted, archived or edited in Mailchimp since our last push no longer
+            # match the fresh snapshot; forget them so they are planned and sent again
+            current = audience.up_to_date(list_id, [c for c in contacts if c.subscriber_hash in unchanged])
+            sync_state.forget(list_id, unchanged - current)
+            unchanged = current
+        results["skipped"] = sum(c.subscriber_hash in unchanged for c in contacts)
+        contacts = [c for c in contacts if c.subscriber_hash not in unchanged]
+    if checkpoint is not None:
+        key = run_key(list_id, contacts)
+        contacts, results["resumed"] = checkpoint.split_done(key, contacts)
+    originals = {}
+    if audience is not None:
+        originals = {c.subscriber_hash: c for c in contacts}
+        contacts, results["left_alone"], results["up_to_date"] = audience.plan(list_id, contacts)
+
+    # Rows rejected or skipped before any API call are already done
+    already_done = results["failed"] + sum(
+        results.get(k, 0) for k in ("skipped", "resumed", "left_alone", "up_to_date"))
+    if progress and already_done:
+        progress(already_done)
+
+    succeeded = []
+
+    def on_success(contact):
+        # Planning may have trimmed the tags; remember the contact as it was asked for
+        contact = originals.get(contact.subscriber_hash, contact)
+        succeeded.append(contact)
+        if checkpoint is not None:
+            checkpoint.mark(key, contact)
+
+    try:
+        if mode == "batch":
+            upload_contacts_batch(client, list_id, contacts, results, progress=progress, on_success=on_success)
+        else:
+            concurrency, rate = concurrency_settings()
+            upload_contacts_concurrent(client, list_id, contacts, results, concurrency=concurrency, rate=rate,
+                                       progress=progress, on_success=on_success)
+    finally:
+        if checkpoint is not None:
+            checkpoint.flush()
+
+    if sync_state is not None:
+        sync_state.record(list_id, succeeded)
+    if checkpoint is not None:
+        checkpoint.finish(key)
+
+    metrics.UPLOAD_CONTACTS.inc(results["successful"], outcome="successful")
+    metrics.UPLOAD_CONTACTS.inc(results["failed"], outcome="failed")
+    metrics.UPLOAD_CONTACTS.inc(results.get("skipped", 0), outcome="skipped")
+    metrics.UPLOAD_CONTACTS.inc(results.get("resumed", 0), outcome="resumed")
+    metrics.UPLOAD_CONTACTS.inc(results.get("left_alone", 0), outcome="left_alone")
+    metrics.UPLOAD_CONTACTS.inc(results.get("up_to_date", 0), outcome="up_to_date")
+    return results